@@ -8,29 +8,45 @@
 Cross-platform folder locking using OS permissions + password
 """
 
+import os
 import sys
+import json
 import getpass
-import msvcrt
+import argparse
 from pathlib import Path
-from folder_lock_core import FolderLockCore
-from rich.console import Console
-from rich.panel import Panel
-from rich.table import Table
-from rich.prompt import Prompt, Confirm
-from rich.markdown import Markdown
-from rich.layout import Layout
-from rich.align import Align
-from rich import print as rprint
-
-console = Console()
+from folder_lock_core import format_size
+from folder_lock_daemon import connect
+
+
+class LazyConsole:
+    """Stand-in for rich's Console that only imports rich on first use.
+
+    Scripted calls (bulk mode, --plain, --json) never print through it, so
+    they don't pay for importing rich at all.
+    """
+
+    _console = None
+
+    def __getattr__(self, name):
+        if LazyConsole._console is None:
+            from rich.console import Console
+            LazyConsole._console = Console()
+        return getattr(LazyConsole._console, name)
+
+
+console = LazyConsole()
 
 class FolderLockCLI:
-    def __init__(self):
-        self.core = FolderLockCore()
-        self.check_master_key()
+    def __init__(self, core=None, output='rich'):
+        self.core = core if core is not None else connect()
+        # One of 'rich', 'plain' or 'json'
+        self.output = output
 
     def get_password_input(self, prompt_text):
         """Custom password input that shows asterisks"""
+        if self.output != 'rich':
+            return getpass.getpass(f"{prompt_text}: ")
+
         console.print(prompt_text, end=": ")
         sys.stdout.flush()
         
@@ -38,6 +54,7 @@ class FolderLockCLI:
              # Fallback for non-windows
              return getpass.getpass("")
              
+        import msvcrt
         password = ""
         while True:
             ch = msvcrt.getch()
@@ -64,6 +81,11 @@ class FolderLockCLI:
     def check_master_key(self):
         """Check if master key is set, if not prompt to set it"""
         if not self.core.master_key_hash:
+            if self.output != 'rich':
+                self._check_master_key_plain()
+                return
+
+            from rich.panel import Panel
             console.print(Panel("[bold red]⚠️  MASTER KEY NOT DETECTED[/bold red]\n\nA Master Key is required to recover access to folders if you forget their specific passwords.", title="Setup Required", border_style="red"))
             
             while True:
@@ -81,7 +103,58 @@ class FolderLockCLI:
                 self.core.set_master_key(password)
                 console.print("[bold green]✓ Master Key set successfully![/bold green]")
                 break
+
+    def _check_master_key_plain(self):
+        # Prompts go to the terminal through getpass, so stdout stays parseable
+        print("MASTER KEY NOT DETECTED - a Master Key is required to recover access to folders.", file=sys.stderr)
+        while True:
+            password = self.get_password_input("Create Master Key")
+            confirm = self.get_password_input("Confirm Master Key")
+            if password != confirm:
+                print("Passwords do not match! Try again.", file=sys.stderr)
+            elif len(password) < 4:
+                print("Password must be at least 4 characters!", file=sys.stderr)
+            else:
+                self.core.set_master_key(password)
+                print("Master Key set successfully", file=sys.stderr)
+                return
+
+    def report(self, success, message, path=None):
+        """Print the outcome of a single lock/unlock in the selected output mode"""
+        if self.output == 'json':
+            record = {'status': 'ok' if success else 'error', 'message': message}
+            if path is not None:
+                record['path'] = path
+            print(json.dumps(record))
+        elif self.output == 'plain':
+            print(f"{'OK' if success else 'ERROR'}: {message}")
+        elif success:
+            console.print(f"[bold green]✓ {message}[/bold green]")
+        else:
+            console.print(f"[bold red]✗ {message}[/bold red]")
                 
+    def run_operation(self, action, path, password, **options):
+        """lock_folder or unlock_folder, with a live progress line in rich mode
+
+        Interrupting it cancels the operation and undoes the partial walk.
+        The daemon client has no streaming calls and gets a plain spinner.
+        """
+        operation = getattr(self.core, f'{action}_folder')
+        if self.output != 'rich':
+            return operation(path, password, **options)
+        label = "Locking folder" if action == 'lock' else "Unlocking folder"
+        stream = getattr(self.core, f'{action}_folder_stream', None)
+        with console.status(f"[bold green]{label}...[/bold green]") as status:
+            if stream is None:
+                return operation(path, password, **options)
+            from folder_lock_progress import Finished, describe
+            for event in stream(path, password, **options):
+                if isinstance(event, Finished):
+                    return event.success, event.message
+                text = describe(event)
+                if text:
+                    status.update(f"[bold green]{label}[/bold green] [dim]{text}[/dim]")
+
     def print_banner(self):
         banner_text = """
     █████╗ ██╗     ██████╗ ██╗  ██╗ █████╗ 
@@ -98,11 +171,20 @@ class FolderLockCLI:
     ██║     ╚██████╔╝███████╗██████╔╝███████╗██║  ██║    ███████╗╚██████╔╝╚██████╗██║  ██╗
     ╚═╝      ╚═════╝ ╚══════╝╚═════╝ ╚══════╝╚═╝  ╚═╝    ╚══════╝ ╚═════╝  ╚═════╝╚═╝  ╚═╝
         """
+        from rich.align import Align
+        from rich.panel import Panel
         console.print(Panel(Align.center(banner_text, vertical="middle"), style="bold cyan", title="ALPHA v1.0"))
 
     def list_locks(self):
         locks = self.core.get_all_locks()
-        
+        statuses = self.core.get_lock_status()
+
+        if self.output != 'rich':
+            self._list_locks_plain(locks, statuses)
+            return
+
+        from rich.panel import Panel
+        from rich.table import Table
         if not locks:
             console.print(Panel("[dim]No folders are currently locked.[/dim]", title="Locked Folders", border_style="blue"))
             return
@@ -115,14 +197,273 @@ class FolderLockCLI:
 
         for idx, (path_str, info) in enumerate(locks.items(), 1):
             path = Path(path_str)
-            exists = path.exists()
+            exists = statuses.get(path_str) == 'ACTIVE'
             status = "[bold green]ACTIVE[/bold green]" if exists else "[bold red]MISSING[/bold red]"
             name = info.get('name', path.name)
             table.add_row(str(idx), name, path_str, status)
 
         console.print(table)
 
+    def _list_locks_plain(self, locks, statuses):
+        rows = []
+        for path_str, info in locks.items():
+            rows.append({
+                'path': path_str,
+                'name': info.get('name', Path(path_str).name),
+                'status': statuses.get(path_str, 'MISSING'),
+            })
+
+        if self.output == 'json':
+            print(json.dumps(rows))
+        else:
+            for row in rows:
+                print(f"{row['name']}\t{row['path']}\t{row['status']}")
+
+    def report_integrity(self):
+        """List paths that changed while locked, if the last unlock found any"""
+        result = self.core.last_result
+        report = result.details.get('integrity') if result is not None else None
+        if not report or report['verified'] or self.output == 'json':
+            return
+        for label in ('changed', 'added', 'removed'):
+            for rel in report[label]:
+                if self.output == 'plain':
+                    print(f"{label.upper()}\t{rel}")
+                else:
+                    console.print(f"    [yellow]{label:>8}[/yellow]  {rel}")
+
+    def relock(self, cancel=None):
+        """Apply expired auto-relocks (or cancel one) and show what is still pending"""
+        if cancel:
+            cancelled = self.core.cancel_relock(cancel)
+            self.report(cancelled, "Auto-relock cancelled" if cancelled else "No relock pending", cancel)
+            return
+
+        import time
+        outcomes = self.core.apply_expired_relocks()
+        pending = self.core.get_pending_relocks()
+
+        if self.output == 'json':
+            print(json.dumps({
+                'relocked': [{'path': p, 'status': 'ok' if ok else 'error', 'message': m} for p, ok, m in outcomes],
+                'pending': pending,
+            }))
+            return
+        for path_str, success, message in outcomes:
+            self.report(success, f"{path_str}: {message}")
+        for path_str, deadline in sorted(pending.items(), key=lambda item: item[1]):
+            minutes = max(0, deadline - time.time()) / 60
+            if self.output == 'plain':
+                print(f"PENDING\t{path_str}\t{minutes:.1f}")
+            else:
+                console.print(f"[cyan]⏱ {path_str}[/cyan] relocks in {minutes:.1f} min")
+
+    def sync(self, enable=None, host=None, disable=False, checkpoint=False):
+        """Enable or disable multi-host sync, or apply the other hosts' changes now"""
+        try:
+            if disable:
+                disabled = self.core.disable_sync()
+                self.report(disabled, "Sync disabled" if disabled else "Sync is not enabled")
+                return disabled
+            if enable:
+                self.core.enable_sync(enable, host)
+                summary = None
+            else:
+                summary = self.core.sync_now(checkpoint)
+        except Exception as e:
+            self.report(False, str(e))
+            return False
+        status = self.core.get_sync_status()
+        if self.output == 'json':
+            print(json.dumps({'status': status, 'pulled': summary}))
+            return True
+        if self.output == 'plain':
+            print(f"SYNC\t{status['host']}\t{status['shared_dir']}\t{status['seq']}")
+            for name, seq in sorted(status['hosts'].items()):
+                print(f"HOST\t{name}\t{seq}")
+            return True
+        console.print(f"[cyan]⇄ {status['host']}[/cyan] via {status['shared_dir']}: "
+                      f"{status['seq']} events published, {status['paths']} paths tracked")
+        if summary is not None:
+            console.print(f"  applied {summary['applied']} of {summary['read']} new events"
+                          + (f" (caught up from checkpoint {summary['checkpoint']})" if summary['checkpoint'] else ""))
+            if summary.get('checkpoint_written'):
+                console.print(f"  wrote checkpoint {summary['checkpoint_written']['checkpoint']}")
+        for name, seq in sorted(status['hosts'].items()):
+            console.print(f"  [dim]{name}: read up to event {seq}[/dim]")
+        return True
+
+    def show_audit(self, path=None, since=None, until=None, limit=None):
+        """Show logged lock/unlock attempts, newest last"""
+        import time
+        events = self.core.get_audit_log(path, since, until, limit)
+
+        if self.output == 'json':
+            for event in events:
+                print(json.dumps(event))
+            return
+        for event in events:
+            when = time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(event['time']))
+            outcome = 'OK' if event['success'] else 'FAILED'
+            who = f"{event.get('user') or event.get('uid')} (pid {event.get('pid')})"
+            if self.output == 'plain':
+                print(f"{when}\t{event['action']}\t{outcome}\t{who}\t{event.get('path') or ''}\t{event['message']}")
+            else:
+                style = 'green' if event['success'] else 'bold red'
+                console.print(f"[dim]{when}[/dim] [{style}]{event['action']} {outcome}[/{style}] "
+                              f"{event.get('path') or ''} [dim]by {who}: {event['message']}[/dim]")
+
+    def estimate(self, path, mode='permissions', cross_devices=False):
+        """Show how long locking path is expected to take, without locking it"""
+        from folder_lock_estimate import describe
+
+        try:
+            estimate = self.core.estimate_lock(path, mode=mode, cross_devices=cross_devices)
+        except Exception as e:
+            self.report(False, str(e), path)
+            return False
+        if self.output == 'json':
+            print(json.dumps(estimate))
+        elif self.output == 'plain':
+            print(f"ESTIMATE\t{estimate['path']}\t{estimate['entries']}\t{estimate['bytes']}\t"
+                  f"{estimate['seconds']:.1f}\t{estimate['basis']}")
+        else:
+            console.print(f"[cyan]⏱ {estimate['path']}[/cyan]: {describe(estimate)}")
+        return True
+
+    def export_registry(self, destination, incremental=False, since=None):
+        """Export the registry to a file or stdout ('-'), the summary goes to stderr then"""
+        import shutil
+        import tempfile
+        from folder_lock_core import FolderLockCore
+
+        to_stdout = destination == '-'
+        spool = None
+        try:
+            if to_stdout and isinstance(self.core, FolderLockCore):
+                summary = self.core.export_registry(sys.stdout, incremental, since)
+            elif to_stdout:
+                # The daemon can't write to our stdout, it fills a private temp file instead
+                fd, spool = tempfile.mkstemp(prefix='folder-lock-export-')
+                os.close(fd)
+                summary = self.core.export_registry(spool, incremental, since)
+                with open(spool, 'r') as f:
+                    shutil.copyfileobj(f, sys.stdout)
+            else:
+                summary = self.core.export_registry(os.path.abspath(destination), incremental, since)
+        except Exception as e:
+            self.report(False, f"Export failed: {e}")
+            return False
+        finally:
+            if spool is not None:
+                os.unlink(spool)
+
+        message = f"Exported {summary['locks']} locks and {summary['deleted']} removals at revision {summary['revision']}"
+        if summary['since'] is not None:
+            message += f" (changes after revision {summary['since']})"
+        if to_stdout:
+            print(json.dumps(summary) if self.output == 'json' else message, file=sys.stderr)
+        elif self.output == 'json':
+            print(json.dumps(dict(summary, status='ok')))
+        else:
+            self.report(True, message)
+        return True
+
+    def import_registry(self, source, policy='skip'):
+        """Merge an export from a file or stdin ('-') into the registry"""
+        import shutil
+        import tempfile
+
+        spool = None
+        try:
+            if source == '-':
+                # Imports read their input twice, stdin is kept in a private temp file
+                fd, spool = tempfile.mkstemp(prefix='folder-lock-import-')
+                with os.fdopen(fd, 'w') as f:
+                    shutil.copyfileobj(sys.stdin, f)
+                source = spool
+            summary = self.core.import_registry(os.path.abspath(source), policy)
+        except Exception as e:
+            self.report(False, str(e))
+            return False
+        finally:
+            if spool is not None:
+                os.unlink(spool)
+
+        if self.output == 'json':
+            print(json.dumps(dict(summary, status='ok')))
+            return True
+        parts = [f"{count} {label}" for label, count in summary.items() if label != 'master_key' and count]
+        if 'master_key' in summary:
+            parts.append(f"master key {summary['master_key']}")
+        self.report(True, "Imported: " + (", ".join(parts) or "nothing to do"))
+        return True
+
+    def show_stats(self, path=None, top=5, refresh=False, jobs=None):
+        stats = self.core.get_lock_stats(path, top=top, refresh=refresh, workers=jobs)
+
+        if self.output == 'json':
+            print(json.dumps(stats))
+            return
+        if self.output == 'plain':
+            for path_str, info in stats.items():
+                if 'error' in info:
+                    print(f"{path_str}\tERROR\t{info['error']}")
+                else:
+                    print(f"{path_str}\t{info['files']}\t{info['bytes']}")
+            return
+
+        from rich.table import Table
+        table = Table(title="Locked Folder Usage", show_header=True, header_style="bold magenta")
+        table.add_column("Path", style="bold cyan")
+        table.add_column("Files", justify="right")
+        table.add_column("Size", justify="right")
+        table.add_column("Largest Subfolders", style="white")
+
+        for path_str, info in stats.items():
+            if 'error' in info:
+                table.add_row(path_str, "-", "-", f"[bold red]{info['error']}[/bold red]")
+                continue
+            largest = "\n".join(f"{Path(p).name}  {format_size(size)}" for p, size in info['largest'])
+            table.add_row(path_str, str(info['files']), format_size(info['bytes']), largest or "[dim]-[/dim]")
+
+        console.print(table)
+
+    def verify(self, path=None, sample_rate=1.0, confidence=0.95, fail_fast=False, jobs=None):
+        """Audit locked folders, returns True if all of them are fully locked"""
+        reports = self.core.verify_locks(path, sample_rate, confidence, fail_fast, jobs)
+        healthy = all(report['locked'] is not False for report in reports.values())
+
+        if self.output == 'json':
+            print(json.dumps(reports))
+            return healthy
+
+        for path_str, report in reports.items():
+            if 'error' in report:
+                line = f"{path_str}: {report['error']}"
+            else:
+                line = (
+                    f"{path_str}: {report['checked']} checked, {report['mismatch_count']} not locked, "
+                    f"{report['errors']} unreadable"
+                )
+                if report['sampled']:
+                    low, high = report['mismatch_interval']
+                    line += f" (sampled, {report['confidence']:.0%} CI {low:.4%}-{high:.4%} not locked)"
+
+            if self.output == 'plain':
+                print(f"{'OK' if report['locked'] else 'FAIL'}\t{line}")
+                for entry, mode in report.get('mismatches', []):
+                    print(f"\t{mode}\t{entry}")
+            else:
+                style = "bold green" if report['locked'] else "bold red"
+                console.print(f"[{style}]{'✓' if report['locked'] else '✗'} {line}[/{style}]")
+                for entry, mode in report.get('mismatches', []):
+                    console.print(f"    [yellow]{mode}[/yellow]  {entry}")
+        return healthy
+
     def lock_folder_interactive(self):
+        from rich.panel import Panel
+        from rich.prompt import Prompt
         folder = Prompt.ask("[bold cyan]Enter folder path to lock[/bold cyan]")
         folder_path = Path(folder).resolve()
         
@@ -141,8 +482,7 @@ class FolderLockCLI:
             console.print("[bold red]Error: Password must be at least 4 characters![/bold red]")
             return
 
-        with console.status("[bold green]Locking folder...[/bold green]"):
-            success, message = self.core.lock_folder(str(folder_path), password)
+        success, message = self.run_operation('lock', str(folder_path), password)
             
         if success:
             console.print(Panel(f"[bold green]✓ {message}[/bold green]\n\nPath: {folder_path}", title="Success", border_style="green"))
@@ -150,12 +490,13 @@ class FolderLockCLI:
             console.print(f"[bold red]✗ {message}[/bold red]")
 
     def unlock_folder_interactive(self):
+        from rich.panel import Panel
+        from rich.prompt import Prompt
         folder = Prompt.ask("[bold cyan]Enter folder path to unlock[/bold cyan]")
         
         password = self.get_password_input("[bold cyan]Enter password (or Master Key)[/bold cyan]")
         
-        with console.status("[bold green]Unlocking folder...[/bold green]"):
-            success, message = self.core.unlock_folder(folder, password)
+        success, message = self.run_operation('unlock', folder, password)
             
         if success:
             console.print(Panel(f"[bold green]✓ {message}[/bold green]", title="Success", border_style="green"))
@@ -163,6 +504,8 @@ class FolderLockCLI:
             console.print(f"[bold red]✗ {message}[/bold red]")
 
     def interactive_mode(self):
+        from rich.prompt import Prompt
+        self.check_master_key()
         self.print_banner()
         
         while True:
@@ -184,47 +527,306 @@ class FolderLockCLI:
                 console.print("[bold cyan]Stay secure! 👋[/bold cyan]")
                 break
 
+def read_paths(source):
+    """Yield unique folder paths from a file, one per line ('-' reads stdin)"""
+    stream = sys.stdin if source == '-' else open(source, 'r')
+    seen = set()
+    try:
+        for line in stream:
+            path = line.strip()
+            if path and path not in seen:
+                seen.add(path)
+                yield path
+    finally:
+        if stream is not sys.stdin:
+            stream.close()
+
+
+def read_password(args):
+    """Get the password for non-interactive runs from a file descriptor or environment variable"""
+    if args.password_fd is not None:
+        # One byte at a time: a buffered read would also swallow what follows
+        # the first line, e.g. the paths of --from - when the fd is stdin
+        line = bytearray()
+        while True:
+            byte = os.read(args.password_fd, 1)
+            if not byte or byte == b'\n':
+                break
+            line += byte
+        return line.decode().rstrip('\r')
+    if args.password_env:
+        if args.password_env not in os.environ:
+            raise SystemExit(f"Environment variable {args.password_env} is not set")
+        return os.environ[args.password_env]
+    return getpass.getpass("Enter password: ")
+
+
+def throttle_settings(args):
+    """Throttle dict from --max-ops/--adaptive/--low-priority, None if none given"""
+    settings = {
+        key: getattr(args, key) for key in ('max_ops', 'adaptive', 'low_priority')
+        if getattr(args, key) is not None
+    }
+    return settings or None
+
+
+def run_bulk(core, args):
+    """Lock/unlock many folders in parallel, printing one JSON object per path"""
+    password = read_password(args)
+    paths = [args.path] if args.path else []
+    if args.paths_from:
+        paths.extend(p for p in read_paths(args.paths_from) if p not in paths)
+    if not paths:
+        raise SystemExit(f"No folder paths in {'standard input' if args.paths_from == '-' else args.paths_from}")
+    operation = core.lock_folder if args.command == 'lock' else core.unlock_folder
+
+    def process(path):
+        options = {'relock_after': args.relock_after, 'throttle': throttle_settings(args)}
+        if args.command == 'lock':
+            options['integrity'] = args.integrity
+            options['cross_devices'] = args.cross_devices
+            if args.encrypt:
+                options['mode'] = 'encrypt'
+            elif args.pack:
+                options['mode'] = 'pack'
+        success, message = operation(path, password, **options)
+        record = {'path': path, 'status': 'ok' if success else 'error', 'message': message}
+        result = core.last_result
+        if result is not None and result.path == str(Path(path).resolve()):
+            record.update(
+                duration=round(result.duration, 6),
+                entries=result.entries,
+                bytes=result.bytes,
+                error_count=result.error_count,
+                details=result.details,
+            )
+        return record
+
+    from concurrent.futures import ThreadPoolExecutor, as_completed
+    failed = 0
+    with ThreadPoolExecutor(max_workers=max(1, args.jobs)) as pool:
+        futures = [pool.submit(process, path) for path in paths]
+        for future in as_completed(futures):
+            record = future.result()
+            failed += record['status'] != 'ok'
+            sys.stdout.write(json.dumps(record) + "\n")
+            sys.stdout.flush()
+    return 1 if failed else 0
+
+
+def parse_time(text: str) -> float:
+    """Epoch seconds from an ISO date/time or an age like 30m, 12h, 7d"""
+    import time
+    from datetime import datetime
+
+    units = {'s': 1, 'm': 60, 'h': 3600, 'd': 86400}
+    if text[-1:] in units and text[:-1].replace('.', '', 1).isdigit():
+        return time.time() - float(text[:-1]) * units[text[-1]]
+    try:
+        return datetime.fromisoformat(text).timestamp()
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"expected an ISO date/time or an age like 12h, got {text!r}")
+
+
+def add_output_options(parser, top_level=False):
+    """Add --plain/--json; subcommands accept them too (`list --json`)"""
+    group = parser.add_mutually_exclusive_group()
+    default = 'rich' if top_level else argparse.SUPPRESS
+    group.add_argument('--plain', dest='output', action='store_const', const='plain', default=default,
+                       help="plain text output without colors or panels")
+    group.add_argument('--json', dest='output', action='store_const', const='json', default=default,
+                       help="machine readable JSON output")
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(
+        prog='folder_lock.py',
+        description="Alpha Folder Lock - run without arguments for interactive mode",
+    )
+    add_output_options(parser, top_level=True)
+    commands = parser.add_subparsers(dest='command')
+
+    for name, action in (('lock', 'Lock'), ('unlock', 'Unlock')):
+        command = commands.add_parser(name, help=f"{action} folders")
+        command.add_argument('path', nargs='?', help=f"folder to {name}")
+        command.add_argument('--from', dest='paths_from', metavar='FILE',
+                             help="read folder paths from FILE, one per line ('-' for stdin)")
+        command.add_argument('--password-fd', type=int, metavar='FD',
+                             help="read the password from the first line of file descriptor FD")
+        command.add_argument('--password-env', metavar='VAR',
+                             help="read the password from environment variable VAR")
+        command.add_argument('-j', '--jobs', type=int, default=1,
+                             help="number of folders processed in parallel (default: 1)")
+        command.add_argument('--relock-after', type=float, metavar='MINUTES',
+                             help="relock automatically this many minutes after unlocking"
+                                  + (" (0 disables the folder's default)" if name == 'unlock'
+                                     else " (default for later unlocks)"))
+        if name == 'lock':
+            command.add_argument('--encrypt', action='store_true',
+                                 help="also encrypt file contents (needs the 'cryptography' package)")
+            command.add_argument('--pack', action='store_true',
+                                 help="move the contents into one compressed archive (for many small files)")
+            command.add_argument('--cross-devices', action='store_true',
+                                 help="also lock mount points (other filesystems) inside the folder")
+            command.add_argument('--integrity', action='store_true',
+                                 help="store a hash manifest and verify the contents on unlock")
+            command.add_argument('--dry-run', action='store_true',
+                                 help="only estimate size and duration from a sample of the folder, lock nothing")
+        throttle = command.add_argument_group(
+            'throttling', "limit the metadata load of the walk" + (" (stored as the folder's default)" if name == 'lock' else "")
+        )
+        throttle.add_argument('--max-ops', type=float, metavar='N', help="at most N permission changes per second")
+        throttle.add_argument('--adaptive', action='store_true', default=None,
+                              help="back off when filesystem latency rises")
+        throttle.add_argument('--low-priority', action='store_true', default=None,
+                              help="run the walk with lowered CPU and I/O priority")
+        add_output_options(command)
+
+    add_output_options(commands.add_parser('list', help="List locked folders"))
+    stats = commands.add_parser('stats', help="Show file count and size of locked folders")
+    stats.add_argument('path', nargs='?', help="only this locked folder")
+    stats.add_argument('--top', type=int, default=5, help="largest subfolders to show (default: 5)")
+    stats.add_argument('--refresh', action='store_true', help="ignore cached directory totals")
+    stats.add_argument('-j', '--jobs', type=int, help="parallel directory scanners")
+    add_output_options(stats)
+
+    verify = commands.add_parser('verify', help="Check that locked folders are still locked throughout")
+    verify.add_argument('path', nargs='?', help="only this locked folder")
+    verify.add_argument('--sample', type=float, default=1.0, metavar='RATE',
+                        help="stat only this fraction of entries (0-1) and report a confidence interval")
+    verify.add_argument('--confidence', type=float, default=0.95, help="confidence level for --sample (default: 0.95)")
+    verify.add_argument('--fail-fast', action='store_true', help="stop at the first entry that is not locked")
+    verify.add_argument('-j', '--jobs', type=int, help="parallel directory scanners")
+    add_output_options(verify)
+
+    extract = commands.add_parser('extract', help="Copy one file out of a packed folder without unlocking it")
+    extract.add_argument('path', help="folder locked with --pack")
+    extract.add_argument('member', help="file path relative to the folder")
+    extract.add_argument('destination', help="file or directory to write it to")
+    add_output_options(extract)
+
+    audit = commands.add_parser('audit', help="Show logged lock, unlock and extract attempts")
+    audit.add_argument('path', nargs='?', help="only attempts on this folder")
+    audit.add_argument('--since', type=parse_time, metavar='TIME', help="ISO date/time or age (30m, 12h, 7d)")
+    audit.add_argument('--until', type=parse_time, metavar='TIME', help="ISO date/time or age")
+    audit.add_argument('--limit', type=int, default=50, help="newest N events (default: 50, 0 for all)")
+    add_output_options(audit)
+
+    export = commands.add_parser('export', help="Write the lock registry as JSON Lines (a backup)")
+    export.add_argument('file', nargs='?', default='-', help="output file (default: stdout)")
+    export.add_argument('--incremental', action='store_true',
+                        help="only changes since the previous export, including removed locks")
+    export.add_argument('--since', type=int, metavar='REVISION',
+                        help="only changes after this registry revision")
+    add_output_options(export)
+
+    import_ = commands.add_parser('import', help="Merge an exported registry into this one")
+    import_.add_argument('file', help="file written by export ('-' for stdin)")
+    import_.add_argument('--on-conflict', choices=('skip', 'overwrite', 'error'), default='skip',
+                         help="for folders already locked differently: keep ours (default), take theirs, "
+                              "or abort before changing anything")
+    add_output_options(import_)
+
+    sync = commands.add_parser('sync', help="Share locks with other hosts through a shared directory")
+    sync.add_argument('--enable', metavar='DIR', help="start syncing through DIR (on storage all hosts mount)")
+    sync.add_argument('--host', help="name of this host in the shared logs (default: short host name)")
+    sync.add_argument('--disable', action='store_true', help="stop syncing, keeping the current locks")
+    sync.add_argument('--checkpoint', action='store_true',
+                      help="also write a checkpoint, so old log segments can be removed")
+    add_output_options(sync)
+
+    relock = commands.add_parser('relock', help="Relock folders whose auto-relock time has passed")
+    relock.add_argument('--cancel', metavar='PATH', help="keep PATH unlocked, cancelling its pending relock")
+    add_output_options(relock)
+
+    commands.add_parser('daemon', help="Run the resident daemon in the foreground")
+    return parser
+
+
 def main():
-    cli = FolderLockCLI()
-    
-    if len(sys.argv) > 1:
-        command = sys.argv[1].lower()
+    # Parse argv before touching the registry or importing rich
+    parser = build_parser()
+    args = parser.parse_args()
+
+    if args.command in ('lock', 'unlock'):
+        if not args.path and not args.paths_from:
+            parser.error(f"{args.command} needs a path or --from FILE")
+        if args.command == 'lock' and args.encrypt and args.pack:
+            parser.error("--encrypt and --pack can't be combined")
+        if args.command == 'lock' and args.dry_run:
+            if args.paths_from:
+                parser.error("--dry-run takes a single path")
+            cli = FolderLockCLI(output=args.output)
+            mode = 'encrypt' if args.encrypt else 'pack' if args.pack else 'permissions'
+            sys.exit(0 if cli.estimate(args.path, mode, args.cross_devices) else 1)
+        # Non-interactive mode: no master key prompt, JSON Lines output
+        if args.paths_from or args.password_fd is not None or args.password_env:
+            sys.exit(run_bulk(connect(), args))
+
+    if args.command == 'daemon':
+        from folder_lock_daemon import run_daemon
+        run_daemon()
+        return
+
+    cli = FolderLockCLI(output=args.output)
+
+    if args.command == 'lock':
+        cli.check_master_key()
+        password = getpass.getpass("Enter password: ")
+        confirm = getpass.getpass("Confirm password: ")
         
-        if command == 'lock' and len(sys.argv) >= 3:
-            folder = sys.argv[2]
-            password = getpass.getpass("Enter password: ")
-            confirm = getpass.getpass("Confirm password: ")
+        if password != confirm:
+            cli.report(False, "Passwords do not match!", args.path)
+            sys.exit(1)
             
-            if password != confirm:
-                console.print("[bold red]Passwords do not match![/bold red]")
-                sys.exit(1)
-                
-            success, message = cli.core.lock_folder(folder, password)
-            if success:
-                console.print(f"[bold green]✓ {message}[/bold green]")
-            else:
-                console.print(f"[bold red]✗ {message}[/bold red]")
-                
-        elif command == 'unlock' and len(sys.argv) >= 3:
-            folder = sys.argv[2]
-            password = getpass.getpass("Enter password (or Master Key): ")
-            success, message = cli.core.unlock_folder(folder, password)
-            if success:
-                console.print(f"[bold green]✓ {message}[/bold green]")
-            else:
-                console.print(f"[bold red]✗ {message}[/bold red]")
-                
-        elif command == 'list':
-            cli.list_locks()
+        success, message = cli.run_operation('lock', args.path, password, relock_after=args.relock_after,
+                                             throttle=throttle_settings(args),
+                                             mode='encrypt' if args.encrypt else 'pack' if args.pack else 'permissions',
+                                             integrity=args.integrity, cross_devices=args.cross_devices)
+        cli.report(success, message, args.path)
+        sys.exit(0 if success else 1)
             
-        else:
-            console.print(Panel("""
-Usage:
-  python folder_lock.py              # Interactive mode
-  python folder_lock.py lock <path>  # Lock a folder
-  python folder_lock.py unlock <path> # Unlock a folder
-  python folder_lock.py list         # List locked folders
-""", title="Help"))
+    elif args.command == 'unlock':
+        password = getpass.getpass("Enter password (or Master Key): ")
+        success, message = cli.run_operation('unlock', args.path, password, relock_after=args.relock_after,
+                                             throttle=throttle_settings(args))
+        cli.report(success, message, args.path)
+        cli.report_integrity()
+        sys.exit(0 if success else 1)
+            
+    elif args.command == 'list':
+        cli.list_locks()
+
+    elif args.command == 'relock':
+        cli.relock(args.cancel)
+
+    elif args.command == 'sync':
+        sys.exit(0 if cli.sync(args.enable, args.host, args.disable, args.checkpoint) else 1)
+
+    elif args.command == 'audit':
+        cli.show_audit(args.path, args.since, args.until, args.limit or None)
+
+    elif args.command == 'export':
+        sys.exit(0 if cli.export_registry(args.file, args.incremental, args.since) else 1)
+
+    elif args.command == 'import':
+        sys.exit(0 if cli.import_registry(args.file, args.on_conflict) else 1)
+
+    elif args.command == 'extract':
+        password = getpass.getpass("Enter password (or Master Key): ")
+        success, message = cli.core.extract_packed(args.path, password, args.member, args.destination)
+        cli.report(success, message, args.path)
+        sys.exit(0 if success else 1)
+
+    elif args.command == 'stats':
+        cli.show_stats(args.path, args.top, args.refresh, args.jobs)
+
+    elif args.command == 'verify':
+        if not 0 < args.sample <= 1:
+            parser.error("--sample must be between 0 and 1")
+        healthy = cli.verify(args.path, args.sample, args.confidence, args.fail_fast, args.jobs)
+        sys.exit(0 if healthy else 1)
+        
     else:
         cli.interactive_mode()
 
@@ -0,0 +1,115 @@
+"""
+asyncio front end for FolderLockCore
+
+Every call runs the blocking core method on a private, bounded thread
+pool, so tree walks never stall the event loop. A semaphore caps how many
+operations are in flight, the rest wait their turn without occupying a
+thread. Registry writes are serialized by the core's own lock, so any
+number of concurrent awaits can't clobber each other's changes.
+
+Cancelling the awaiting task cancels the operation: the worker's cancel
+event is set (FolderLockCore.set_cancel_event), a permission walk stops
+and undoes what it changed, and the task's CancelledError is raised once
+the folder is back in its previous state. Encryption and packing always
+finish once started.
+
+    async with await AsyncFolderLockCore.open() as core:
+        ok, message = await core.lock_folder('/data/a', password)
+        results = await asyncio.gather(*(core.unlock_folder(p, password) for p in paths))
+"""
+
+import asyncio
+import threading
+import contextvars
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Dict, Optional, Tuple
+from folder_lock_core import FolderLockCore, OperationResult
+
+# Worker threads, each runs one operation at a time
+DEFAULT_WORKERS = 4
+# Methods whose OperationResult becomes last_result
+RESULT_METHODS = ('lock_folder', 'unlock_folder')
+
+
+class AsyncFolderLockCore:
+    def __init__(self, core: Optional[FolderLockCore] = None, config_dir: Optional[Path] = None,
+                 max_workers: int = DEFAULT_WORKERS, max_concurrent: Optional[int] = None):
+        """Wrap core, or a new FolderLockCore(config_dir).
+
+        Loading a large registry blocks, from a running loop prefer open().
+        max_concurrent (default max_workers) bounds the operations admitted
+        at once, so a burst of calls never queues unbounded work.
+        """
+        self.core = core if core is not None else FolderLockCore(config_dir)
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='folder-lock-async')
+        self._semaphore = asyncio.Semaphore(max_concurrent or max_workers)
+        self._result = contextvars.ContextVar('folder_lock_result', default=None)
+
+    @classmethod
+    async def open(cls, config_dir: Optional[Path] = None, **options) -> 'AsyncFolderLockCore':
+        """Create the core off the event loop"""
+        core = await asyncio.get_running_loop().run_in_executor(None, FolderLockCore, config_dir)
+        return cls(core, **options)
+
+    async def _run(self, method: str, *args, **kwargs):
+        cancel = threading.Event()
+        func = getattr(self.core, method)
+        records_result = method in RESULT_METHODS
+
+        def call():
+            self.core.set_cancel_event(cancel)
+            try:
+                value = func(*args, **kwargs)
+                return value, self.core.last_result if records_result else None
+            finally:
+                self.core.set_cancel_event(None)
+
+        async with self._semaphore:
+            future = asyncio.get_running_loop().run_in_executor(self._executor, call)
+            try:
+                value, result = await asyncio.shield(future)
+            except asyncio.CancelledError:
+                cancel.set()
+                # Keep the slot until the worker has stopped and rolled back
+                try:
+                    await asyncio.shield(future)
+                except Exception:
+                    pass
+                raise
+        if records_result:
+            self._result.set(result)
+        return value
+
+    @property
+    def last_result(self) -> Optional[OperationResult]:
+        """Metrics of the last lock/unlock awaited in the current task"""
+        return self._result.get()
+
+    async def lock_folder(self, folder_path: str, password: str, **options) -> Tuple[bool, str]:
+        """See FolderLockCore.lock_folder"""
+        return await self._run('lock_folder', folder_path, password, **options)
+
+    async def unlock_folder(self, folder_path: str, password: str, **options) -> Tuple[bool, str]:
+        """See FolderLockCore.unlock_folder"""
+        return await self._run('unlock_folder', folder_path, password, **options)
+
+    async def get_all_locks(self) -> Dict:
+        return await self._run('get_all_locks')
+
+    async def get_lock_status(self) -> Dict[str, str]:
+        return await self._run('get_lock_status')
+
+    async def verify_locks(self, folder_path: Optional[str] = None, **options) -> Dict[str, Dict]:
+        """See FolderLockCore.verify_locks"""
+        return await self._run('verify_locks', folder_path, **options)
+
+    async def close(self):
+        """Wait for running operations and stop the worker threads"""
+        await asyncio.get_running_loop().run_in_executor(None, self._executor.shutdown)
+
+    async def __aenter__(self) -> 'AsyncFolderLockCore':
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.close()
@@ -0,0 +1,162 @@
+"""
+Append-only audit log of lock, unlock and extract attempts
+
+Every attempt - including wrong passwords - becomes one JSON line in
+audit/audit.log under the config directory. Callers only append to a
+bounded in-memory buffer; a background thread writes whatever has
+accumulated with one write() and one fsync() per batch, so a burst of
+attempts costs a single disk flush. A full buffer is flushed by the caller
+instead of dropping records, and everything pending is flushed at exit.
+
+The log rotates by size (audit.log.1, .2, ... oldest last). query() reads
+the files line by line, skipping rotated files that end before the
+requested time range, so the log is never loaded as a whole.
+"""
+
+import os
+import json
+import time
+import atexit
+import weakref
+import threading
+from collections import deque
+from pathlib import Path
+from typing import Dict, Iterator, Optional
+
+LOG_NAME = 'audit.log'
+MAX_BYTES = 10 * 1024 * 1024
+BACKUPS = 5
+BUFFER_SIZE = 1024
+FLUSH_INTERVAL = 1.0
+
+# Logs still open, flushed at exit; weak so a dropped log isn't kept alive
+_open_logs = weakref.WeakSet()
+
+
+@atexit.register
+def _close_all():
+    for log in list(_open_logs):
+        log.close()
+
+
+class AuditLog:
+    def __init__(self, directory: Path, max_bytes: int = MAX_BYTES, backups: int = BACKUPS,
+                 buffer_size: int = BUFFER_SIZE, flush_interval: float = FLUSH_INTERVAL):
+        self.directory = Path(directory)
+        self.path = self.directory / LOG_NAME
+        self.max_bytes = max_bytes
+        self.backups = backups
+        self.flush_interval = flush_interval
+        self._buffer = deque(maxlen=buffer_size)
+        self._cond = threading.Condition()
+        # Serializes writers so batches reach the file in order
+        self._write_lock = threading.Lock()
+        self._closed = False
+        self._thread = None
+        _open_logs.add(self)
+
+    def record(self, event: Dict):
+        """Queue one event, timestamped now unless it carries 'time'"""
+        event.setdefault('time', time.time())
+        line = json.dumps(event, separators=(',', ':')) + '\n'
+        with self._cond:
+            if len(self._buffer) == self._buffer.maxlen:
+                # Never let the ring overwrite an unwritten record
+                self._flush_locked()
+            self._buffer.append(line)
+            if self._thread is None and not self._closed:
+                self._thread = threading.Thread(target=self._run, name='audit-flusher', daemon=True)
+                self._thread.start()
+            self._cond.notify()
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while not self._buffer and not self._closed:
+                    self._cond.wait()
+                if self._closed:
+                    return
+            # Let a burst gather into one batch
+            time.sleep(self.flush_interval)
+            self.flush()
+
+    def flush(self):
+        """Write and fsync everything buffered"""
+        with self._cond:
+            batch = self._take()
+            # Taken in buffer order, written in the same order
+            self._write_lock.acquire()
+        try:
+            self._write(batch)
+        finally:
+            self._write_lock.release()
+
+    def _flush_locked(self):
+        with self._write_lock:
+            self._write(self._take())
+
+    def _take(self) -> bytes:
+        batch = ''.join(self._buffer).encode()
+        self._buffer.clear()
+        return batch
+
+    def _write(self, batch: bytes):
+        if not batch:
+            return
+        self.directory.mkdir(mode=0o700, parents=True, exist_ok=True)
+        try:
+            if self.path.stat().st_size + len(batch) > self.max_bytes:
+                self._rotate()
+        except FileNotFoundError:
+            pass
+        fd = os.open(self.path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o600)
+        try:
+            os.write(fd, batch)
+            os.fsync(fd)
+        finally:
+            os.close(fd)
+
+    def _rotate(self):
+        for index in range(self.backups, 0, -1):
+            source = self.path if index == 1 else self.path.with_name(f"{LOG_NAME}.{index - 1}")
+            if source.exists():
+                os.replace(source, self.path.with_name(f"{LOG_NAME}.{index}"))
+
+    def close(self):
+        """Flush everything and stop the background thread"""
+        with self._cond:
+            self._flush_locked()
+            self._closed = True
+            self._cond.notify()
+        _open_logs.discard(self)
+
+    def query(self, path: Optional[str] = None, since: Optional[float] = None,
+              until: Optional[float] = None) -> Iterator[Dict]:
+        """Yield logged events, oldest first, for path and/or a time range"""
+        self.flush()
+        files = [self.path.with_name(f"{LOG_NAME}.{index}") for index in range(self.backups, 0, -1)]
+        files.append(self.path)
+        # Cheap substring test before parsing lines that can't match
+        needle = json.dumps(path)[1:-1] if path is not None else None
+        for log_file in files:
+            try:
+                if since is not None and log_file.stat().st_mtime < since:
+                    continue
+                f = open(log_file, 'r')
+            except OSError:
+                continue
+            with f:
+                for line in f:
+                    if needle is not None and needle not in line:
+                        continue
+                    try:
+                        event = json.loads(line)
+                    except ValueError:
+                        continue
+                    if path is not None and event.get('path') != path:
+                        continue
+                    if since is not None and event.get('time', 0) < since:
+                        continue
+                    if until is not None and event.get('time', 0) > until:
+                        continue
+                    yield event
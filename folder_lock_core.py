@@ -1,40 +1,332 @@
 import os
 import sys
 import json
+import time
+import gc
+import queue
+import stat
 import hashlib
+import threading
 import platform
+from collections import defaultdict
+from contextlib import contextmanager, nullcontext
 from pathlib import Path
-from typing import Dict, Tuple, Optional
+from typing import Dict, Iterator, List, Tuple, Optional
+from folder_lock_registry import LockTable, decode as decode_record, encode as encode_record
+
+# Lock modes
+MODE_PERMISSIONS = 'permissions'
+MODE_ENCRYPT = 'encrypt'
+MODE_PACK = 'pack'
+
+# Number of operation records kept in history.json
+MAX_HISTORY = 200
+# Number of failed entries kept per operation record
+MAX_RECORDED_ERRORS = 50
+# Imported entries applied per hold of the registry lock
+IMPORT_BATCH = 1000
+
+
+class FolderLockError(Exception):
+    """Raised by APIs that can't report failure as a (success, message) tuple"""
+
+
+class OperationCancelled(FolderLockError):
+    """Raised when the calling thread's cancel event is set during a walk"""
+
+
+class OperationResult:
+    """Metrics collected while locking or unlocking a folder"""
+
+    def __init__(self, operation: str, path: str):
+        self.operation = operation
+        self.path = path
+        self.started = time.time()
+        self.duration = 0.0
+        self.entries = 0
+        self.bytes = 0
+        self.error_count = 0
+        self.errors: List[Tuple[str, str]] = []
+        self.success = False
+        self.message = ""
+        # Mode specific counters, e.g. encrypted_files
+        self.details: Dict = {}
+        # folder_lock_progress.ProgressReporter of a streamed operation
+        self.progress = None
+
+    def add_error(self, path, error):
+        """Record an entry that could not be processed"""
+        self.error_count += 1
+        if len(self.errors) < MAX_RECORDED_ERRORS:
+            self.errors.append((str(path), str(error)))
+        if self.progress is not None:
+            self.progress.error(path, error)
+
+    def finish(self, success: bool, message: str):
+        self.success = success
+        self.message = message
+        self.duration = time.time() - self.started
+
+    def summary(self) -> str:
+        """One-line human readable description of the metrics"""
+        text = f"{self.entries} entries, {format_size(self.bytes)} in {self.duration:.2f}s"
+        if self.details.get('unchanged'):
+            text += f", {self.details['unchanged']} already in place"
+        if self.error_count:
+            text += f", {self.error_count} failed"
+        return text
+
+    @classmethod
+    def from_dict(cls, record: Dict) -> 'OperationResult':
+        result = cls(record['operation'], record['path'])
+        for key, value in record.items():
+            setattr(result, key, value)
+        result.errors = [tuple(e) for e in record.get('errors', [])]
+        return result
+
+    def to_dict(self) -> Dict:
+        return {
+            'operation': self.operation,
+            'path': self.path,
+            'started': self.started,
+            'duration': self.duration,
+            'entries': self.entries,
+            'bytes': self.bytes,
+            'error_count': self.error_count,
+            'errors': [list(e) for e in self.errors],
+            'success': self.success,
+            'message': self.message,
+            'details': self.details,
+        }
+
+
+def format_size(num_bytes: float) -> str:
+    """Format a byte count for display"""
+    for unit in ('B', 'KB', 'MB', 'GB', 'TB'):
+        if num_bytes < 1024 or unit == 'TB':
+            return f"{num_bytes:.0f} {unit}" if unit == 'B' else f"{num_bytes:.1f} {unit}"
+        num_bytes /= 1024
+
+
+def format_duration(seconds: float) -> str:
+    """Format a duration for display"""
+    if seconds < 60:
+        return f"{seconds:.1f}s"
+    if seconds < 3600:
+        return f"{seconds // 60:.0f}m {seconds % 60:.0f}s"
+    return f"{seconds // 3600:.0f}h {seconds % 3600 // 60:.0f}m"
+
+
+def _process_start_time(pid: int) -> Optional[str]:
+    """When pid started, as an opaque string; None if it isn't running or can't be told"""
+    if platform.system() == "Windows":
+        import ctypes
+        from ctypes import wintypes
+        handle = ctypes.windll.kernel32.OpenProcess(0x1000, False, pid)  # PROCESS_QUERY_LIMITED_INFORMATION
+        if not handle:
+            return None
+        try:
+            times = [wintypes.FILETIME() for _ in range(4)]
+            if not ctypes.windll.kernel32.GetProcessTimes(handle, *(ctypes.byref(t) for t in times)):
+                return None
+            return str((times[0].dwHighDateTime << 32) | times[0].dwLowDateTime)
+        finally:
+            ctypes.windll.kernel32.CloseHandle(handle)
+    try:
+        with open(f"/proc/{pid}/stat", 'rb') as f:
+            # starttime is field 22; the command name (field 2) may contain spaces
+            return f.read().rsplit(b')', 1)[1].split()[19].decode()
+    except (OSError, IndexError):
+        pass
+    import subprocess
+    try:
+        started = subprocess.run(['ps', '-o', 'lstart=', '-p', str(pid)], capture_output=True,
+                                 text=True, timeout=5).stdout.strip()
+    except (OSError, subprocess.SubprocessError):
+        return None
+    return started or None
+
+
+def _process_alive(pid: int, started: Optional[str] = None) -> bool:
+    """Whether pid runs; with started (from _process_start_time), whether it is
+    still the same process rather than a later one that reused the pid"""
+    if platform.system() == "Windows":
+        import ctypes
+        handle = ctypes.windll.kernel32.OpenProcess(0x1000, False, pid)  # PROCESS_QUERY_LIMITED_INFORMATION
+        if not handle:
+            return False
+        ctypes.windll.kernel32.CloseHandle(handle)
+    else:
+        try:
+            os.kill(pid, 0)
+        except ProcessLookupError:
+            return False
+        except PermissionError:
+            pass
+    if started is not None:
+        current = _process_start_time(pid)
+        return current is None or current == started
+    return True
+
+
+def default_config_dir() -> Path:
+    """Registry location, overridable with FOLDER_LOCK_HOME"""
+    return Path(os.environ.get('FOLDER_LOCK_HOME') or Path.home() / '.folder_lock')
+
 
 class FolderLockCore:
-    def __init__(self):
+    def __init__(self, config_dir: Optional[Path] = None):
         self.system = platform.system()
-        self.config_dir = Path.home() / '.folder_lock'
+        self.config_dir = Path(config_dir) if config_dir else default_config_dir()
         self.config_file = self.config_dir / 'locks.json'
-        self.config_dir.mkdir(exist_ok=True)
+        self.history_file = self.config_dir / 'history.json'
+        self.config_dir.mkdir(mode=0o700, parents=True, exist_ok=True)
+        self._data_mtime = None
         self.data = self._load_data()
+        # Guards self.data, the registry files and the set of busy paths so
+        # operations on different folders can run from several threads
+        self._lock = threading.RLock()
+        self._busy = set()
+        self._local = threading.local()
+        self._relock_listeners = []
+        from folder_lock_audit import AuditLog
+        self.audit = AuditLog(self.config_dir / 'audit')
+        # folder_lock_metrics.Metrics once enabled, hooks cost one check until then
+        self.metrics = None
+        if os.environ.get('FOLDER_LOCK_METRICS'):
+            self.enable_metrics()
+        # folder_lock_sync.ChangeLog once enable_sync was called for this config directory
+        self.sync = None
+        if (self.config_dir / 'sync.json').exists():
+            from folder_lock_sync import ChangeLog
+            self.sync = ChangeLog(self.config_dir)
+            self._sync_pull()
         
     def _load_data(self) -> Dict:
         """Load locked folders database and master key"""
+        data = {'locks': {}, 'master_key_hash': None}
         if self.config_file.exists():
+            # Cyclic GC passes over a million fresh records would double the load time
+            gc_was_enabled = gc.isenabled()
+            gc.disable()
             try:
                 with open(self.config_file, 'r') as f:
-                    data = json.load(f)
+                    self._data_mtime = os.fstat(f.fileno()).st_mtime_ns
+                    data = json.load(f, object_hook=decode_record)
                     # Handle legacy format where root was just locks
                     if 'locks' not in data and 'master_key_hash' not in data:
                         # Assume it's the old format which was just the locks dict
                         # But check if it's empty or looks like locks dict
-                        return {'locks': data, 'master_key_hash': None}
-                    return data
+                        data = {'locks': data, 'master_key_hash': None}
+                data['locks'] = LockTable(data.get('locks'), data.get('revision', 0),
+                                          data.get('tombstones'), data.get('tombstone_floor', 0))
             except:
-                return {'locks': {}, 'master_key_hash': None}
-        return {'locks': {}, 'master_key_hash': None}
+                data = {'locks': LockTable(), 'master_key_hash': None}
+            finally:
+                if gc_was_enabled:
+                    gc.enable()
+            return data
+        data['locks'] = LockTable()
+        return data
     
     def _save_data(self):
         """Save locked folders database"""
-        with open(self.config_file, 'w') as f:
-            json.dump(self.data, f, indent=2)
+        with self._phase('save'):
+            locks = self.data.get('locks')
+            if isinstance(locks, LockTable):
+                self.data['revision'] = locks.revision
+                self.data['tombstones'] = locks.tombstones
+                self.data['tombstone_floor'] = locks.tombstone_floor
+            # Replaced atomically, so other processes (and exports) never read a partial file
+            tmp = self.config_file.with_name(f".{self.config_file.name}.{os.getpid()}.tmp")
+            with open(tmp, 'w') as f:
+                json.dump(self.data, f, indent=2, default=encode_record)
+            os.replace(tmp, self.config_file)
+            self._data_mtime = self.config_file.stat().st_mtime_ns
+
+    @contextmanager
+    def _measured(self, kind: str, path_str: str, result: OperationResult):
+        """Add the throughput of the enclosed phase to the history estimates are based on.
+
+        Entries skipped as already in place are left out, they cost an lstat
+        rather than a chmod and would make estimates too optimistic.
+        """
+        entries, nbytes, started = result.entries, result.bytes, time.perf_counter()
+        unchanged = result.details.get('unchanged', 0)
+        yield
+        seconds = time.perf_counter() - started
+        changed = result.entries - entries - (result.details.get('unchanged', 0) - unchanged)
+        from folder_lock_estimate import ThroughputHistory
+        from folder_lock_walk import filesystem_types, mount_point
+
+        fstypes = filesystem_types()
+        history = ThroughputHistory(self.config_dir / 'throughput.json')
+        try:
+            with self._lock:
+                devices = result.details.get('devices') if kind in ('lock', 'unlock') else None
+                if devices:
+                    # Walks across mount points are timed per filesystem
+                    for device in devices.values():
+                        history.record(mount_point(device['path'], fstypes), device['fstype'], kind,
+                                       device['entries'] - device.get('unchanged', 0), device['bytes'],
+                                       device['seconds'])
+                else:
+                    mount = mount_point(path_str, fstypes)
+                    history.record(mount, fstypes.get(mount, ''), kind, changed, result.bytes - nbytes, seconds)
+        except OSError:
+            pass
+
+    def enable_metrics(self):
+        """Start collecting metrics, exported to metrics.prom in the config directory"""
+        if self.metrics is None:
+            from folder_lock_metrics import Metrics
+            self.metrics = Metrics(self.config_dir / 'metrics.json', self.config_dir / 'metrics.prom')
+        return self.metrics
+
+    def _phase(self, name: str):
+        """Context timing a phase of an operation when metrics are enabled"""
+        progress = getattr(self._local, 'progress', None)
+        if progress is not None:
+            progress.phase(name)
+        if self.metrics is None:
+            return nullcontext()
+        return self.metrics.phase(name)
+
+    def refresh(self) -> bool:
+        """Reload the registry if another process changed it, True if reloaded"""
+        with self._lock:
+            try:
+                mtime = self.config_file.stat().st_mtime_ns
+            except OSError:
+                return False
+            if mtime == self._data_mtime:
+                return False
+            self.data = self._load_data()
+            return True
+
+    def get_history(self) -> List[Dict]:
+        """Return recorded lock/unlock operations, oldest first"""
+        if self.history_file.exists():
+            try:
+                with open(self.history_file, 'r') as f:
+                    return json.load(f)
+            except:
+                return []
+        return []
+
+    def _record_history(self, result: OperationResult):
+        """Append an operation record, keeping at most MAX_HISTORY entries"""
+        with self._lock, self._phase('history'):
+            history = self.get_history()
+            history.append(result.to_dict())
+            with open(self.history_file, 'w') as f:
+                json.dump(history[-MAX_HISTORY:], f, indent=2)
             
+    @property
+    def last_result(self) -> Optional[OperationResult]:
+        """Result of the last operation finished by the calling thread"""
+        return getattr(self._local, 'result', None)
+
     @property
     def locks(self) -> Dict:
         return self.data.get('locks', {})
@@ -44,9 +336,19 @@ class FolderLockCore:
         return self.data.get('master_key_hash')
 
     def set_master_key(self, password: str):
-        """Set or update the master key"""
-        self.data['master_key_hash'] = self._hash_password(password)
-        self._save_data()
+        """Set or update the master key
+
+        When encryption is available this also creates the key pair that
+        lets the master key open encrypted folders locked from now on.
+        """
+        from folder_lock_crypto import available, new_master_keypair
+
+        with self._lock:
+            self.data['master_key_hash'] = self._hash_password(password)
+            if available():
+                self.data['master_keypair'] = new_master_keypair(password)
+            self._save_data()
+        self._audited('set_master_key', None, True, "Master key set")
         
     def verify_master_key(self, password: str) -> bool:
         """Verify if the provided password matches the master key"""
@@ -58,57 +360,476 @@ class FolderLockCore:
         """Create secure hash of password"""
         return hashlib.sha256(password.encode()).hexdigest()
     
-    def _set_permissions_windows(self, folder_path: Path, lock: bool):
+    def _set_permissions_windows(self, folder_path: Path, lock: bool, result: OperationResult):
         """Set folder permissions on Windows using icacls"""
         try:
             path_str = str(folder_path.absolute())
             
-            if lock:
-                # Remove all permissions except for system and admin
-                # Deny read, write, and execute for current user
-                os.system(f'icacls "{path_str}" /deny %USERNAME%:(OI)(CI)F /T >nul 2>&1')
-                os.system(f'icacls "{path_str}" /inheritance:r >nul 2>&1')
-            else:
-                # Restore full permissions
-                os.system(f'icacls "{path_str}" /grant %USERNAME%:(OI)(CI)F /T >nul 2>&1')
-                os.system(f'icacls "{path_str}" /inheritance:e >nul 2>&1')
+            with self._phase('walk'):
+                if lock:
+                    # Remove all permissions except for system and admin
+                    # Deny read, write, and execute for current user
+                    os.system(f'icacls "{path_str}" /deny %USERNAME%:(OI)(CI)F /T >nul 2>&1')
+                    os.system(f'icacls "{path_str}" /inheritance:r >nul 2>&1')
+                else:
+                    # Restore full permissions
+                    os.system(f'icacls "{path_str}" /grant %USERNAME%:(OI)(CI)F /T >nul 2>&1')
+                    os.system(f'icacls "{path_str}" /inheritance:e >nul 2>&1')
             
+            # icacls walks the tree itself, only the root is accounted for
+            result.entries = 1
             return True
         except Exception as e:
             # print(f"Error setting permissions: {e}")
             return False
     
-    def _set_permissions_unix(self, folder_path: Path, lock: bool):
-        """Set folder permissions on Linux/Unix systems"""
+    def _set_permissions_unix(self, folder_path: Path, lock: bool, result: OperationResult,
+                              throttle=None, cross_devices: bool = False):
+        """Set folder permissions on Linux/Unix systems
+
+        throttle is an optional folder_lock_throttle.Throttle pacing the
+        chmod calls. Mount points inside the folder are left alone unless
+        cross_devices is set.
+
+        If the thread's cancel event is set (see set_cancel_event) the walk
+        stops and what it changed is put back: a cancelled lock reopens the
+        entries it already locked, a cancelled unlock locks the folder
+        again. It then returns False with result.details['cancelled'] set.
+        """
+        with self._phase('walk'):
+            try:
+                # Throttled walks say nothing about what the filesystem can do
+                measured = self._measured('lock' if lock else 'unlock', str(folder_path), result)
+                with measured if throttle is None else nullcontext():
+                    if throttle is not None:
+                        with throttle.priority():
+                            return self._walk_permissions_unix(folder_path, lock, result, throttle, cross_devices)
+                    return self._walk_permissions_unix(folder_path, lock, result, None, cross_devices)
+            except OperationCancelled:
+                result.details['cancelled'] = True
+                if result.progress is not None:
+                    result.progress.phase('rollback')
+                with self._uncancellable():
+                    self._walk_permissions_unix(folder_path, not lock, OperationResult('rollback', str(folder_path)),
+                                                None, cross_devices, locked_only=lock)
+                return False
+
+    def _walk_permissions_unix(self, folder_path: Path, lock: bool, result: OperationResult,
+                               throttle, cross_devices: bool, locked_only: bool = False):
+        """locked_only: unlock only entries whose mode is 000, undoing a partial lock"""
+        if cross_devices:
+            return self._walk_permissions_devices(folder_path, lock, result, throttle, locked_only)
+        from folder_lock_walk import iter_tree, chmod_nofollow
+
+        root = str(folder_path)
+        entries_before = result.entries
+        timed = throttle is not None and throttle.timed
+        metrics = self.metrics
+        if metrics is not None:
+            from folder_lock_metrics import Histogram
+            latencies = Histogram()
+        measured = timed or metrics is not None
+        cancel = self._cancel_event()
+        progress = result.progress
+        skipped = {}
+        unchanged = 0
+        root_ok = True
         try:
+            # Lock children before their directory, unlock directories before their children
+            for item, st in iter_tree(root, topdown=not lock, cross_devices=cross_devices,
+                                      skipped=skipped, on_error=result.add_error,
+                                      on_enter=progress.directory if progress is not None else None):
+                if cancel is not None and cancel.is_set():
+                    raise OperationCancelled(f"Cancelled at {item}")
+                if locked_only and stat.S_IMODE(st.st_mode):
+                    continue
+                is_dir = stat.S_ISDIR(st.st_mode)
+                if lock:
+                    mode = 0o000
+                else:
+                    mode = 0o755 if is_dir else 0o644
+                if stat.S_IMODE(st.st_mode) == mode:
+                    # Already in place, a chmod would only cost a metadata write and bump the ctime
+                    unchanged += 1
+                    result.entries += 1
+                    if not is_dir:
+                        result.bytes += st.st_size
+                    if progress is not None:
+                        progress.advance(1, 0 if is_dir else st.st_size)
+                    continue
+                try:
+                    if throttle is not None:
+                        throttle.before()
+                    if measured:
+                        started = time.perf_counter()
+                    # Not through a symlink swapped in since the walk saw the entry
+                    chmod_nofollow(item, mode, st)
+                    if measured:
+                        latency = time.perf_counter() - started
+                        if timed:
+                            throttle.after(latency)
+                        if metrics is not None:
+                            latencies.observe(latency)
+                    result.entries += 1
+                    if not is_dir:
+                        result.bytes += st.st_size
+                    if progress is not None:
+                        progress.advance(1, 0 if is_dir else st.st_size)
+                except OSError as e:
+                    result.add_error(item, e)
+                    if item == root:
+                        root_ok = False
+        except OSError as e:
+            result.add_error(root, e)
+            return False
+        finally:
+            if metrics is not None:
+                metrics.merge('chmod_seconds', latencies)
+                metrics.count('syscalls_total', latencies.count, {'call': 'chmod'})
+            if progress is not None:
+                progress.flush()
+
+        result.details['changed'] = result.details.get('changed', 0) + result.entries - entries_before - unchanged
+        result.details['unchanged'] = result.details.get('unchanged', 0) + unchanged
+        for key, count in skipped.items():
+            if count:
+                result.details[f'skipped_{key}'] = count
+        return root_ok
+
+    def _walk_permissions_devices(self, folder_path: Path, lock: bool, result: OperationResult, throttle,
+                                  locked_only: bool = False):
+        """Permission walk with one pool per filesystem inside the folder.
+
+        Each device also gets its own throttle, so backoff on a slow mount
+        doesn't slow the others down. Per device throughput goes to
+        result.details['devices'].
+        """
+        from folder_lock_walk import walk_devices, chmod_nofollow
+
+        root = str(folder_path)
+        throttles = {}
+        metrics = self.metrics
+        failed = []
+        mutex = threading.Lock()
+        unchanged = defaultdict(int)
+        progress = result.progress
+
+        def apply(path: str, st: os.stat_result):
+            if locked_only and stat.S_IMODE(st.st_mode):
+                return
             if lock:
-                # Remove all permissions (000)
-                os.chmod(folder_path, 0o000)
-                # Also lock all contents
-                for item in folder_path.rglob('*'):
-                    try:
-                        os.chmod(item, 0o000)
-                    except:
-                        pass
+                mode = 0o000
             else:
-                # Restore read, write, execute permissions (755)
-                os.chmod(folder_path, 0o755)
-                # Restore permissions for contents
-                for item in folder_path.rglob('*'):
-                    try:
-                        if item.is_dir():
-                            os.chmod(item, 0o755)
-                        else:
-                            os.chmod(item, 0o644)
-                    except:
-                        pass
-            
-            return True
-        except Exception as e:
+                mode = 0o755 if stat.S_ISDIR(st.st_mode) else 0o644
+            if stat.S_IMODE(st.st_mode) == mode:
+                with mutex:
+                    unchanged[st.st_dev] += 1
+                if progress is not None:
+                    progress.advance(1, 0 if stat.S_ISDIR(st.st_mode) else st.st_size)
+                return
+            device_throttle = None
+            if throttle is not None:
+                with mutex:
+                    device_throttle = throttles.get(st.st_dev)
+                    if device_throttle is None:
+                        device_throttle = throttles[st.st_dev] = throttle.clone()
+                device_throttle.before()
+            started = time.perf_counter()
+            chmod_nofollow(path, mode, st)
+            latency = time.perf_counter() - started
+            if device_throttle is not None and device_throttle.timed:
+                device_throttle.after(latency)
+            if metrics is not None:
+                metrics.observe('chmod_seconds', latency)
+                metrics.count('syscalls_total', 1, {'call': 'chmod'})
+            if progress is not None:
+                progress.advance(1, 0 if stat.S_ISDIR(st.st_mode) else st.st_size)
+
+        def on_error(path, error):
+            if path == root:
+                failed.append(path)
+            result.add_error(path, error)
+
+        initializer = None
+        if throttle is not None and throttle.low_priority:
+            from folder_lock_throttle import lower_thread_priority
+            initializer = lower_thread_priority
+
+        skipped = {}
+        cancel = self._cancel_event()
+        try:
+            devices = walk_devices(root, not lock, apply, on_error, skipped, initializer, cancel,
+                                   progress.directory if progress is not None else None)
+        except OSError as e:
+            result.add_error(root, e)
             return False
-    
-    def lock_folder(self, folder_path: str, password: str) -> Tuple[bool, str]:
-        """Lock a folder with password protection"""
+        finally:
+            if progress is not None:
+                progress.flush()
+        if cancel is not None and cancel.is_set():
+            raise OperationCancelled(f"Cancelled while walking {root}")
+
+        entries = sum(device['entries'] for device in devices.values())
+        for dev, device in devices.items():
+            result.entries += device['entries']
+            result.bytes += device['bytes']
+            device['unchanged'] = unchanged[dev]
+        result.details['devices'] = devices
+        result.details['changed'] = result.details.get('changed', 0) + entries - sum(unchanged.values())
+        result.details['unchanged'] = result.details.get('unchanged', 0) + sum(unchanged.values())
+        for key, count in skipped.items():
+            if count:
+                result.details[f'skipped_{key}'] = count
+        return not failed
+
+    def _encrypt_contents(self, path_str: str, password: str, record: Optional[Dict],
+                          result: OperationResult, integrity_root: Optional[str] = None,
+                          cross_devices: bool = False) -> Tuple[bool, str]:
+        """Encrypt a folder's files, recording the key first so a crash can resume"""
+        import folder_lock_crypto as crypto
+
+        try:
+            if record is not None:
+                # Resuming: the key was stored by the interrupted run
+                if self._hash_password(password) != record['password_hash']:
+                    return False, "Invalid password"
+                key = crypto.unwrap_key(record['encryption'], password)
+                # Resume over the same files the interrupted run chose
+                cross_devices = record.get('cross_devices', False)
+            else:
+                key, info = crypto.new_key_info(password, self.data.get('master_keypair'))
+                info['state'] = 'encrypting'
+                with self._lock:
+                    self.data.setdefault('locks', {})[path_str] = {
+                        'password_hash': self._hash_password(password),
+                        'original_path': path_str,
+                        'system': self.system,
+                        'name': Path(path_str).name,
+                        'mode': MODE_ENCRYPT,
+                        'encryption': info,
+                    }
+                    if integrity_root:
+                        self.data['locks'][path_str]['integrity'] = integrity_root
+                    if cross_devices:
+                        self.data['locks'][path_str]['cross_devices'] = True
+                    self._save_data()
+            chunk_size = self.locks[path_str]['encryption']['chunk_size']
+            with self._phase('encrypt'), self._measured('encrypt', path_str, result):
+                encrypted = crypto.process_tree(path_str, key, True, result, chunk_size,
+                                                cross_devices=cross_devices)
+            if not encrypted:
+                return False, f"{result.error_count} files could not be encrypted, lock again to resume"
+        except crypto.EncryptionError as e:
+            return False, str(e)
+        return True, ""
+
+    def _manifest_file(self, path_str: str) -> Path:
+        from folder_lock_walk import cache_name
+
+        manifest_dir = self.config_dir / 'manifests'
+        manifest_dir.mkdir(mode=0o700, exist_ok=True)
+        return manifest_dir / f"{cache_name(path_str)}.json"
+
+    def _build_manifest(self, path_str: str, result: OperationResult, cross_devices: bool = False) -> str:
+        """Hash the folder into its manifest file, returns the Merkle root"""
+        import folder_lock_integrity as integrity
+
+        manifest_file = self._manifest_file(path_str)
+        started = time.time()
+        # The manifest left by the previous lock doubles as the hash cache
+        with self._phase('hash'):
+            manifest = integrity.build_manifest(path_str, integrity.load_manifest(manifest_file),
+                                                cross_devices=cross_devices)
+        integrity.save_manifest(manifest_file, manifest)
+        result.details['manifest_files'] = len(manifest['files'])
+        result.details['manifest_unreadable'] = len(manifest['unreadable'])
+        result.details['manifest_seconds'] = time.time() - started
+        return manifest['root']
+
+    def _verify_manifest(self, path_str: str, expected_root: str, result: OperationResult,
+                         cross_devices: bool = False) -> Dict:
+        """Rehash the folder and compare it with the manifest stored at lock time"""
+        import folder_lock_integrity as integrity
+
+        manifest_file = self._manifest_file(path_str)
+        expected = integrity.load_manifest(manifest_file)
+        with self._phase('hash'):
+            actual = integrity.build_manifest(path_str, cross_devices=cross_devices)
+        if expected is None or expected.get('root') != expected_root:
+            # The manifest itself was lost or edited, nothing can be vouched for
+            report = {'verified': False, 'manifest_missing': True, 'change_count': len(actual['files']),
+                      'changed': [], 'added': sorted(actual['files'])[:integrity.MAX_REPORTED_PATHS], 'removed': [],
+                      'unreadable_count': len(actual['unreadable']),
+                      'unreadable': actual['unreadable'][:integrity.MAX_REPORTED_PATHS]}
+        else:
+            report = integrity.compare(expected, actual)
+        # Keep the fresh hashes as the cache for the next lock
+        integrity.save_manifest(manifest_file, actual)
+        result.details['integrity'] = report
+        return report
+
+    def _decrypt_contents(self, path_str: str, password: str, result: OperationResult) -> Tuple[bool, str]:
+        """Decrypt a folder's files, the record stays until every file is restored"""
+        import folder_lock_crypto as crypto
+
+        with self._lock:
+            # Stored as a new record, exports may still be reading the old one
+            record = self.data['locks'][path_str].to_dict()
+            info = record['encryption'] = dict(record['encryption'], state='decrypting')
+            self.data['locks'][path_str] = record
+            self._save_data()
+        try:
+            key = crypto.unwrap_key(info, password, self.data.get('master_keypair'))
+            with self._phase('decrypt'), self._measured('decrypt', path_str, result):
+                decrypted = crypto.process_tree(path_str, key, False, result, info['chunk_size'],
+                                                cross_devices=record.get('cross_devices', False))
+            if not decrypted:
+                return False, f"{result.error_count} files could not be decrypted, unlock again to resume"
+        except crypto.EncryptionError as e:
+            return False, str(e)
+        return True, ""
+
+    def _archive_files(self, path_str: str) -> Tuple[Path, Path]:
+        from folder_lock_walk import cache_name
+
+        archive_dir = self.config_dir / 'archives'
+        archive_dir.mkdir(mode=0o700, exist_ok=True)
+        name = cache_name(path_str)
+        return archive_dir / f"{name}.pack", archive_dir / f"{name}.idx"
+
+    def _pack_contents(self, path_str: str, result: OperationResult,
+                       cross_devices: bool = False) -> Tuple[bool, str, Optional[Dict]]:
+        """Copy a folder's contents into an archive, returns its record entry"""
+        import folder_lock_pack as pack
+
+        archive, index = self._archive_files(path_str)
+        try:
+            with self._phase('pack'), self._measured('pack', path_str, result):
+                entries = pack.build_archive(path_str, archive, index, result, cross_devices)
+        except (OSError, pack.PackError) as e:
+            return False, f"Could not pack folder: {e}", None
+        result.details['packed_bytes'] = archive.stat().st_size
+        return True, "", {'archive': archive.name, 'index': index.name, 'members': len(entries)}
+
+    def _clear_packed(self, path_str: str, cross_devices: bool) -> Tuple[bool, str]:
+        """Remove the packed originals; if the folder changed meanwhile, restore
+        what was removed and drop the record and archive again"""
+        import folder_lock_pack as pack
+
+        archive, index = self._archive_files(path_str)
+        try:
+            pack.clear_tree(path_str, index, cross_devices)
+            return True, ""
+        except pack.PackError as e:
+            reason = str(e)
+        try:
+            pack.unpack_tree(path_str, archive, index, OperationResult('rollback', path_str), missing_only=True)
+        except (OSError, ValueError, pack.PackError) as e:
+            # The record stays, unlocking extracts the archive
+            return False, f"Folder changed while packing ({reason}) and could not be restored: {e}"
+        with self._lock:
+            self.data['locks'].pop(path_str, None)
+            self._save_data()
+        pack.remove_archive(archive, index)
+        return False, f"Folder changed while packing, nothing was locked: {reason}"
+
+    def _unpack_contents(self, path_str: str, result: OperationResult) -> Tuple[bool, str]:
+        """Extract a packed folder back in place, the archive stays until the record is gone"""
+        import folder_lock_pack as pack
+
+        archive, index = self._archive_files(path_str)
+        try:
+            with self._phase('unpack'), self._measured('unpack', path_str, result):
+                pack.unpack_tree(path_str, archive, index, result)
+        except (OSError, ValueError, pack.PackError) as e:
+            return False, f"Could not unpack folder: {e}"
+        return True, ""
+
+    def extract_packed(self, folder_path: str, password: str, member: str, destination: str) -> Tuple[bool, str]:
+        """Copy one file out of a packed folder without unlocking it"""
+        import folder_lock_pack as pack
+
+        path_str = str(Path(folder_path).resolve())
+        record = self.locks.get(path_str)
+        if record is None or record.get('mode') != MODE_PACK:
+            return self._audited('extract', path_str, False, "Folder is not locked in pack mode", member=member)
+        if self._hash_password(password) != record['password_hash'] and not self.verify_master_key(password):
+            return self._audited('extract', path_str, False, "Invalid password", member=member)
+        archive, index = self._archive_files(path_str)
+        try:
+            entry = pack.extract_member(archive, index, member, destination)
+        except (OSError, ValueError, pack.PackError) as e:
+            return self._audited('extract', path_str, False, str(e), member=member)
+        return self._audited('extract', path_str, True, f"Extracted {entry['path']} ({format_size(entry['size'])})",
+                             member=member)
+
+    def _throttle(self, settings: Optional[Dict]):
+        """Throttle for a walk from its settings dict, None when unthrottled"""
+        if not settings:
+            return None
+        from folder_lock_throttle import Throttle
+        return Throttle.from_settings(settings)
+
+    def _claim(self, path_str: str) -> bool:
+        """Mark a path as being processed, False if another thread already is"""
+        with self._lock:
+            if path_str in self._busy:
+                return False
+            self._busy.add(path_str)
+            return True
+
+    def _release(self, path_str: str):
+        with self._lock:
+            self._busy.discard(path_str)
+
+    def set_cancel_event(self, event: Optional[threading.Event]):
+        """Let setting event cancel the calling thread's operations (None: not cancellable)
+
+        Checked before an operation starts and throughout permission walks
+        and verification. Encryption, packing and their reversal run to the
+        end once started, so a folder is never left half encrypted.
+        """
+        self._local.cancel = event
+
+    def _cancel_event(self) -> Optional[threading.Event]:
+        return getattr(self._local, 'cancel', None)
+
+    def _cancel_requested(self) -> bool:
+        cancel = self._cancel_event()
+        return cancel is not None and cancel.is_set()
+
+    @contextmanager
+    def _uncancellable(self):
+        cancel = self._cancel_event()
+        self._local.cancel = None
+        try:
+            yield
+        finally:
+            self._local.cancel = cancel
+
+    def lock_folder(self, folder_path: str, password: str,
+                    relock_after: Optional[float] = None,
+                    throttle: Optional[Dict] = None,
+                    mode: str = MODE_PERMISSIONS,
+                    integrity: bool = False,
+                    cross_devices: bool = False) -> Tuple[bool, str]:
+        """Lock a folder with password protection
+
+        mode MODE_ENCRYPT also encrypts every file (see folder_lock_crypto)
+        before permissions are removed. If that is interrupted, locking
+        again with the same password resumes it. mode MODE_PACK moves the
+        contents into one compressed archive in the registry directory
+        (see folder_lock_pack), leaving only the empty folder to lock. integrity=True stores a
+        Merkle manifest of the contents that unlock_folder verifies.
+
+        relock_after (minutes) is stored as the folder's default for
+        unlock_folder, which then relocks it automatically. throttle
+        ({'max_ops', 'adaptive', 'low_priority'}, see folder_lock_throttle)
+        paces this walk and is kept as the default for later unlocks and
+        relocks of the folder. Mount points inside the folder are skipped
+        unless cross_devices is set, which is remembered the same way.
+        """
+        self._local.result = None
         path = Path(folder_path).resolve()
         
         if not path.exists():
@@ -118,38 +839,180 @@ class FolderLockCore:
             return False, "Path is not a folder"
         
         path_str = str(path)
+        # Another host may have locked it meanwhile
+        self._sync_pull()
         
-        if path_str in self.locks:
+        if not self._claim(path_str):
+            return self._audited('lock', path_str, False, "Folder is busy with another operation")
+        try:
+            success, message = self._lock_claimed(path, path_str, password, relock_after, throttle, mode,
+                                                  integrity, cross_devices)
+        finally:
+            self._release(path_str)
+        return self._audited('lock', path_str, success, message, mode=mode)
+
+    def _lock_claimed(self, path: Path, path_str: str, password: str,
+                      relock_after: Optional[float], throttle: Optional[Dict],
+                      mode: str, integrity: bool, cross_devices: bool) -> Tuple[bool, str]:
+        record = self.locks.get(path_str)
+        resuming = record is not None and record.get('encryption', {}).get('state') == 'encrypting'
+        if record is not None and not resuming:
             return False, "Folder is already locked"
+        if self._cancel_requested():
+            return False, "Operation cancelled"
         
-        # Set OS permissions
-        if self.system == "Windows":
-            success = self._set_permissions_windows(path, lock=True)
-        else:
-            success = self._set_permissions_unix(path, lock=True)
+        result = OperationResult('lock', path_str)
+        result.progress = getattr(self._local, 'progress', None)
+        integrity_root = record.get('integrity') if resuming else None
+        if integrity and not resuming:
+            # Hash the plaintext before anything is encrypted or locked
+            integrity_root = self._build_manifest(path_str, result, cross_devices)
+            if self._cancel_requested():
+                return self._finish(result, False, "Operation cancelled")
+        if resuming or mode == MODE_ENCRYPT:
+            ok, message = self._encrypt_contents(path_str, password, record, result, integrity_root,
+                                                 cross_devices)
+            if not ok:
+                return self._finish(result, False, message)
+        packed = None
+        if mode == MODE_PACK and not resuming:
+            ok, message, packed = self._pack_contents(path_str, result, cross_devices)
+            if not ok:
+                return self._finish(result, False, message)
+            # Record the archive before the originals are removed
+            with self._lock:
+                self.data.setdefault('locks', {})[path_str] = {
+                    'password_hash': self._hash_password(password),
+                    'original_path': path_str,
+                    'system': self.system,
+                    'name': path.name,
+                    'mode': MODE_PACK,
+                    'pack': packed,
+                }
+                if integrity_root:
+                    self.data['locks'][path_str]['integrity'] = integrity_root
+                self._save_data()
+            ok, message = self._clear_packed(path_str, cross_devices)
+            if not ok:
+                return self._finish(result, False, message)
+        
+        # Set OS permissions, encrypted or packed contents are locked in full
+        # since rolling back would leave them open
+        irreversible = resuming or mode in (MODE_ENCRYPT, MODE_PACK)
+        with self._uncancellable() if irreversible else nullcontext():
+            if self.system == "Windows":
+                success = self._set_permissions_windows(path, True, result)
+            else:
+                success = self._set_permissions_unix(path, True, result, self._throttle(throttle), cross_devices)
         
         if not success:
-            return False, "Failed to set OS permissions"
+            if result.details.get('cancelled'):
+                return self._finish(result, False, "Operation cancelled, permissions restored")
+            return self._finish(result, False, "Failed to set OS permissions")
         
         # Store password hash
-        if 'locks' not in self.data:
-            self.data['locks'] = {}
-            
-        self.data['locks'][path_str] = {
-            'password_hash': self._hash_password(password),
-            'original_path': str(path),
-            'system': self.system,
-            'name': path.name
-        }
-        self._save_data()
+        with self._lock:
+            if 'locks' not in self.data:
+                self.data['locks'] = LockTable()
+                
+            encryption = self.data['locks'].get(path_str, {}).get('encryption')
+            self.data['locks'][path_str] = {
+                'password_hash': self._hash_password(password),
+                'original_path': str(path),
+                'system': self.system,
+                'name': path.name
+            }
+            if integrity_root:
+                self.data['locks'][path_str]['integrity'] = integrity_root
+            if encryption:
+                self.data['locks'][path_str]['mode'] = MODE_ENCRYPT
+                self.data['locks'][path_str]['encryption'] = dict(encryption, state='encrypted')
+            if packed:
+                self.data['locks'][path_str]['mode'] = MODE_PACK
+                self.data['locks'][path_str]['pack'] = packed
+            if relock_after:
+                self.data['locks'][path_str]['relock_after'] = relock_after
+            if throttle:
+                self.data['locks'][path_str]['throttle'] = throttle
+            if cross_devices:
+                self.data['locks'][path_str]['cross_devices'] = True
+            # Locked by hand before its timer fired
+            cancelled = self.data.get('relock', {}).pop(path_str, None) is not None
+            self._save_data()
         
-        return True, "Folder locked successfully"
+        if cancelled:
+            self._notify_relock(path_str, None)
+        self._publish([('lock', path_str, self._sync_record(path_str))])
+        return self._finish(result, True, "Folder locked successfully")
     
-    def unlock_folder(self, folder_path: str, password: str) -> Tuple[bool, str]:
-        """Unlock a folder with password verification (supports master key)"""
+    def estimate_lock(self, folder_path: str, mode: str = MODE_PERMISSIONS, cross_devices: bool = False,
+                      time_budget: Optional[float] = None) -> Dict:
+        """Dry run of lock_folder: expected size and duration, nothing is changed.
+
+        The tree is sampled, not walked (folder_lock_estimate.estimate_tree),
+        and the duration predicted from earlier runs on the same filesystem.
+        'predictions' holds the expected seconds for every mode, 'seconds'
+        the one for mode. 'basis' tells whether the rates were measured on
+        this filesystem ('device'), on others of its type ('fstype') or are
+        built-in defaults ('default'), the weakest of those involved.
+        """
+        from folder_lock_estimate import TIME_BUDGET, ThroughputHistory, estimate_tree
+        from folder_lock_walk import filesystem_types, mount_point
+
+        path_str = str(Path(folder_path).resolve())
+        if not os.path.isdir(path_str):
+            raise FolderLockError("Folder does not exist")
+        if path_str in self.locks:
+            raise FolderLockError("Folder is already locked")
+
+        estimate = estimate_tree(path_str, cross_devices, time_budget or TIME_BUDGET)
+        fstypes = filesystem_types()
+        mount = mount_point(path_str, fstypes)
+        fstype = fstypes.get(mount, '')
+        history = ThroughputHistory(self.config_dir / 'throughput.json')
+        bases = ('default', 'fstype', 'device')
+
+        walk_rate, walk_basis = history.rate(mount, fstype, 'lock')
+        walk = estimate['entries'] / walk_rate
+        predictions = {MODE_PERMISSIONS: {'seconds': walk, 'basis': walk_basis}}
+        # Packing removes the tree instead of walking it, which costs about the same per entry
+        for content_mode in (MODE_ENCRYPT, MODE_PACK):
+            rate, basis = history.rate(mount, fstype, content_mode)
+            predictions[content_mode] = {
+                'seconds': walk + estimate['bytes'] / rate,
+                'basis': min(walk_basis, basis, key=bases.index),
+            }
+        estimate.update(path=path_str, mount=mount, fstype=fstype, mode=mode, predictions=predictions,
+                        seconds=predictions[mode]['seconds'], basis=predictions[mode]['basis'])
+        return estimate
+
+    def unlock_folder(self, folder_path: str, password: str,
+                      relock_after: Optional[float] = None,
+                      throttle: Optional[Dict] = None) -> Tuple[bool, str]:
+        """Unlock a folder with password verification (supports master key)
+
+        With relock_after (minutes, defaulting to the value given at lock
+        time; 0 disables it) the folder is scheduled to be locked again
+        with the same password. The deadline is kept in the registry and
+        applied by a RelockScheduler. throttle overrides the folder's
+        default throttle settings for this walk.
+        """
+        self._local.result = None
+        self._local.credential = None
         path = Path(folder_path).resolve()
         path_str = str(path)
+        self._sync_pull()
         
+        if not self._claim(path_str):
+            return self._audited('unlock', path_str, False, "Folder is busy with another operation")
+        try:
+            success, message = self._unlock_claimed(path, path_str, password, relock_after, throttle)
+        finally:
+            self._release(path_str)
+        return self._audited('unlock', path_str, success, message, credential=self._local.credential)
+
+    def _unlock_claimed(self, path: Path, path_str: str, password: str,
+                        relock_after: Optional[float], throttle: Optional[Dict]) -> Tuple[bool, str]:
         if path_str not in self.locks:
             return False, "Folder is not locked or not found in database"
         
@@ -157,24 +1020,846 @@ class FolderLockCore:
         password_hash = self._hash_password(password)
         is_correct_password = password_hash == self.locks[path_str]['password_hash']
         is_master_key = self.verify_master_key(password)
+        self._local.credential = 'password' if is_correct_password else 'master_key' if is_master_key else None
         
         if not is_correct_password and not is_master_key:
             return False, "Invalid password"
+        if self._cancel_requested():
+            return False, "Operation cancelled"
+        if self.locks[path_str].get('mode') == MODE_PACK:
+            # Without its archive the folder would be opened up empty
+            missing = [p.name for p in self._archive_files(path_str) if not p.exists()]
+            if missing:
+                return False, f"Archive of this packed folder is missing: {', '.join(missing)}"
         
         # Restore OS permissions
+        result = OperationResult('unlock', path_str)
+        result.progress = getattr(self._local, 'progress', None)
+        if throttle is None:
+            throttle = self.locks[path_str].get('throttle')
         if self.system == "Windows":
-            success = self._set_permissions_windows(path, lock=False)
+            success = self._set_permissions_windows(path, False, result)
         else:
-            success = self._set_permissions_unix(path, lock=False)
+            success = self._set_permissions_unix(path, False, result, self._throttle(throttle),
+                                                 self.locks[path_str].get('cross_devices', False))
         
         if not success:
-            return False, "Failed to restore permissions"
+            if result.details.get('cancelled'):
+                return self._finish(result, False, "Operation cancelled, folder locked again")
+            return self._finish(result, False, "Failed to restore permissions")
+        
+        mode = self.locks[path_str].get('mode')
+        if mode == MODE_ENCRYPT:
+            ok, message = self._decrypt_contents(path_str, password, result)
+            if not ok:
+                return self._finish(result, False, message)
+        elif mode == MODE_PACK:
+            ok, message = self._unpack_contents(path_str, result)
+            if not ok:
+                return self._finish(result, False, message)
+        
+        integrity_note = ""
+        if self.locks[path_str].get('integrity'):
+            report = self._verify_manifest(path_str, self.locks[path_str]['integrity'], result,
+                                           self.locks[path_str].get('cross_devices', False))
+            if report['verified']:
+                integrity_note = ", contents verified unchanged"
+            else:
+                integrity_note = f", WARNING: {report['change_count']} paths changed while locked"
+                if report['unreadable_count']:
+                    integrity_note += f", {report['unreadable_count']} could not be read"
         
         # Remove from database
-        del self.data['locks'][path_str]
-        self._save_data()
+        with self._lock:
+            record = self.data['locks'].pop(path_str)
+            if relock_after is None:
+                relock_after = record.get('relock_after')
+            deadline = None
+            # Relocking only restores permissions, it can't re-encrypt or repack
+            relockable = mode not in (MODE_ENCRYPT, MODE_PACK)
+            if relock_after and relockable:
+                # Keep the record so the folder relocks with the same password
+                deadline = time.time() + relock_after * 60
+                self.data.setdefault('relock', {})[path_str] = {'deadline': deadline, 'record': record}
+            self._save_data()
+        if not self._host_only(record):
+            self._publish([('unlock', path_str, None)])
+        if mode == MODE_PACK:
+            import folder_lock_pack
+            folder_lock_pack.remove_archive(*self._archive_files(path_str))
         
-        return True, "Folder unlocked successfully"
+        message = "Folder unlocked successfully" + integrity_note
+        if relock_after and not relockable:
+            message += " (auto-relock is not available for encrypted or packed folders)"
+        if deadline is not None:
+            self._notify_relock(path_str, deadline)
+            message += f", relocking in {relock_after:g} min"
+        return self._finish(result, True, message)
+
+    def lock_folder_stream(self, folder_path: str, password: str, batch_size: Optional[int] = None,
+                           **options) -> Iterator:
+        """lock_folder, yielding progress events while it runs
+
+        Yields folder_lock_progress events: PhaseChanged, DirectoryEntered,
+        BatchDone every batch_size entries (with the rate of that batch),
+        EntryError, and last a Finished carrying (success, message) and the
+        OperationResult. options are those of lock_folder. Closing the
+        generator early cancels the operation like set_cancel_event does;
+        close() returns once the permissions have been put back.
+        """
+        return self._stream(self.lock_folder, (folder_path, password), options, batch_size)
+
+    def unlock_folder_stream(self, folder_path: str, password: str, batch_size: Optional[int] = None,
+                             **options) -> Iterator:
+        """unlock_folder, yielding progress events while it runs (see lock_folder_stream)"""
+        return self._stream(self.unlock_folder, (folder_path, password), options, batch_size)
+
+    def _stream(self, operation, args: tuple, options: Dict, batch_size: Optional[int]) -> Iterator:
+        from folder_lock_progress import BATCH_SIZE, QUEUE_SIZE, Finished, ProgressReporter
+
+        # Bounded: a slow consumer slows the walk down instead of piling up events
+        events = queue.Queue(maxsize=QUEUE_SIZE)
+        done = object()
+        cancel = threading.Event()
+        closed = threading.Event()
+
+        def emit(event):
+            while not closed.is_set():
+                try:
+                    events.put(event, timeout=0.1)
+                    return
+                except queue.Full:
+                    pass
+
+        reporter = ProgressReporter(emit, batch_size or BATCH_SIZE)
+        actor = getattr(self._local, 'actor', None)
+        outcome = {}
+
+        # The operation runs on its own thread so the walk needn't know about
+        # generators; events cross over through the queue
+        def run():
+            self._local.progress = reporter
+            self._local.actor = actor
+            self.set_cancel_event(cancel)
+            try:
+                outcome['value'] = operation(*args, **options)
+                outcome['result'] = self.last_result
+            except BaseException as e:
+                outcome['error'] = e
+            finally:
+                self._local.progress = None
+                self.set_cancel_event(None)
+                emit(done)
+
+        worker = threading.Thread(target=run, name='folder-lock-stream', daemon=True)
+        worker.start()
+        finished = False
+        try:
+            while True:
+                event = events.get()
+                if event is done:
+                    break
+                yield event
+            finished = True
+        finally:
+            if not finished:
+                cancel.set()
+                # Nobody reads the queue any more, the worker mustn't wait on it
+                closed.set()
+            worker.join()
+        if 'error' in outcome:
+            raise outcome['error']
+        success, message = outcome['value']
+        self._local.result = outcome['result']
+        yield Finished(success, message, outcome['result'])
+
+    @contextmanager
+    def temporarily_unlocked(self, folder_path: str, password: str, subpaths: Optional[List[str]] = None):
+        """Open a locked folder for the duration of a with block
+
+        Only the root, the directories leading to each subpath and the
+        subpaths themselves (the whole folder when none are given) are
+        made accessible, and exactly those are locked again on exit. The
+        registry is not touched, the folder stays listed as locked. What
+        was opened is journaled first, so if the process dies inside the
+        block the next recover_temporary_access (run by the daemon and the
+        GUI every few seconds and by apply_expired_relocks) locks it again.
+
+        Raises FolderLockError for a wrong password, unknown, encrypted or
+        packed folders and subpaths outside the folder.
+        """
+        path = Path(folder_path).resolve()
+        path_str = str(path)
+        record = self.locks.get(path_str)
+        if record is None:
+            raise FolderLockError("Folder is not locked or not found in database")
+        if record.get('mode') in (MODE_ENCRYPT, MODE_PACK):
+            raise FolderLockError("Temporary access needs a folder locked with permissions only")
+        if self._hash_password(password) != record['password_hash'] and not self.verify_master_key(password):
+            self._audited('temporary_unlock', path_str, False, "Invalid password")
+            raise FolderLockError("Invalid password")
+
+        targets = [path_str]
+        if subpaths:
+            targets = []
+            for subpath in subpaths:
+                target = os.path.normpath(os.path.join(path_str, subpath))
+                if os.path.commonpath([path_str, target]) != path_str:
+                    raise FolderLockError(f"{subpath} is outside the folder")
+                targets.append(target)
+        # Directories that must be searchable to reach the targets, root first
+        ancestors = sorted({parent for target in targets for parent in self._parents(path_str, target)},
+                           key=lambda p: p.count(os.sep))
+
+        if not self._claim(path_str):
+            raise FolderLockError("Folder is busy with another operation")
+        journal = {'path': path_str, 'pid': os.getpid(), 'pid_started': _process_start_time(os.getpid()),
+                   'started': time.time(),
+                   'targets': targets, 'ancestors': ancestors}
+        try:
+            self._write_journal(journal)
+            result = OperationResult('temporary_unlock', path_str)
+            throttle = self._throttle(record.get('throttle'))
+            cross_devices = record.get('cross_devices', False)
+            try:
+                self._open_temporarily(path, targets, ancestors, result, throttle, cross_devices)
+            except (OSError, FolderLockError) as e:
+                self._close_temporarily(journal)
+                self._finish(result, False, str(e))
+                self._audited('temporary_unlock', path_str, False, str(e))
+                raise FolderLockError(str(e))
+            self._finish(result, True, f"Opened {len(targets)} path(s) temporarily")
+            self._audited('temporary_unlock', path_str, True, result.message, targets=targets)
+            yield path
+        finally:
+            if self._journal_file(path_str).exists():
+                success, message = self._close_temporarily(journal)
+                self._audited('temporary_relock', path_str, success, message)
+            self._release(path_str)
+
+    @staticmethod
+    def _parents(root: str, target: str) -> List[str]:
+        """root and the directories between it and target, target excluded"""
+        parents = []
+        parent = os.path.dirname(target)
+        while target != root and len(parent) >= len(root):
+            parents.append(parent)
+            parent = os.path.dirname(parent)
+        return parents
+
+    def _journal_file(self, path_str: str) -> Path:
+        from folder_lock_walk import cache_name
+
+        return self.config_dir / 'temporary' / f"{cache_name(path_str)}.json"
+
+    def _write_journal(self, journal: Dict):
+        journal_file = self._journal_file(journal['path'])
+        journal_file.parent.mkdir(mode=0o700, exist_ok=True)
+        fd = os.open(journal_file, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+        with os.fdopen(fd, 'w') as f:
+            json.dump(journal, f)
+            f.flush()
+            os.fsync(f.fileno())
+
+    def _open_temporarily(self, path: Path, targets: List[str], ancestors: List[str],
+                          result: OperationResult, throttle, cross_devices: bool):
+        if self.system == "Windows":
+            # icacls grants recursively, only the whole folder can be opened
+            if not self._set_permissions_windows(path, False, result):
+                raise FolderLockError("Failed to restore permissions")
+            return
+        from folder_lock_walk import chmod_nofollow
+
+        for directory in ancestors:
+            # Never chmod through a symlink planted inside the folder
+            st = os.lstat(directory)
+            if stat.S_ISLNK(st.st_mode):
+                raise FolderLockError(f"{directory} is a symlink")
+            chmod_nofollow(directory, 0o755, st)
+            result.entries += 1
+        for target in targets:
+            if stat.S_ISLNK(os.lstat(target).st_mode):
+                raise FolderLockError(f"{target} is a symlink")
+            self._set_permissions_unix(Path(target), False, result, throttle, cross_devices)
+
+    def _close_temporarily(self, journal: Dict) -> Tuple[bool, str]:
+        """Lock again what a journal says was opened, dropping the journal on success"""
+        path_str = journal['path']
+        record = self.locks.get(path_str, {})
+        result = OperationResult('relock', path_str)
+        if not os.path.isdir(path_str):
+            success, message = False, "Folder does not exist"
+        elif self.system == "Windows":
+            success = self._set_permissions_windows(Path(path_str), True, result)
+            message = "Folder relocked" if success else "Failed to set OS permissions"
+        else:
+            throttle = self._throttle(record.get('throttle'))
+            for target in journal['targets']:
+                if os.path.lexists(target) and not os.path.islink(target):
+                    self._set_permissions_unix(Path(target), True, result, throttle,
+                                               record.get('cross_devices', False))
+            # Deepest first, each directory stays searchable until its contents are done
+            from folder_lock_walk import chmod_nofollow
+
+            for directory in reversed(journal['ancestors']):
+                try:
+                    st = os.lstat(directory)
+                    if not stat.S_ISLNK(st.st_mode):
+                        chmod_nofollow(directory, 0o000, st)
+                        result.entries += 1
+                except OSError as e:
+                    result.add_error(directory, e)
+            success = result.error_count == 0
+            message = "Folder relocked" if success else f"{result.error_count} entries could not be relocked"
+        if success or not os.path.isdir(path_str):
+            try:
+                self._journal_file(path_str).unlink()
+            except FileNotFoundError:
+                pass
+        return self._finish(result, success, message)
+
+    def recover_temporary_access(self) -> List[Tuple[str, bool, str]]:
+        """Relock folders left open by processes that died inside temporarily_unlocked.
+
+        The journal holds the pid and its start time, so a new process that
+        reused the pid doesn't keep the folder open.
+        """
+        journal_dir = self.config_dir / 'temporary'
+        if not journal_dir.is_dir():
+            return []
+        outcomes = []
+        for journal_file in journal_dir.glob('*.json'):
+            try:
+                with open(journal_file, 'r') as f:
+                    journal = json.load(f)
+            except (OSError, ValueError):
+                continue
+            alive = _process_alive(journal['pid'], journal.get('pid_started'))
+            if alive and (journal['pid'] != os.getpid() or journal['path'] in self._busy):
+                continue
+            if not self._claim(journal['path']):
+                continue
+            try:
+                success, message = self._close_temporarily(journal)
+            finally:
+                self._release(journal['path'])
+            self._audited('temporary_relock', journal['path'], success, message, recovered=True)
+            outcomes.append((journal['path'], success, message))
+        return outcomes
+
+    def add_relock_listener(self, listener):
+        """Call listener(path, deadline) when a relock is scheduled (deadline None when cancelled)"""
+        self._relock_listeners.append(listener)
+
+    def _notify_relock(self, path_str: str, deadline: Optional[float]):
+        for listener in self._relock_listeners:
+            listener(path_str, deadline)
+
+    def get_pending_relocks(self) -> Dict[str, float]:
+        """Map unlocked folders waiting to be relocked to their deadline"""
+        with self._lock:
+            return {p: entry['deadline'] for p, entry in self.data.get('relock', {}).items()}
+
+    def cancel_relock(self, folder_path: str) -> bool:
+        """Keep an unlocked folder unlocked, False if no relock was pending"""
+        path_str = str(Path(folder_path).resolve())
+        with self._lock:
+            if self.data.get('relock', {}).pop(path_str, None) is None:
+                return False
+            self._save_data()
+        self._notify_relock(path_str, None)
+        return True
+
+    def apply_expired_relocks(self, now: Optional[float] = None) -> List[Tuple[str, bool, str]]:
+        """Relock every folder whose deadline has passed, saving the registry once"""
+        now = time.time() if now is None else now
+        with self._lock:
+            due = [p for p, entry in self.data.get('relock', {}).items() if entry['deadline'] <= now]
+
+        outcomes = self.recover_temporary_access()
+        relocked = {}
+        for path_str in due:
+            if not self._claim(path_str):
+                # Busy: stays pending, RelockScheduler tries again after RETRY_DELAY
+                continue
+            try:
+                result = OperationResult('relock', path_str)
+                path = Path(path_str)
+                if not path.is_dir():
+                    success, message = False, "Folder does not exist"
+                elif self.system == "Windows":
+                    success = self._set_permissions_windows(path, True, result)
+                    message = "Folder relocked" if success else "Failed to set OS permissions"
+                else:
+                    with self._lock:
+                        entry = self.data.get('relock', {}).get(path_str)
+                    record = entry['record'] if entry else {}
+                    success = self._set_permissions_unix(path, True, result, self._throttle(record.get('throttle')),
+                                                         record.get('cross_devices', False))
+                    message = "Folder relocked" if success else "Failed to set OS permissions"
+                # A missing folder can't be relocked; after failed chmods the entry stays
+                # pending and RelockScheduler tries again after RETRY_DELAY
+                if success or not path.is_dir():
+                    relocked[path_str] = success
+                outcomes.append((path_str, success, message))
+                self._finish(result, success, message)
+                self._audited('relock', path_str, success, message)
+            finally:
+                self._release(path_str)
+
+        with self._lock:
+            pending = self.data.get('relock', {})
+            for path_str, success in relocked.items():
+                entry = pending.pop(path_str, None)
+                if success and entry is not None and path_str not in self.locks:
+                    self.data.setdefault('locks', {})[path_str] = entry['record']
+            if relocked:
+                self._save_data()
+        for path_str in relocked:
+            self._notify_relock(path_str, None)
+        if self.sync is not None:
+            records = ((path_str, self._sync_record(path_str)) for path_str, success in relocked.items() if success)
+            self._publish([('lock', path_str, record) for path_str, record in records if record is not None])
+        return outcomes
+
+    def set_actor(self, actor: Optional[Dict]):
+        """Identify who the calling thread acts for in the audit log (None: this process)"""
+        self._local.actor = actor
+
+    def _actor(self) -> Dict:
+        actor = getattr(self._local, 'actor', None)
+        if actor is not None:
+            return actor
+        import getpass
+        try:
+            user = getpass.getuser()
+        except Exception:
+            user = None
+        return {'user': user, 'uid': os.getuid() if hasattr(os, 'getuid') else None, 'pid': os.getpid()}
+
+    def _audited(self, action: str, path_str: Optional[str], success: bool, message: str,
+                 **extra) -> Tuple[bool, str]:
+        """Append an attempt to the audit log, passing its outcome through"""
+        event = {'action': action, 'path': path_str, 'success': success, 'message': message}
+        event.update(extra)
+        event.update(self._actor())
+        self.audit.record(event)
+        return success, message
+
+    def get_audit_log(self, folder_path: Optional[str] = None, since: Optional[float] = None,
+                      until: Optional[float] = None, limit: Optional[int] = None) -> List[Dict]:
+        """Audit events, oldest first, optionally for one folder and a time range"""
+        from collections import deque
+
+        path_str = str(Path(folder_path).resolve()) if folder_path else None
+        # With a limit only the newest events are kept while streaming
+        events = deque(self.audit.query(path_str, since, until), maxlen=limit or None)
+        return list(events)
+
+    def export_registry(self, destination, incremental: bool = False, since: Optional[int] = None) -> Dict:
+        """Write a point-in-time snapshot of the registry as JSON Lines.
+
+        destination is a file name (created 0600) or a writable text
+        stream. The snapshot is a shallow copy of the lock table taken
+        under the registry lock; records are serialized one at a time
+        after it is released, so locks and unlocks go on meanwhile. With
+        incremental=True only changes after the last export are written
+        (since= names the revision explicitly), including removed locks.
+        See folder_lock_transfer for the format.
+        """
+        import folder_lock_transfer as transfer
+
+        if incremental and since is None:
+            since = self._load_export_state().get('revision')
+        with self._lock:
+            locks = self.locks
+            if since is not None and not locks.tracks_since(since):
+                raise FolderLockError(f"Removals since revision {since} are no longer tracked, "
+                                      f"take a full export")
+            revision = locks.revision
+            snapshot = dict(locks)
+            deleted = []
+            if since is not None:
+                # Tombstones are in revision order, newest last
+                for path_str, removed in reversed(locks.tombstones.items()):
+                    if removed <= since:
+                        break
+                    deleted.append((path_str, removed))
+                deleted.reverse()
+                master = None
+            else:
+                master = {key: self.data[key] for key in ('master_key_hash', 'master_keypair')
+                          if self.data.get(key)}
+        if since is None:
+            records = snapshot.values()
+        else:
+            records = (record for record in snapshot.values() if (record.revision or 0) > since)
+
+        head = transfer.header(revision, since, self.system, master)
+        if hasattr(destination, 'write'):
+            counts = transfer.write_export(destination, head, records, deleted)
+        else:
+            with transfer.open_output(destination) as out:
+                counts = transfer.write_export(out, head, records, deleted)
+        self._save_export_state({'revision': revision, 'time': head['created']})
+        summary = {'revision': revision, 'since': since, 'locks': counts[0], 'deleted': counts[1]}
+        self._audited('export', None, True, f"Exported {counts[0]} locks and {counts[1]} removals",
+                      revision=revision, since=since)
+        return summary
+
+    def import_registry(self, source: str, policy: str = 'skip') -> Dict:
+        """Merge an export written by export_registry into the registry.
+
+        A path that is already locked with a different record is a
+        conflict, resolved by policy: 'skip' keeps the local record,
+        'overwrite' takes the imported one, 'error' aborts before anything
+        is changed. Removals from incremental exports are only applied with
+        'overwrite'. Paths busy with an operation are left alone. The file
+        is read twice - once to check it is complete (and, for 'error', free
+        of conflicts), then to apply it in batches - so memory stays flat
+        and operations on other folders continue in between.
+        """
+        import folder_lock_transfer as transfer
+
+        if policy not in transfer.CONFLICT_POLICIES:
+            raise FolderLockError(f"Unknown conflict policy: {policy}")
+        try:
+            with open(source, 'r') as f:
+                for entry in transfer.read_export(f):
+                    if policy == 'error' and entry['type'] == 'lock':
+                        with self._lock:
+                            current = self.locks.get(entry['path'])
+                        if current is not None and not transfer.same_record(current, entry['record']):
+                            raise FolderLockError(f"{entry['path']} is already locked with a different record")
+        except (OSError, transfer.TransferError) as e:
+            raise FolderLockError(f"Import failed: {e}")
+
+        summary = dict.fromkeys(('added', 'replaced', 'unchanged', 'skipped', 'deleted', 'busy'), 0)
+        # Paths whose lock was added, replaced or removed, for other hosts
+        changed = []
+        head = {}
+        try:
+            with open(source, 'r') as f:
+                entries = transfer.read_export(f)
+                head = next(entries)
+                batch = []
+                for entry in entries:
+                    batch.append(entry)
+                    if len(batch) == IMPORT_BATCH:
+                        self._import_batch(batch, policy, summary, changed)
+                        batch = []
+                self._import_batch(batch, policy, summary, changed)
+        except (OSError, transfer.TransferError) as e:
+            # Only if the file changed after it was checked
+            raise FolderLockError(f"Import stopped part way, what was applied is kept: {e}")
+        finally:
+            with self._lock:
+                master = head.get('master') or {}
+                # Never replaces a master key that is already set
+                if master.get('master_key_hash') and not self.data.get('master_key_hash'):
+                    self.data.update(master)
+                    summary['master_key'] = 'imported'
+                elif master.get('master_key_hash'):
+                    same = master['master_key_hash'] == self.data['master_key_hash']
+                    summary['master_key'] = 'unchanged' if same else 'kept local'
+                if summary['added'] or summary['replaced'] or summary['deleted'] or 'master_key' in summary:
+                    self._save_data()
+            if self.sync is not None:
+                self._publish([('lock', path_str, record) if record is not None else ('unlock', path_str, None)
+                               for path_str, record in ((p, self._sync_record(p)) for p in changed)])
+
+        self._audited('import', None, True, f"Imported {summary['added']} new and {summary['replaced']} "
+                      f"replaced locks", policy=policy, source_revision=head['revision'])
+        return summary
+
+    def _import_batch(self, batch: List[Dict], policy: str, summary: Dict, changed: List[str]):
+        from folder_lock_transfer import same_record
+
+        with self._lock:
+            locks = self.locks
+            for entry in batch:
+                path_str = entry['path']
+                current = locks.get(path_str)
+                if path_str in self._busy:
+                    summary['busy'] += 1
+                elif entry['type'] == 'delete':
+                    if current is None:
+                        continue
+                    if policy == 'overwrite':
+                        locks.pop(path_str)
+                        summary['deleted'] += 1
+                        changed.append(path_str)
+                    else:
+                        summary['skipped'] += 1
+                elif current is None:
+                    locks[path_str] = entry['record']
+                    summary['added'] += 1
+                    changed.append(path_str)
+                elif same_record(current, entry['record']):
+                    summary['unchanged'] += 1
+                elif policy == 'overwrite':
+                    locks[path_str] = entry['record']
+                    summary['replaced'] += 1
+                    changed.append(path_str)
+                else:
+                    summary['skipped'] += 1
+
+    def enable_sync(self, shared_dir: str, host: Optional[str] = None) -> Dict:
+        """Share lock and unlock events with other hosts through shared_dir.
+
+        Each host appends its events to its own log in shared_dir and
+        applies the others' (see folder_lock_sync). host names this one in
+        the logs, the short host name by default, and must be unique. The
+        other hosts' changes are applied first; locks that exist only
+        here are then published. Returns get_sync_status().
+        """
+        from folder_lock_sync import ChangeLog, SyncError
+
+        if self.sync is not None:
+            raise FolderLockError(f"Sync is already enabled through {self.sync.shared_dir}")
+        try:
+            self.sync = ChangeLog.create(self.config_dir, shared_dir, host)
+            self.sync.pull(self._apply_sync)
+            with self._lock:
+                local = [path_str for path_str, record in self.locks.items()
+                         if self.sync.version(path_str) is None and not self._host_only(record)]
+            self.sync.publish(('lock', path_str, self._sync_record(path_str)) for path_str in local)
+        except (OSError, SyncError) as e:
+            self.sync = None
+            self._remove_sync_state()
+            raise FolderLockError(f"Could not enable sync: {e}")
+        self._audited('sync', None, True, f"Sync enabled through {self.sync.shared_dir} as {self.sync.host}",
+                      published=len(local))
+        return self.get_sync_status()
+
+    def disable_sync(self) -> bool:
+        """Stop syncing, the registry keeps what it has. False if sync was off"""
+        if self.sync is None:
+            return False
+        self._remove_sync_state()
+        self.sync = None
+        self._audited('sync', None, True, "Sync disabled")
+        return True
+
+    def sync_now(self, checkpoint: bool = False) -> Dict:
+        """Apply what other hosts logged since the last pass, optionally writing a checkpoint"""
+        from folder_lock_sync import SyncError
+
+        if self.sync is None:
+            raise FolderLockError("Sync is not enabled")
+        try:
+            summary = self.sync.pull(self._apply_sync)
+            if checkpoint:
+                summary['checkpoint_written'] = self.sync.checkpoint(self._sync_record)
+        except (OSError, SyncError) as e:
+            raise FolderLockError(f"Sync failed: {e}")
+        return summary
+
+    def _remove_sync_state(self):
+        try:
+            (self.config_dir / 'sync.json').unlink()
+        except OSError:
+            pass
+
+    def get_sync_status(self) -> Optional[Dict]:
+        """Host name, shared directory, own seq and the seq read from each other host"""
+        return self.sync.status() if self.sync is not None else None
+
+    def _sync_pull(self):
+        """Apply other hosts' changes before acting, an unreachable share only delays them"""
+        if self.sync is None:
+            return
+        from folder_lock_sync import SyncError
+        try:
+            self.sync.pull(self._apply_sync)
+        except (OSError, SyncError):
+            pass
+
+    @staticmethod
+    def _host_only(record) -> bool:
+        """Packed and integrity-checked locks need the archive or manifest in this
+        config directory, so they are never synced to other hosts"""
+        return record is not None and (record.get('mode') == MODE_PACK or bool(record.get('integrity')))
+
+    def _sync_record(self, path_str: str) -> Optional[Dict]:
+        """The registry record of path_str as published, None if it isn't locked or is host-only"""
+        with self._lock:
+            record = self.locks.get(path_str)
+            if record is None or self._host_only(record):
+                return None
+            fields = record.to_dict() if hasattr(record, 'to_dict') else dict(record)
+        fields.pop('revision', None)
+        return fields
+
+    def _apply_sync(self, events: Dict[str, Dict]):
+        """Store the winning events of other hosts in the registry, called by ChangeLog.pull"""
+        relocks_cancelled = []
+        skipped = 0
+        with self._lock:
+            locks = self.locks
+            pending = self.data.get('relock', {})
+            for path_str, event in events.items():
+                # A host-only lock here, or one from a host that still publishes them
+                if self._host_only(locks.get(path_str)) or (event['op'] == 'lock' and self._host_only(event['record'])):
+                    skipped += 1
+                    continue
+                if event['op'] == 'lock':
+                    locks[path_str] = event['record']
+                    # Locked elsewhere, a relock timer here has nothing left to do
+                    if pending.pop(path_str, None) is not None:
+                        relocks_cancelled.append(path_str)
+                else:
+                    locks.pop(path_str, None)
+            self._save_data()
+        for path_str in relocks_cancelled:
+            self._notify_relock(path_str, None)
+        hosts = sorted({event['host'] for event in events.values()})
+        self._audited('sync', None, True, f"Applied {len(events) - skipped} changes from {', '.join(hosts)}",
+                      changes=len(events) - skipped, skipped=skipped)
+
+    def _publish(self, changes: List[Tuple[str, str, Optional[Dict]]]):
+        """Log registry changes for the other hosts when sync is enabled.
+
+        Never called with self._lock held: pulls take the sync lock first.
+        Changes to host-only locks are left out.
+        """
+        if self.sync is None:
+            return
+        with self._lock:
+            changes = [change for change in changes if not self._host_only(self.locks.get(change[1]))]
+        if not changes:
+            return
+        from folder_lock_sync import SyncError
+        try:
+            self.sync.publish(changes)
+            if self.sync.checkpoint_due():
+                self.sync.checkpoint(self._sync_record)
+        except (OSError, SyncError) as e:
+            # The change stands here; other hosts miss it until it changes again
+            self._audited('sync', None, False, f"Could not publish {len(changes)} changes: {e}")
+
+    def _load_export_state(self) -> Dict:
+        try:
+            with open(self.config_dir / 'export_state.json', 'r') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def _save_export_state(self, state: Dict):
+        state_file = self.config_dir / 'export_state.json'
+        tmp = state_file.with_name(f".{state_file.name}.{os.getpid()}.tmp")
+        with open(tmp, 'w') as f:
+            json.dump(state, f)
+        os.replace(tmp, state_file)
+
+    def _finish(self, result: OperationResult, success: bool, message: str) -> Tuple[bool, str]:
+        """Complete an operation, keep it as last_result and persist it to history"""
+        result.finish(success, message)
+        self._local.result = result
+        try:
+            self._record_history(result)
+        except OSError:
+            pass
+        if self.metrics is not None:
+            self.metrics.record_operation(result)
+        return success, message
     
-    def get_all_locks(self) -> Dict:
-        return self.locks.copy()
+    def get_all_locks(self) -> Dict[str, Dict]:
+        """Every lock record as a plain dict, copies that don't change the registry.
+
+        Only the option dicts some records carry (throttle, encryption, pack)
+        are copied below the top level, the common scalar fields aren't
+        walked twice. Callers that only need the paths use get_locked_paths.
+        """
+        def copy_dicts(value: Dict) -> Dict:
+            return {key: copy_dicts(item) if isinstance(item, dict) else item for key, item in value.items()}
+
+        with self._lock:
+            locks = {}
+            for path_str, record in self.locks.items():
+                copied = locks[path_str] = record.to_dict()
+                for key, value in (record.extra or {}).items():
+                    if isinstance(value, dict):
+                        copied[key] = copy_dicts(value)
+            return locks
+
+    def get_locked_paths(self) -> List[str]:
+        """Paths of every lock, without copying the records"""
+        with self._lock:
+            return list(self.locks)
+
+    def get_lock_status(self) -> Dict[str, str]:
+        """Map every locked path to ACTIVE or MISSING"""
+        return {
+            path_str: 'ACTIVE' if os.path.exists(path_str) else 'MISSING'
+            for path_str in self.get_locked_paths()
+        }
+
+    def get_lock_stats(self, folder_path: Optional[str] = None, top: int = 5,
+                       refresh: bool = False, workers: Optional[int] = None) -> Dict[str, Dict]:
+        """File count, total bytes and largest subtrees of locked folders.
+
+        Covers every lock, or only folder_path if given. Results are cached
+        per lock under stats/ and only directories whose mtime changed are
+        listed again; refresh=True ignores the cache.
+        """
+        from folder_lock_walk import TreeStats, cache_name
+
+        if folder_path is not None:
+            paths = [str(Path(folder_path).resolve())]
+        else:
+            paths = self.get_locked_paths()
+
+        cache_dir = self.config_dir / 'stats'
+        cache_dir.mkdir(mode=0o700, exist_ok=True)
+
+        stats = {}
+        for path_str in paths:
+            if path_str not in self.locks:
+                stats[path_str] = {'error': "Folder is not locked or not found in database"}
+                continue
+            if not os.path.isdir(path_str):
+                stats[path_str] = {'error': "Folder is missing"}
+                continue
+            cache_file = cache_dir / f"{cache_name(path_str)}.json"
+            if refresh and cache_file.exists():
+                cache_file.unlink()
+            stats[path_str] = TreeStats(cache_file).compute(path_str, top, workers)
+        return stats
+
+    def verify_locks(self, folder_path: Optional[str] = None, sample_rate: float = 1.0,
+                     confidence: float = 0.95, fail_fast: bool = False,
+                     workers: Optional[int] = None) -> Dict[str, Dict]:
+        """Check that locked folders still have 000 permissions throughout.
+
+        Reports every entry whose mode differs from the locked state (first
+        100 listed, all counted). See folder_lock_walk.verify_tree for
+        sampling and fail_fast; with fail_fast the remaining locks are
+        skipped after the first failure. Raises OperationCancelled if the
+        thread's cancel event is set meanwhile.
+        """
+        from folder_lock_walk import verify_tree
+
+        if folder_path is not None:
+            paths = [str(Path(folder_path).resolve())]
+        else:
+            paths = self.get_locked_paths()
+
+        reports = {}
+        for path_str in paths:
+            if path_str not in self.locks:
+                reports[path_str] = {'locked': False, 'error': "Folder is not locked or not found in database"}
+            elif self.system == "Windows":
+                reports[path_str] = {'locked': None, 'error': "Verification needs Unix permissions"}
+            elif not os.path.isdir(path_str):
+                reports[path_str] = {'locked': False, 'error': "Folder is missing"}
+            else:
+                reports[path_str] = verify_tree(
+                    path_str, 0o000, sample_rate, confidence, fail_fast, workers,
+                    self.locks[path_str].get('cross_devices', False), self._cancel_event()
+                )
+            if self._cancel_requested():
+                raise OperationCancelled("Verification cancelled")
+            if fail_fast and reports[path_str]['locked'] is False:
+                break
+        return reports
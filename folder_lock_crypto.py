@@ -0,0 +1,344 @@
+"""
+At-rest encryption for locked folders
+
+Each file is encrypted in place with AES-256-GCM in fixed-size chunks, so
+memory use is bounded by one chunk per worker whatever the file size.
+Files are spread over a process pool so throughput scales with cores.
+
+Keys: a random data key encrypts the files. It is stored in the registry
+wrapped (AES-GCM) under a key derived with scrypt from the folder
+password. The master key can't be used directly - only its hash is known
+at lock time - so set_master_key also creates an X25519 key pair whose
+private half is wrapped under the master key; every data key is
+additionally sealed to its public half.
+
+File layout (<name>.aflenc):
+    header  MAGIC | chunk size (u32) | nonce prefix (8) | size (u64) | mtime_ns (u64)
+    chunks  AES-GCM(chunk) + 16 byte tag, nonce = prefix | chunk index (u32)
+The header is authenticated with every chunk, so truncation, reordering and
+header edits are all detected.
+
+Every file goes through <name>.aflenc.part (or .afldec.part) and is only
+renamed into place when complete, and the source is removed after that, so
+an interrupted run can be resumed by running it again.
+
+Needs the optional 'cryptography' package.
+"""
+
+import os
+import stat
+import struct
+import hashlib
+from collections import defaultdict
+from typing import Dict, Iterable, List, Optional, Tuple
+
+MAGIC = b'AFLENC1\0'
+HEADER = struct.Struct('>8sI8sQQ')
+TAG_SIZE = 16
+CHUNK_SIZE = 1024 * 1024
+ENCRYPTED_SUFFIX = '.aflenc'
+ENCRYPT_PART_SUFFIX = '.aflenc.part'
+DECRYPT_PART_SUFFIX = '.afldec.part'
+# Files handed to a pool worker per task, large files go alone
+BATCH_FILES = 64
+BATCH_BYTES = 64 * 1024 * 1024
+
+_SCRYPT = {'n': 2 ** 15, 'r': 8, 'p': 1, 'maxmem': 64 * 1024 * 1024}
+_KEY_WRAP_AAD = b'folder-lock data key'
+
+
+class EncryptionError(Exception):
+    """Raised when encryption is unavailable or a file fails to decrypt"""
+
+
+def _aesgcm(key: bytes):
+    try:
+        from cryptography.hazmat.primitives.ciphers.aead import AESGCM
+    except ImportError:
+        raise EncryptionError("Encryption needs the 'cryptography' package (pip install cryptography)")
+    return AESGCM(key)
+
+
+def available() -> bool:
+    try:
+        _aesgcm(bytes(32))
+    except EncryptionError:
+        return False
+    return True
+
+
+def _derive(secret: str, salt: bytes) -> bytes:
+    return hashlib.scrypt(secret.encode(), salt=salt, dklen=32, **_SCRYPT)
+
+
+def _wrap(data_key: bytes, secret: str) -> Dict:
+    salt = os.urandom(16)
+    nonce = os.urandom(12)
+    wrapped = _aesgcm(_derive(secret, salt)).encrypt(nonce, data_key, _KEY_WRAP_AAD)
+    return {'salt': salt.hex(), 'nonce': nonce.hex(), 'key': wrapped.hex()}
+
+
+def _seal_key(public_hex: str, private):
+    """HKDF key shared between an X25519 private key and a public key"""
+    from cryptography.hazmat.primitives.asymmetric.x25519 import X25519PublicKey
+    from cryptography.hazmat.primitives.hashes import SHA256
+    from cryptography.hazmat.primitives.kdf.hkdf import HKDF
+
+    shared = private.exchange(X25519PublicKey.from_public_bytes(bytes.fromhex(public_hex)))
+    return HKDF(algorithm=SHA256(), length=32, salt=None, info=_KEY_WRAP_AAD).derive(shared)
+
+
+def new_master_keypair(master_key: str) -> Dict:
+    """X25519 key pair for master key recovery, private half wrapped under master_key"""
+    from cryptography.hazmat.primitives.asymmetric.x25519 import X25519PrivateKey
+    from cryptography.hazmat.primitives.serialization import Encoding, PublicFormat, PrivateFormat, NoEncryption
+
+    private = X25519PrivateKey.generate()
+    raw = private.private_bytes(Encoding.Raw, PrivateFormat.Raw, NoEncryption())
+    public = private.public_key().public_bytes(Encoding.Raw, PublicFormat.Raw)
+    return {'public': public.hex(), 'private': _wrap(raw, master_key)}
+
+
+def new_key_info(password: str, master_keypair: Optional[Dict] = None) -> Tuple[bytes, Dict]:
+    """Create a data key, returns it with its registry info (wrapped copies)"""
+    from cryptography.hazmat.primitives.asymmetric.x25519 import X25519PrivateKey
+    from cryptography.hazmat.primitives.serialization import Encoding, PublicFormat
+
+    data_key = os.urandom(32)
+    info = {'chunk_size': CHUNK_SIZE, 'wrapped': {'password': _wrap(data_key, password)}}
+    if master_keypair:
+        ephemeral = X25519PrivateKey.generate()
+        nonce = os.urandom(12)
+        sealed = _aesgcm(_seal_key(master_keypair['public'], ephemeral)).encrypt(nonce, data_key, _KEY_WRAP_AAD)
+        info['wrapped']['master'] = {
+            'ephemeral': ephemeral.public_key().public_bytes(Encoding.Raw, PublicFormat.Raw).hex(),
+            'nonce': nonce.hex(),
+            'key': sealed.hex(),
+        }
+    return data_key, info
+
+
+def _unwrap(wrapped: Dict, secret: str) -> Optional[bytes]:
+    from cryptography.exceptions import InvalidTag
+
+    kek = _derive(secret, bytes.fromhex(wrapped['salt']))
+    try:
+        return _aesgcm(kek).decrypt(bytes.fromhex(wrapped['nonce']), bytes.fromhex(wrapped['key']), _KEY_WRAP_AAD)
+    except InvalidTag:
+        return None
+
+
+def unwrap_key(info: Dict, secret: str, master_keypair: Optional[Dict] = None) -> bytes:
+    """Recover the data key with the folder password or the master key"""
+    from cryptography.exceptions import InvalidTag
+    from cryptography.hazmat.primitives.asymmetric.x25519 import X25519PrivateKey
+
+    data_key = _unwrap(info['wrapped']['password'], secret)
+    if data_key is not None:
+        return data_key
+
+    sealed = info['wrapped'].get('master')
+    if sealed and master_keypair:
+        raw = _unwrap(master_keypair['private'], secret)
+        if raw is not None:
+            private = X25519PrivateKey.from_private_bytes(raw)
+            try:
+                return _aesgcm(_seal_key(sealed['ephemeral'], private)).decrypt(
+                    bytes.fromhex(sealed['nonce']), bytes.fromhex(sealed['key']), _KEY_WRAP_AAD
+                )
+            except InvalidTag:
+                pass
+    raise EncryptionError("Password cannot unlock the folder key")
+
+
+def _nonce(prefix: bytes, index: int) -> bytes:
+    return prefix + struct.pack('>I', index)
+
+
+def _read_full(src, view) -> int:
+    """Fill view from src unless EOF comes first, chunk boundaries must not drift"""
+    total = 0
+    while total < len(view):
+        read = src.readinto(view[total:])
+        if not read:
+            break
+        total += read
+    return total
+
+
+def encrypt_file(path: str, key: bytes, chunk_size: int = CHUNK_SIZE) -> int:
+    """Encrypt path into path.aflenc and remove path, returns plaintext bytes"""
+    aead = _aesgcm(key)
+    st = os.stat(path)
+    header = HEADER.pack(MAGIC, chunk_size, os.urandom(8), st.st_size, st.st_mtime_ns)
+    prefix = header[12:20]
+    part = path + ENCRYPT_PART_SUFFIX
+    buffer = bytearray(chunk_size)
+    view = memoryview(buffer)
+
+    with open(path, 'rb', buffering=0) as src, open(part, 'wb') as dst:
+        dst.write(header)
+        index = 0
+        while True:
+            read = _read_full(src, view)
+            if not read:
+                break
+            aad = header + struct.pack('>I', index)
+            dst.write(aead.encrypt(_nonce(prefix, index), view[:read], aad))
+            index += 1
+        dst.flush()
+        os.fsync(dst.fileno())
+    os.chmod(part, st.st_mode & 0o7777)
+    os.replace(part, path + ENCRYPTED_SUFFIX)
+    os.unlink(path)
+    return st.st_size
+
+
+def decrypt_file(path: str, key: bytes) -> int:
+    """Decrypt path (ending in .aflenc) back to the original name, returns plaintext bytes"""
+    from cryptography.exceptions import InvalidTag
+
+    aead = _aesgcm(key)
+    target = path[:-len(ENCRYPTED_SUFFIX)]
+    part = target + DECRYPT_PART_SUFFIX
+
+    with open(path, 'rb', buffering=0) as src, open(part, 'wb') as dst:
+        header = bytearray(HEADER.size)
+        if _read_full(src, memoryview(header)) != HEADER.size:
+            raise EncryptionError(f"{path} is truncated")
+        header = bytes(header)
+        magic, chunk_size, prefix, size, mtime_ns = HEADER.unpack(header)
+        if magic != MAGIC:
+            raise EncryptionError(f"{path} is not an encrypted file")
+        buffer = bytearray(chunk_size + TAG_SIZE)
+        view = memoryview(buffer)
+        index = 0
+        written = 0
+        while True:
+            # A short read must not split a chunk from its tag
+            read = _read_full(src, view)
+            if not read:
+                break
+            aad = header + struct.pack('>I', index)
+            try:
+                dst.write(aead.decrypt(_nonce(prefix, index), view[:read], aad))
+            except InvalidTag:
+                raise EncryptionError(f"{path} is corrupted or was modified (chunk {index})")
+            written += read - TAG_SIZE
+            index += 1
+        if written != size:
+            raise EncryptionError(f"{path} is truncated")
+        dst.flush()
+        os.fsync(dst.fileno())
+    os.chmod(part, os.stat(path).st_mode & 0o7777)
+    os.utime(part, ns=(mtime_ns, mtime_ns))
+    os.replace(part, target)
+    os.unlink(path)
+    return size
+
+
+def _is_encrypted(path: str) -> bool:
+    try:
+        with open(path, 'rb') as f:
+            return f.read(len(MAGIC)) == MAGIC
+    except OSError:
+        return False
+
+
+def plan(root: str, encrypt: bool, cross_devices: bool = False,
+         on_error=None) -> List[Tuple[str, int]]:
+    """Files still to process under root, cleaning up after an interrupted run.
+
+    Leftover .part files are discarded. When both a file and its complete
+    counterpart exist, the run stopped between rename and unlink, so the
+    stale source is removed and the file counts as done. Mount points are
+    left out unless cross_devices is set, as in the permission walk;
+    on_error(path, error) gets entries that can't be listed.
+    """
+    from folder_lock_walk import iter_tree
+
+    # Every name of a hard-linked file is replaced by its own encrypted copy
+    directories = defaultdict(list)
+    for path, st in iter_tree(root, cross_devices=cross_devices, on_error=on_error, links=True):
+        if stat.S_ISREG(st.st_mode):
+            directories[os.path.dirname(path)].append(os.path.basename(path))
+    todo = []
+    for directory, files in directories.items():
+        names = set(files)
+        for name in files:
+            path = os.path.join(directory, name)
+            if name.endswith(ENCRYPT_PART_SUFFIX) or name.endswith(DECRYPT_PART_SUFFIX):
+                os.unlink(path)
+            elif name.endswith(ENCRYPTED_SUFFIX) and _is_encrypted(path):
+                original = name[:-len(ENCRYPTED_SUFFIX)]
+                if encrypt:
+                    if original in names:
+                        os.unlink(os.path.join(directory, original))
+                elif original in names:
+                    os.unlink(path)
+                else:
+                    todo.append((path, os.path.getsize(path)))
+            elif encrypt and name + ENCRYPTED_SUFFIX not in names:
+                todo.append((path, os.path.getsize(path)))
+    return todo
+
+
+def _batches(files: Iterable[Tuple[str, int]]) -> Iterable[List[str]]:
+    batch, size = [], 0
+    for path, file_size in files:
+        batch.append(path)
+        size += file_size
+        if len(batch) >= BATCH_FILES or size >= BATCH_BYTES:
+            yield batch
+            batch, size = [], 0
+    if batch:
+        yield batch
+
+
+def _process_batch(paths: List[str], key: bytes, encrypt: bool, chunk_size: int):
+    """Pool task: returns (bytes done, [(path, error)])"""
+    done = 0
+    errors = []
+    for path in paths:
+        try:
+            done += encrypt_file(path, key, chunk_size) if encrypt else decrypt_file(path, key)
+        except (OSError, EncryptionError) as e:
+            errors.append((path, str(e)))
+    return len(paths) - len(errors), done, errors
+
+
+def process_tree(root: str, key: bytes, encrypt: bool, result, chunk_size: int = CHUNK_SIZE,
+                 workers: Optional[int] = None, cross_devices: bool = False) -> bool:
+    """Encrypt or decrypt every file under root, resuming an interrupted run.
+
+    Counts go to result.details (an OperationResult), failures to its
+    errors. Returns False if any file failed.
+    """
+    errors_before = result.error_count
+    todo = plan(root, encrypt, cross_devices, result.add_error)
+    total = sum(size for _, size in todo)
+    workers = workers or os.cpu_count() or 1
+
+    # A pool only pays off with several cores and a non-trivial amount of data
+    if workers == 1 or len(todo) < 2 or total < 4 * chunk_size:
+        outcomes = [_process_batch([p for p, _ in todo], key, encrypt, chunk_size)]
+    else:
+        import multiprocessing
+        from concurrent.futures import ProcessPoolExecutor
+
+        # spawn: forking a threaded process (daemon, GUI) is unsafe
+        context = multiprocessing.get_context('spawn')
+        with ProcessPoolExecutor(max_workers=workers, mp_context=context) as pool:
+            futures = [
+                pool.submit(_process_batch, batch, key, encrypt, chunk_size)
+                for batch in _batches(todo)
+            ]
+            outcomes = [future.result() for future in futures]
+
+    prefix = 'encrypted' if encrypt else 'decrypted'
+    for count, done, errors in outcomes:
+        result.details[f'{prefix}_files'] = result.details.get(f'{prefix}_files', 0) + count
+        result.details[f'{prefix}_bytes'] = result.details.get(f'{prefix}_bytes', 0) + done
+        for path, error in errors:
+            result.add_error(path, error)
+    return result.error_count == errors_before
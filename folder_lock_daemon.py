@@ -0,0 +1,324 @@
+#!/usr/bin/env python3
+"""
+Resident Folder Lock daemon
+
+Keeps one FolderLockCore (registry, caches, status watcher) in memory and
+serves it over a Unix domain socket in the config directory. The CLI and
+GUI use connect(), which returns a DaemonClient when the daemon is running
+and a plain FolderLockCore otherwise.
+
+Protocol: one JSON object per line in each direction.
+    request:  {"method": "lock_folder", "args": [...], "kwargs": {...}}
+    response: {"ok": true, "result": ..., "last_result": {...}}
+              {"ok": false, "error": "message"}
+"""
+
+import os
+import sys
+import json
+import socket
+import struct
+import threading
+from pathlib import Path
+from typing import Dict, Optional, Tuple
+from folder_lock_core import FolderLockCore, FolderLockError, OperationResult, default_config_dir
+from folder_lock_registry import encode as encode_record
+
+SOCKET_NAME = 'daemon.sock'
+# Seconds between status watcher passes
+WATCH_INTERVAL = 5.0
+
+# Core methods callable over the socket
+DAEMON_METHODS = {
+    'lock_folder',
+    'unlock_folder',
+    'get_all_locks',
+    'get_locked_paths',
+    'get_lock_status',
+    'get_history',
+    'get_lock_stats',
+    'set_master_key',
+    'verify_master_key',
+    'verify_locks',
+    'get_pending_relocks',
+    'cancel_relock',
+    'apply_expired_relocks',
+    'extract_packed',
+    'get_audit_log',
+    'estimate_lock',
+    'export_registry',
+    'import_registry',
+    'enable_sync',
+    'disable_sync',
+    'sync_now',
+    'get_sync_status',
+}
+# Methods whose per-thread last_result is sent back with the response
+RESULT_METHODS = {'lock_folder', 'unlock_folder'}
+
+
+class DaemonError(Exception):
+    """Raised by DaemonClient when the daemon rejects or fails a request"""
+
+
+def socket_path(config_dir: Optional[Path] = None) -> Path:
+    return Path(config_dir or default_config_dir()) / SOCKET_NAME
+
+
+class DaemonClient:
+    """Drop-in replacement for FolderLockCore that forwards calls to the daemon"""
+
+    def __init__(self, path: Path, timeout: Optional[float] = None):
+        self.socket_path = Path(path)
+        self.timeout = timeout
+        # One connection per thread, bulk mode calls from a thread pool
+        self._local = threading.local()
+        self.system = self.call('ping')['system']
+
+    def _connection(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            sock.settimeout(self.timeout)
+            sock.connect(str(self.socket_path))
+            conn = (sock, sock.makefile('rb'))
+            self._local.conn = conn
+        return conn
+
+    def call(self, method: str, *args, **kwargs):
+        sock, reader = self._connection()
+        request = {'method': method, 'args': list(args), 'kwargs': kwargs}
+        try:
+            sock.sendall(json.dumps(request).encode() + b'\n')
+            line = reader.readline()
+        except OSError:
+            self.close()
+            raise
+        if not line:
+            self.close()
+            raise DaemonError("Daemon closed the connection")
+
+        response = json.loads(line)
+        if not response.get('ok'):
+            raise DaemonError(response.get('error', 'Unknown daemon error'))
+        if 'last_result' in response:
+            record = response['last_result']
+            self._local.result = OperationResult.from_dict(record) if record else None
+        return response.get('result')
+
+    def close(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is not None:
+            conn[1].close()
+            conn[0].close()
+            self._local.conn = None
+
+    def __getattr__(self, name):
+        if name not in DAEMON_METHODS:
+            raise AttributeError(name)
+        return lambda *args, **kwargs: self.call(name, *args, **kwargs)
+
+    def lock_folder(self, folder_path: str, password: str, **options) -> Tuple[bool, str]:
+        return tuple(self.call('lock_folder', folder_path, password, **options))
+
+    def unlock_folder(self, folder_path: str, password: str, **options) -> Tuple[bool, str]:
+        return tuple(self.call('unlock_folder', folder_path, password, **options))
+
+    @property
+    def last_result(self) -> Optional[OperationResult]:
+        return getattr(self._local, 'result', None)
+
+    @property
+    def locks(self) -> Dict:
+        return self.call('get_all_locks')
+
+    @property
+    def master_key_hash(self) -> Optional[str]:
+        return self.call('ping')['master_key_hash']
+
+
+def connect(config_dir: Optional[Path] = None):
+    """Return a DaemonClient if a daemon is listening, else a local FolderLockCore
+
+    Set FOLDER_LOCK_NO_DAEMON=1 to always use a local core.
+    """
+    path = socket_path(config_dir)
+    if not os.environ.get('FOLDER_LOCK_NO_DAEMON') and path.exists():
+        try:
+            return DaemonClient(path)
+        except (OSError, DaemonError):
+            pass
+    return FolderLockCore(config_dir)
+
+
+class FolderLockDaemon:
+    """Serves a resident FolderLockCore over a Unix domain socket"""
+
+    def __init__(self, config_dir: Optional[Path] = None, watch_interval: float = WATCH_INTERVAL):
+        self.core = FolderLockCore(config_dir)
+        self.socket_path = socket_path(self.core.config_dir)
+        self.watch_interval = watch_interval
+        self._status = self.core.get_lock_status()
+        self._stop = threading.Event()
+        self._server = None
+        self.scheduler = None
+
+    def _watch(self):
+        """Keep the registry and lock status cache current"""
+        while not self._stop.wait(self.watch_interval):
+            try:
+                self._watch_once()
+            except Exception as e:
+                # One bad pass (unreadable registry, full disk) must not end the watcher
+                print(f"Folder Lock daemon: watcher pass failed: {e!r}", file=sys.stderr)
+
+    def _watch_once(self):
+        # Folders left open by a process that died inside temporarily_unlocked
+        self.core.recover_temporary_access()
+        # Pick up changes made by processes that bypassed the daemon
+        self._refresh()
+        # and by other hosts
+        if self.core.sync is not None:
+            try:
+                if self.core.sync_now()['applied'] and self.scheduler is not None:
+                    self.scheduler.sync()
+            except FolderLockError:
+                pass
+        self._status = self.core.get_lock_status()
+
+    def _refresh(self):
+        """Reload the registry if a CLI or GUI run without the daemon changed it"""
+        if self.core.refresh() and self.scheduler is not None:
+            self.scheduler.sync()
+
+    def dispatch(self, request: Dict) -> Dict:
+        method = request.get('method')
+        args = request.get('args', [])
+        kwargs = request.get('kwargs', {})
+
+        if method == 'ping':
+            return {'ok': True, 'result': {
+                'system': self.core.system,
+                'master_key_hash': self.core.master_key_hash,
+                'pid': os.getpid(),
+            }}
+        if method not in DAEMON_METHODS:
+            return {'ok': False, 'error': f"Unknown method: {method}"}
+        # _save_data replaces locks.json whole, so never act on a stale registry
+        self._refresh()
+        if method == 'get_lock_status':
+            # Served from the watcher cache, refreshed for paths it hasn't seen yet
+            status = dict(self._status)
+            paths = self.core.get_locked_paths()
+            for path_str in paths:
+                if path_str not in status:
+                    status[path_str] = 'ACTIVE' if os.path.exists(path_str) else 'MISSING'
+            return {'ok': True, 'result': {p: status[p] for p in paths}}
+
+        result = getattr(self.core, method)(*args, **kwargs)
+        response = {'ok': True, 'result': result}
+        if method in RESULT_METHODS:
+            last = self.core.last_result
+            response['last_result'] = last.to_dict() if last is not None else None
+            self._status = self.core.get_lock_status()
+        return response
+
+    def _bind(self):
+        import socketserver
+
+        daemon = self
+
+        class Handler(socketserver.StreamRequestHandler):
+            def handle(self):
+                if not daemon._peer_allowed(self.connection):
+                    return
+                # Audit entries name the client, not the daemon
+                daemon.core.set_actor(daemon._peer_actor(self.connection))
+                for line in self.rfile:
+                    try:
+                        response = daemon.dispatch(json.loads(line))
+                    except Exception as e:
+                        response = {'ok': False, 'error': str(e)}
+                    self.wfile.write(json.dumps(response, default=encode_record).encode() + b'\n')
+                    self.wfile.flush()
+
+        class Server(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+            daemon_threads = True
+
+        if self.socket_path.exists():
+            try:
+                DaemonClient(self.socket_path, timeout=1.0)
+            except (OSError, DaemonError):
+                # Left behind by a daemon that didn't shut down cleanly
+                self.socket_path.unlink()
+            else:
+                raise RuntimeError(f"A daemon is already listening on {self.socket_path}")
+
+        old_umask = os.umask(0o177)
+        try:
+            self._server = Server(str(self.socket_path), Handler)
+        finally:
+            os.umask(old_umask)
+
+    def _peer_allowed(self, conn) -> bool:
+        """Only serve clients running as the daemon's own user (or root)"""
+        if not hasattr(socket, 'SO_PEERCRED'):
+            return True
+        creds = conn.getsockopt(socket.SOL_SOCKET, socket.SO_PEERCRED, struct.calcsize('3i'))
+        _, uid, _ = struct.unpack('3i', creds)
+        return uid in (0, os.getuid())
+
+    def _peer_actor(self, conn) -> Optional[Dict]:
+        """Audit identity of the process at the other end of conn"""
+        if not hasattr(socket, 'SO_PEERCRED'):
+            return None
+        creds = conn.getsockopt(socket.SOL_SOCKET, socket.SO_PEERCRED, struct.calcsize('3i'))
+        pid, uid, _ = struct.unpack('3i', creds)
+        try:
+            import pwd
+            user = pwd.getpwuid(uid).pw_name
+        except (ImportError, KeyError):
+            user = None
+        return {'user': user, 'uid': uid, 'pid': pid, 'via': 'daemon'}
+
+    def serve_forever(self):
+        from folder_lock_scheduler import RelockScheduler
+
+        self._bind()
+        self.scheduler = RelockScheduler(self.core)
+        self.scheduler.start()
+        watcher = threading.Thread(target=self._watch, name='status-watcher', daemon=True)
+        watcher.start()
+        try:
+            self._server.serve_forever()
+        finally:
+            self._stop.set()
+            self.scheduler.stop()
+            self._server.server_close()
+            try:
+                self.socket_path.unlink()
+            except OSError:
+                pass
+
+    def shutdown(self):
+        """Stop serve_forever from another thread"""
+        self._stop.set()
+        if self._server is not None:
+            self._server.shutdown()
+
+
+def run_daemon(config_dir: Optional[Path] = None):
+    """Run the daemon in the foreground until SIGINT/SIGTERM"""
+    import signal
+
+    daemon = FolderLockDaemon(config_dir)
+
+    def stop(signum, frame):
+        threading.Thread(target=daemon.shutdown).start()
+
+    signal.signal(signal.SIGTERM, stop)
+    print(f"Folder Lock daemon listening on {daemon.socket_path}", file=sys.stderr)
+    try:
+        daemon.serve_forever()
+    except KeyboardInterrupt:
+        pass
@@ -0,0 +1,202 @@
+"""
+Dry-run estimates for lock_folder
+
+estimate_tree guesses a tree's entry count and size without walking it,
+by random descent (Knuth's estimator): starting at the root, list the
+directory, pick one subdirectory at random and continue until a leaf.
+Each level's entries are weighted by the product of the fan-outs above
+it, which makes every probe an unbiased estimate of the whole tree; the
+mean of many probes converges on the true size. Listings are cached, so
+the top levels are only read once. File sizes are sampled per directory.
+
+ThroughputHistory remembers how fast earlier operations ran on each
+filesystem (throughput.json in the config directory), so an estimate can
+be turned into an expected duration for the filesystem the folder is on.
+"""
+
+import os
+import json
+import math
+import time
+import random
+from pathlib import Path
+from typing import Dict, Optional, Tuple
+from folder_lock_core import format_duration, format_size
+
+# Sampling budget of one estimate
+TIME_BUDGET = 0.5
+MAX_PROBES = 4096
+# Files stat'ed per directory for the mean file size
+SIZE_SAMPLES = 32
+# Operations too small to say anything about throughput
+MIN_ENTRIES = 100
+MIN_BYTES = 1024 * 1024
+MIN_SECONDS = 0.05
+# Weight of the newest run in the moving average
+SMOOTHING = 0.3
+# Used before anything was measured: entries/s for walks, bytes/s for contents
+DEFAULT_RATES = {
+    'lock': 20000.0,
+    'unlock': 20000.0,
+    'encrypt': 50e6,
+    'decrypt': 50e6,
+    'pack': 30e6,
+    'unpack': 60e6,
+}
+# Kinds measured in bytes per second, the others in entries per second
+BYTE_KINDS = {'encrypt', 'decrypt', 'pack', 'unpack'}
+BASIS_TEXT = {
+    'device': "from earlier runs on this filesystem",
+    'fstype': "from earlier runs on similar filesystems",
+    'default': "no earlier runs to go by, rough guess",
+}
+
+
+def estimate_tree(root: str, cross_devices: bool = False, time_budget: float = TIME_BUDGET,
+                  max_probes: int = MAX_PROBES, rng: Optional[random.Random] = None) -> Dict:
+    """Estimated entries, directories and bytes under root, root included.
+
+    Symlinks are left out and so are mount points unless cross_devices is
+    set, like the permission walk. Probes run until time_budget seconds or
+    max_probes are used up. If every directory got listed on the way the
+    counts are exact ('exact': True; bytes still rest on sampled sizes).
+    'entries_range' is a 95% interval from the spread of the probes.
+    """
+    rng = rng or random.Random()
+    started = time.monotonic()
+    root_dev = os.lstat(root).st_dev
+    # Directory -> (files, estimated file bytes, subdirectories)
+    listings: Dict[str, Tuple[int, float, list]] = {}
+    # Subdirectories seen but not listed yet, none left means the counts are exact
+    unlisted = set()
+
+    def listing(path: str):
+        cached = listings.get(path)
+        if cached is not None:
+            return cached
+        files = sized = 0
+        size_total = 0
+        subdirs = []
+        try:
+            with os.scandir(path) as it:
+                for entry in it:
+                    try:
+                        if entry.is_symlink():
+                            continue
+                        if entry.is_dir(follow_symlinks=False):
+                            if cross_devices or entry.stat(follow_symlinks=False).st_dev == root_dev:
+                                subdirs.append(entry.path)
+                        else:
+                            files += 1
+                            if sized < SIZE_SAMPLES:
+                                size_total += entry.stat(follow_symlinks=False).st_size
+                                sized += 1
+                    except OSError:
+                        continue
+        except OSError:
+            pass
+        cached = listings[path] = (files, files * size_total / sized if sized else 0.0, subdirs)
+        unlisted.discard(path)
+        unlisted.update(subdirs)
+        return cached
+
+    probes = []
+    while len(probes) < max_probes and (not probes or time.monotonic() - started < time_budget):
+        weight = 1
+        entries, nbytes, dirs = 1.0, 0.0, 1.0
+        path = root
+        while True:
+            files, file_bytes, subdirs = listing(path)
+            entries += weight * (files + len(subdirs))
+            dirs += weight * len(subdirs)
+            nbytes += weight * file_bytes
+            if not subdirs:
+                break
+            weight *= len(subdirs)
+            path = rng.choice(subdirs)
+        probes.append((entries, dirs, nbytes))
+        if not unlisted:
+            break
+
+    # Everything seen in the listed directories, a lower bound for the tree
+    known = 1 + sum(files + len(subdirs) for files, _, subdirs in listings.values())
+    exact = not unlisted
+    if exact:
+        entries = known
+        dirs = 1 + sum(len(subdirs) for _, _, subdirs in listings.values())
+        nbytes = sum(file_bytes for _, file_bytes, _ in listings.values())
+        spread = 0.0
+    else:
+        count = len(probes)
+        entries = sum(p[0] for p in probes) / count
+        dirs = sum(p[1] for p in probes) / count
+        nbytes = sum(p[2] for p in probes) / count
+        variance = sum((p[0] - entries) ** 2 for p in probes) / (count - 1) if count > 1 else entries ** 2
+        spread = 1.96 * math.sqrt(variance / count)
+    return {
+        'entries': round(entries),
+        'directories': round(dirs),
+        'files': round(entries - dirs),
+        'bytes': round(nbytes),
+        'entries_range': [max(known, round(entries - spread)), max(known, round(entries + spread))],
+        'exact': exact,
+        'probes': len(probes),
+        'directories_listed': len(listings),
+        'sampling_seconds': time.monotonic() - started,
+    }
+
+
+class ThroughputHistory:
+    """Moving averages of operation throughput per mount point and kind"""
+
+    def __init__(self, path: Path):
+        self.path = Path(path)
+
+    def _load(self) -> Dict:
+        try:
+            with open(self.path, 'r') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def record(self, mount: str, fstype: str, kind: str, entries: int, nbytes: int, seconds: float):
+        """Fold one finished run into the averages, tiny runs are ignored"""
+        amount = nbytes if kind in BYTE_KINDS else entries
+        if amount < (MIN_BYTES if kind in BYTE_KINDS else MIN_ENTRIES) or seconds < MIN_SECONDS:
+            return
+        rate = amount / seconds
+        data = self._load()
+        device = data.setdefault(mount, {'fstype': fstype, 'kinds': {}})
+        device['fstype'] = fstype
+        stats = device['kinds'].get(kind)
+        if stats is None:
+            stats = device['kinds'][kind] = {'rate': rate, 'runs': 0}
+        else:
+            stats['rate'] += SMOOTHING * (rate - stats['rate'])
+        stats['runs'] += 1
+        stats['updated'] = time.time()
+        tmp = self.path.with_name(f".{self.path.name}.{os.getpid()}.tmp")
+        with open(tmp, 'w') as f:
+            json.dump(data, f, indent=2)
+        os.replace(tmp, self.path)
+
+    def rate(self, mount: str, fstype: str, kind: str) -> Tuple[float, str]:
+        """(rate, basis): measured on this mount, averaged over mounts of the same
+        filesystem type, or a built-in default"""
+        data = self._load()
+        stats = data.get(mount, {}).get('kinds', {}).get(kind)
+        if stats:
+            return stats['rate'], 'device'
+        similar = [device['kinds'][kind]['rate'] for device in data.values()
+                   if device.get('fstype') == fstype and kind in device.get('kinds', {})]
+        if similar:
+            return sum(similar) / len(similar), 'fstype'
+        return DEFAULT_RATES[kind], 'default'
+
+
+def describe(estimate: Dict) -> str:
+    """One line summary of an estimate from FolderLockCore.estimate_lock"""
+    low, high = estimate['entries_range']
+    entries = f"{estimate['entries']:,} entries" if estimate['exact'] else f"~{estimate['entries']:,} entries ({low:,}-{high:,})"
+    return (f"{entries}, {format_size(estimate['bytes'])}; expected {format_duration(estimate['seconds'])} "
+            f"({BASIS_TEXT[estimate['basis']]})")
@@ -11,10 +11,18 @@ Advanced GUI with system tray and automatic unlock prompts
 import tkinter as tk
 from tkinter import ttk, messagebox, filedialog, simpledialog
 from pathlib import Path
-from folder_lock_core import FolderLockCore
+from folder_lock_core import FolderLockCore, format_size
+from folder_lock_daemon import connect
+from folder_lock_scheduler import RelockScheduler
 import webbrowser
 import os
 import sys
+import time
+
+# Seconds between checks for folders left open by a crashed temporarily_unlocked
+RECOVERY_INTERVAL = 5.0
+# How often the title bar picks up the progress of a running lock or unlock
+PROGRESS_POLL_MS = 100
 
 def resource_path(relative_path):
     """ Get absolute path to resource, works for dev and for PyInstaller """
@@ -154,6 +162,68 @@ def ask_yes_no(title, message, parent=None):
     parent.wait_window(msg)
     return msg.result
 
+def run_with_progress(window, locker, action, folder_path, password, **options):
+    """lock_folder or unlock_folder, showing its progress in window's title bar.
+
+    Returns (success, message, OperationResult). The operation runs on a
+    worker thread while the Tk loop keeps going; the title is updated from
+    it with after().
+    """
+    stream = getattr(locker, f'{action}_folder_stream', None)
+    if stream is None:
+        # Daemon client, no progress events
+        success, message = getattr(locker, f'{action}_folder')(folder_path, password, **options)
+        return success, message, locker.last_result
+    if getattr(window, '_operation_running', False):
+        return False, "An operation is already running", None
+    import threading
+    from folder_lock_progress import Finished, describe
+
+    root = window.nametowidget('.')
+    title = window.title()
+    # Written by the worker, read by poll on the Tk thread
+    state = {'text': None, 'outcome': None, 'error': None, 'done': False}
+    finished = tk.BooleanVar(root, False)
+
+    def consume():
+        try:
+            for event in stream(folder_path, password, **options):
+                if isinstance(event, Finished):
+                    state['outcome'] = (event.success, event.message, event.result)
+                else:
+                    state['text'] = describe(event) or state['text']
+        except Exception as e:
+            state['error'] = e
+        finally:
+            state['done'] = True
+
+    def poll():
+        try:
+            if state['text']:
+                window.title(f"{title} - {state['text']}")
+        except tk.TclError:
+            # The dialog was closed, the operation still finishes
+            pass
+        if state['done']:
+            finished.set(True)
+        else:
+            root.after(PROGRESS_POLL_MS, poll)
+
+    window._operation_running = True
+    threading.Thread(target=consume, name='folder-lock-progress', daemon=True).start()
+    poll()
+    try:
+        root.wait_variable(finished)
+    finally:
+        window._operation_running = False
+        try:
+            window.title(title)
+        except tk.TclError:
+            pass
+    if state['error'] is not None:
+        raise state['error']
+    return state['outcome']
+
 class UnlockDialog(tk.Toplevel):
     def __init__(self, parent, folder_path, locker):
         super().__init__(parent)
@@ -166,7 +236,7 @@ class UnlockDialog(tk.Toplevel):
         
         # Window setup
         self.title("🔒 Unlock Folder")
-        self.geometry("480x320")
+        self.geometry("480x400")
         self.resizable(False, False)
         self.configure(bg=Colors.BG_DARK)
         
@@ -177,7 +247,7 @@ class UnlockDialog(tk.Toplevel):
         # Center window
         self.update_idletasks()
         x = (self.winfo_screenwidth() // 2) - 240
-        y = (self.winfo_screenheight() // 2) - 160
+        y = (self.winfo_screenheight() // 2) - 200
         self.geometry(f"+{x}+{y}")
         
         self._create_widgets(folder_name)
@@ -247,7 +317,33 @@ class UnlockDialog(tk.Toplevel):
             relief='flat',
             show='●'
         )
-        self.password_entry.pack(fill='x', ipady=8, pady=(0, 20))
+        self.password_entry.pack(fill='x', ipady=8, pady=(0, 15))
+        
+        # Auto-relock
+        relock_frame = tk.Frame(content_frame, bg=Colors.BG_DARK)
+        relock_frame.pack(fill='x', pady=(0, 20))
+        
+        tk.Label(
+            relock_frame,
+            text="Relock automatically after (minutes, blank = never):",
+            font=('Segoe UI', 9),
+            bg=Colors.BG_DARK,
+            fg=Colors.TEXT_DIM
+        ).pack(side='left')
+        
+        self.relock_entry = tk.Entry(
+            relock_frame,
+            font=('Segoe UI', 10),
+            bg=Colors.BG_LIGHT,
+            fg=Colors.TEXT,
+            insertbackground=Colors.ACCENT,
+            relief='flat',
+            width=6
+        )
+        self.relock_entry.pack(side='right', ipady=4)
+        default = self.locker.locks.get(self.folder_path, {}).get('relock_after')
+        if default:
+            self.relock_entry.insert(0, f"{default:g}")
         
         # Buttons
         button_frame = tk.Frame(content_frame, bg=Colors.BG_DARK)
@@ -284,11 +380,19 @@ class UnlockDialog(tk.Toplevel):
             show_error("Error", "Please enter a password", parent=self)
             return
         
-        success, message = self.locker.unlock_folder(self.folder_path, password)
+        relock_text = self.relock_entry.get().strip()
+        try:
+            relock_after = float(relock_text) if relock_text else 0
+        except ValueError:
+            show_error("Error", "Relock time must be a number of minutes", parent=self)
+            return
+        
+        success, message, result = run_with_progress(self, self.locker, 'unlock', self.folder_path, password,
+                                                     relock_after=relock_after)
         
         if success:
             self.result = True
-            show_info("Success", "✓ Folder unlocked successfully!", parent=self)
+            show_info("Success", f"✓ {message}!\n\n{result.summary()}", parent=self)
             self.destroy()
         else:
             show_error("Access Denied", f"✗ {message}", parent=self)
@@ -305,7 +409,7 @@ class LockDialog(tk.Toplevel):
         folder_name = Path(folder_path).name
         
         self.title("🔒 Lock Folder")
-        self.geometry("480x400")
+        self.geometry("480x500")
         self.resizable(False, False)
         self.configure(bg=Colors.BG_DARK)
         
@@ -323,6 +427,38 @@ class LockDialog(tk.Toplevel):
         self.bind('<Escape>', lambda e: self.destroy())
         
         self.password_entry.focus_set()
+        
+        # Sampling takes up to a second, the dialog is usable meanwhile
+        self._estimate = None
+        import threading
+        threading.Thread(target=self._run_estimate, daemon=True).start()
+        self.after(100, self._poll_estimate)
+    
+    def _run_estimate(self):
+        # Worker thread, the Tk loop picks the outcome up in _poll_estimate
+        try:
+            self._estimate = self.locker.estimate_lock(self.folder_path)
+        except Exception as e:
+            self._estimate = {'error': str(e)}
+    
+    def _poll_estimate(self):
+        if not self.winfo_exists():
+            return
+        if self._estimate is None:
+            self.after(100, self._poll_estimate)
+        else:
+            self._show_estimate()
+    
+    def _show_estimate(self):
+        if self._estimate is None:
+            return
+        if 'error' in self._estimate:
+            self.estimate_label.config(text=f"Estimate unavailable: {self._estimate['error']}")
+            return
+        from folder_lock_estimate import describe
+        mode = 'encrypt' if self.encrypt_var.get() else 'pack' if self.pack_var.get() else 'permissions'
+        prediction = self._estimate['predictions'][mode]
+        self.estimate_label.config(text="⏱ " + describe(dict(self._estimate, **prediction)))
     
     def _create_widgets(self, folder_name):
         # Header
@@ -398,7 +534,49 @@ class LockDialog(tk.Toplevel):
             relief='flat',
             show='●'
         )
-        self.confirm_entry.pack(fill='x', ipady=8, pady=(0, 20))
+        self.confirm_entry.pack(fill='x', ipady=8, pady=(0, 15))
+        
+        # Optional encryption of the contents
+        self.encrypt_var = tk.BooleanVar(value=False)
+        tk.Checkbutton(
+            content_frame,
+            text="Encrypt file contents (slower, needs 'cryptography')",
+            variable=self.encrypt_var,
+            command=self._show_estimate,
+            font=('Segoe UI', 9),
+            bg=Colors.BG_DARK,
+            fg=Colors.TEXT_DIM,
+            selectcolor=Colors.BG_LIGHT,
+            activebackground=Colors.BG_DARK,
+            activeforeground=Colors.TEXT
+        ).pack(anchor='w')
+        
+        # Optional packing, for folders with very many small files
+        self.pack_var = tk.BooleanVar(value=False)
+        tk.Checkbutton(
+            content_frame,
+            text="Pack contents into one archive (many small files)",
+            variable=self.pack_var,
+            command=self._show_estimate,
+            font=('Segoe UI', 9),
+            bg=Colors.BG_DARK,
+            fg=Colors.TEXT_DIM,
+            selectcolor=Colors.BG_LIGHT,
+            activebackground=Colors.BG_DARK,
+            activeforeground=Colors.TEXT
+        ).pack(anchor='w', pady=(0, 10))
+        
+        # Filled in by _show_estimate once the folder has been sampled
+        self.estimate_label = tk.Label(
+            content_frame,
+            text="⏱ Estimating size and duration...",
+            font=('Segoe UI', 9),
+            bg=Colors.BG_DARK,
+            fg=Colors.TEXT_DIM,
+            wraplength=420,
+            justify='left'
+        )
+        self.estimate_label.pack(anchor='w', pady=(0, 10))
         
         tk.Label(
             content_frame,
@@ -452,15 +630,124 @@ class LockDialog(tk.Toplevel):
             show_error("Error", "Password must be at least 4 characters", parent=self)
             return
         
-        success, message = self.locker.lock_folder(self.folder_path, password)
+        if self.encrypt_var.get() and self.pack_var.get():
+            show_error("Error", "Choose either encryption or packing", parent=self)
+            return
+        
+        mode = 'encrypt' if self.encrypt_var.get() else 'pack' if self.pack_var.get() else 'permissions'
+        success, message, result = run_with_progress(self, self.locker, 'lock', self.folder_path, password, mode=mode)
         
         if success:
             self.result = True
-            show_info("Success", f"✓ Folder locked successfully!", parent=self)
+            show_info("Success", f"✓ Folder locked successfully!\n\n{result.summary()}", parent=self)
             self.destroy()
         else:
             show_error("Error", f"✗ {message}", parent=self)
 
+class HistoryDialog(tk.Toplevel):
+    def __init__(self, parent, locker):
+        super().__init__(parent)
+        self.locker = locker
+        self.records = []
+        
+        self.title("📊 Operation History")
+        self.geometry("760x480")
+        self.configure(bg=Colors.BG_DARK)
+        self.transient(parent)
+        
+        self.update_idletasks()
+        x = (self.winfo_screenwidth() // 2) - 380
+        y = (self.winfo_screenheight() // 2) - 240
+        self.geometry(f"+{x}+{y}")
+        
+        self._create_widgets()
+        self._load_records()
+        
+        self.bind('<Escape>', lambda e: self.destroy())
+        
+    def _create_widgets(self):
+        # Header
+        header = tk.Frame(self, bg=Colors.BG_MEDIUM, height=50)
+        header.pack(fill='x')
+        header.pack_propagate(False)
+        
+        tk.Label(
+            header, text="📊  Operation History", font=('Segoe UI', 12, 'bold'),
+            bg=Colors.BG_MEDIUM, fg=Colors.TEXT
+        ).pack(side='left', padx=20)
+        
+        content = tk.Frame(self, bg=Colors.BG_DARK)
+        content.pack(fill='both', expand=True, padx=20, pady=15)
+        
+        style = ttk.Style(self)
+        style.configure(
+            'History.Treeview', background=Colors.BG_LIGHT, fieldbackground=Colors.BG_LIGHT,
+            foreground=Colors.TEXT, borderwidth=0, font=('Segoe UI', 9)
+        )
+        style.configure(
+            'History.Treeview.Heading', background=Colors.BG_MEDIUM,
+            foreground=Colors.TEXT, font=('Segoe UI', 9, 'bold')
+        )
+        style.map('History.Treeview', background=[('selected', Colors.ACCENT)])
+        
+        columns = ('time', 'operation', 'folder', 'entries', 'size', 'duration', 'errors')
+        self.tree = ttk.Treeview(content, columns=columns, show='headings', style='History.Treeview', height=12)
+        headings = {
+            'time': ("Time", 130), 'operation': ("Action", 60), 'folder': ("Folder", 170),
+            'entries': ("Entries", 70), 'size': ("Size", 80), 'duration': ("Duration", 70),
+            'errors': ("Errors", 60),
+        }
+        for column, (text, width) in headings.items():
+            self.tree.heading(column, text=text)
+            self.tree.column(column, width=width, anchor='w')
+        self.tree.pack(fill='both', expand=True)
+        self.tree.tag_configure('failed', foreground=Colors.WARNING)
+        self.tree.bind('<<TreeviewSelect>>', self._show_details)
+        
+        # Details of the selected operation
+        self.details = tk.Text(
+            content, height=6, font=('Consolas', 9),
+            bg=Colors.BG_LIGHT, fg=Colors.TEXT_DIM, relief='flat', wrap='none'
+        )
+        self.details.pack(fill='x', pady=(10, 0))
+        self.details.config(state='disabled')
+        
+    def _load_records(self):
+        # Newest first
+        self.records = list(reversed(self.locker.get_history()))
+        for index, record in enumerate(self.records):
+            failed = not record.get('success') or record.get('error_count')
+            self.tree.insert(
+                '', tk.END, iid=str(index), tags=('failed',) if failed else (),
+                values=(
+                    time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(record.get('started', 0))),
+                    record.get('operation', ''),
+                    Path(record.get('path', '')).name,
+                    record.get('entries', 0),
+                    format_size(record.get('bytes', 0)),
+                    f"{record.get('duration', 0):.2f}s",
+                    record.get('error_count', 0),
+                )
+            )
+            
+    def _show_details(self, event=None):
+        selection = self.tree.selection()
+        if not selection:
+            return
+        record = self.records[int(selection[0])]
+        
+        lines = [f"{record.get('path', '')}  —  {record.get('message', '')}"]
+        for path, error in record.get('errors', []):
+            lines.append(f"  ✗ {path}: {error}")
+        hidden = record.get('error_count', 0) - len(record.get('errors', []))
+        if hidden > 0:
+            lines.append(f"  ... {hidden} more")
+        
+        self.details.config(state='normal')
+        self.details.delete('1.0', tk.END)
+        self.details.insert(tk.END, "\n".join(lines))
+        self.details.config(state='disabled')
+
 class MasterKeySetup(tk.Toplevel):
     def __init__(self, parent, locker):
         super().__init__(parent)
@@ -541,7 +828,8 @@ class MasterKeySetup(tk.Toplevel):
 class MainApp:
     def __init__(self):
         self.root = tk.Tk()
-        self.locker = FolderLockCore()
+        # Shares the resident daemon's view when it is running
+        self.locker = connect()
         
         self.root.title("Folder Lock 3.0")
         try:
@@ -560,10 +848,42 @@ class MainApp:
         self.center_window()
         self._create_widgets()
         
+        # Auto-relock runs in the daemon when attached to one, otherwise here
+        self._relocked = False
+        self._next_recovery = 0.0
+        self.scheduler = None
+        if isinstance(self.locker, FolderLockCore):
+            self.scheduler = RelockScheduler(self.locker, on_relock=self._on_relock)
+            self.scheduler.start()
+        self.root.after(1000, self._poll_relocks)
+        
         # Check Master Key
         self.root.after(100, self.check_master_key)
         self._refresh_list()
         
+    def _on_relock(self, outcomes):
+        # Called from the scheduler thread, the Tk loop picks it up in _poll_relocks
+        self._relocked = True
+
+    def _poll_relocks(self):
+        if self._relocked:
+            self._relocked = False
+            self._refresh_list()
+        # The daemon does this itself; here it walks folders, so off the Tk thread
+        if self.scheduler is not None and time.time() >= self._next_recovery:
+            self._next_recovery = time.time() + RECOVERY_INTERVAL
+            import threading
+            threading.Thread(target=self._recover_temporary_access, daemon=True).start()
+        self.root.after(1000, self._poll_relocks)
+
+    def _recover_temporary_access(self):
+        try:
+            outcomes = self.locker.recover_temporary_access()
+        except Exception:
+            return
+        if outcomes:
+            self._relocked = True
+
     def check_master_key(self):
         if not self.locker.master_key_hash:
             MasterKeySetup(self.root, self.locker)
@@ -632,6 +952,14 @@ class MainApp:
             command=self._refresh_list, pady=12
         ).pack(fill='x', padx=20, pady=10)
         
+        ModernButton(
+            sidebar, text="📊 History",
+            bg=Colors.BG_LIGHT, fg=Colors.TEXT,
+            activebackground=Colors.BG_DARK,
+            font=('Segoe UI', 10),
+            command=self.show_history, pady=12
+        ).pack(fill='x', padx=20, pady=10)
+        
         # Main Content
         main_area = tk.Frame(self.root, bg=Colors.BG_DARK)
         main_area.pack(side='left', fill='both', expand=True, padx=30, pady=30)
@@ -677,6 +1005,13 @@ class MainApp:
         self.folder_list.bind('<Double-Button-1>', self.unlock_selected_folder)
         self.folder_list.bind('<Return>', self.unlock_selected_folder)
         
+        # Metrics of the most recent operation
+        self.metrics_label = tk.Label(
+            main_area, text="", font=('Segoe UI', 9),
+            bg=Colors.BG_DARK, fg=Colors.TEXT_DIM, anchor='w', justify='left'
+        )
+        self.metrics_label.pack(fill='x', pady=(10, 0))
+        
         # Footer
         tk.Label(
             main_area, text="Double-click a folder to unlock it",
@@ -686,10 +1021,11 @@ class MainApp:
     def _refresh_list(self):
         self.folder_list.delete(0, tk.END)
         locks = self.locker.get_all_locks()
+        statuses = self.locker.get_lock_status()
         
         for path_str, info in locks.items():
             name = info.get('name', Path(path_str).name)
-            exists = Path(path_str).exists()
+            exists = statuses.get(path_str) == 'ACTIVE'
             status = "ACTIVE" if exists else "MISSING"
             
             # Use unicode icons for status
@@ -698,6 +1034,26 @@ class MainApp:
             self.folder_list.insert(tk.END, display_text)
             
         self.count_label.config(text=f"{len(locks)} Protected")
+        self._refresh_metrics()
+
+    def _refresh_metrics(self):
+        history = self.locker.get_history()
+        if not history:
+            self.metrics_label.config(text="No operations recorded yet", fg=Colors.TEXT_DIM)
+            return
+        
+        last = history[-1]
+        text = (
+            f"Last {last['operation']}: {Path(last['path']).name}  •  {last['entries']} entries  •  "
+            f"{format_size(last['bytes'])}  •  {last['duration']:.2f}s"
+        )
+        if last['error_count']:
+            text += f"  •  {last['error_count']} failed"
+        color = Colors.WARNING if last['error_count'] or not last['success'] else Colors.TEXT_DIM
+        self.metrics_label.config(text=text, fg=color)
+
+    def show_history(self):
+        HistoryDialog(self.root, self.locker)
 
     def lock_new_folder(self):
         folder_selected = filedialog.askdirectory()
@@ -709,7 +1065,8 @@ class MainApp:
                 show_warning("Warning", "This folder is already locked!", parent=self.root)
                 return
                 
-            LockDialog(self.root, str(path), self.locker)
+            dialog = LockDialog(self.root, str(path), self.locker)
+            self.root.wait_window(dialog)
             self._refresh_list()
 
     def unlock_selected_folder(self, event=None):
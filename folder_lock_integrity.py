@@ -0,0 +1,239 @@
+"""
+Merkle integrity manifests for locked folders
+
+At lock time every file is hashed into a Merkle tree of 1 MiB chunks and
+the per-file roots are combined into one root for the folder. At unlock
+the tree is hashed again and compared, which proves nothing changed while
+the folder was locked or lists exactly what did.
+
+Hashing runs on a process pool: small files are hashed in batches, large
+ones are split into chunk ranges read through mmap so workers hash
+straight from the page cache without copying. When locking, files whose
+size and mtime match the previous manifest reuse its hash. Unlock always
+rehashes, mtimes are easy to forge.
+"""
+
+import os
+import json
+import stat
+import hashlib
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+CHUNK_SIZE = 1024 * 1024
+# Files above this are split into chunk ranges across workers
+SPLIT_SIZE = 64 * 1024 * 1024
+RANGE_CHUNKS = 32
+BATCH_FILES = 64
+BATCH_BYTES = 32 * 1024 * 1024
+# Below this much data a process pool costs more than it saves
+POOL_MIN_BYTES = 16 * 1024 * 1024
+# Paths listed per category in a verification report, the rest are counted
+MAX_REPORTED_PATHS = 100
+
+_LEAF = b'\x00'
+_NODE = b'\x01'
+
+
+def merkle_root(leaves: List[bytes]) -> bytes:
+    """Root of a binary Merkle tree, an odd node is promoted unchanged"""
+    if not leaves:
+        return hashlib.sha256(_LEAF).digest()
+    level = leaves
+    while len(level) > 1:
+        paired = [hashlib.sha256(_NODE + level[i] + level[i + 1]).digest() for i in range(0, len(level) - 1, 2)]
+        if len(level) % 2:
+            paired.append(level[-1])
+        level = paired
+    return level[0]
+
+
+def _chunk_leaves(path: str, first: int, last: int) -> List[bytes]:
+    """Leaf hashes of chunks first..last-1, read through mmap"""
+    import mmap
+
+    leaves = []
+    with open(path, 'rb') as f:
+        size = os.fstat(f.fileno()).st_size
+        if size == 0:
+            return [hashlib.sha256(_LEAF).digest()]
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+            view = memoryview(mapped)
+            try:
+                for index in range(first, last):
+                    start = index * CHUNK_SIZE
+                    if start >= size:
+                        break
+                    digest = hashlib.sha256(_LEAF)
+                    digest.update(view[start:start + CHUNK_SIZE])
+                    leaves.append(digest.digest())
+            finally:
+                view.release()
+    return leaves
+
+
+def _hash_batch(paths: List[str]) -> List[Tuple[str, Optional[str]]]:
+    """Pool task: whole-file roots, None for files that can't be read"""
+    hashes = []
+    for path in paths:
+        try:
+            hashes.append((path, merkle_root(_chunk_leaves(path, 0, 2 ** 62)).hex()))
+        except (OSError, ValueError):
+            hashes.append((path, None))
+    return hashes
+
+
+def _hash_range(path: str, first: int, last: int) -> List[bytes]:
+    """Pool task: leaves of one chunk range of a large file"""
+    return _chunk_leaves(path, first, last)
+
+
+def scan(root: str, cross_devices: bool = False,
+         unreadable: Optional[List[str]] = None) -> Dict[str, Tuple[int, int]]:
+    """Relative path -> (size, mtime_ns) for every regular file under root.
+
+    Walks like the permission walk: symlinks are skipped, a hard-linked
+    file is listed once and mount points only with cross_devices. Entries
+    that can't be listed or lstat'ed are appended to unreadable.
+    """
+    from folder_lock_walk import iter_tree
+
+    def failed(path: str, _error: OSError):
+        if unreadable is not None:
+            unreadable.append(os.path.relpath(path, root))
+
+    files = {}
+    for path, st in iter_tree(root, cross_devices=cross_devices, on_error=failed):
+        if stat.S_ISREG(st.st_mode):
+            files[os.path.relpath(path, root)] = (st.st_size, st.st_mtime_ns)
+    return files
+
+
+def build_manifest(root: str, previous: Optional[Dict] = None, workers: Optional[int] = None,
+                   cross_devices: bool = False) -> Dict:
+    """Hash every file under root.
+
+    previous is an earlier manifest of the same folder; files whose size
+    and mtime are unchanged reuse its hashes. The manifest maps relative
+    paths to [size, mtime_ns, hash] and carries the folder root hash;
+    'unreadable' lists directories, entries and files that couldn't be read.
+    """
+    unreadable: List[str] = []
+    files = scan(root, cross_devices, unreadable)
+    known = (previous or {}).get('files', {})
+    hashes: Dict[str, Optional[str]] = {}
+    todo = []
+    for rel, (size, mtime) in files.items():
+        entry = known.get(rel)
+        if entry is not None and entry[0] == size and entry[1] == mtime:
+            hashes[rel] = entry[2]
+        else:
+            todo.append((rel, size))
+
+    total = sum(size for _, size in todo)
+    workers = workers or os.cpu_count() or 1
+    if workers == 1 or total < POOL_MIN_BYTES:
+        for path, digest in _hash_batch([os.path.join(root, rel) for rel, _ in todo]):
+            hashes[os.path.relpath(path, root)] = digest
+    else:
+        hashes.update(_hash_parallel(root, todo, workers))
+
+    entries = {rel: [files[rel][0], files[rel][1], hashes.get(rel)] for rel in files}
+    unreadable.extend(rel for rel, entry in entries.items() if entry[2] is None)
+    return {'root': tree_root(entries), 'chunk_size': CHUNK_SIZE, 'files': entries,
+            'unreadable': sorted(unreadable)}
+
+
+def _hash_parallel(root: str, todo: List[Tuple[str, int]], workers: int) -> Dict[str, Optional[str]]:
+    import multiprocessing
+    from concurrent.futures import ProcessPoolExecutor
+
+    hashes = {}
+    batches, batch, batch_bytes = [], [], 0
+    ranges = {}
+    for rel, size in todo:
+        path = os.path.join(root, rel)
+        if size > SPLIT_SIZE:
+            chunks = (size + CHUNK_SIZE - 1) // CHUNK_SIZE
+            ranges[rel] = [(path, first, min(chunks, first + RANGE_CHUNKS)) for first in range(0, chunks, RANGE_CHUNKS)]
+            continue
+        batch.append(path)
+        batch_bytes += size
+        if len(batch) >= BATCH_FILES or batch_bytes >= BATCH_BYTES:
+            batches.append(batch)
+            batch, batch_bytes = [], 0
+    if batch:
+        batches.append(batch)
+
+    # spawn: forking a threaded process (daemon, GUI) is unsafe
+    context = multiprocessing.get_context('spawn')
+    with ProcessPoolExecutor(max_workers=workers, mp_context=context) as pool:
+        batch_futures = [pool.submit(_hash_batch, batch) for batch in batches]
+        range_futures = {rel: [pool.submit(_hash_range, *task) for task in tasks] for rel, tasks in ranges.items()}
+        for future in batch_futures:
+            for path, digest in future.result():
+                hashes[os.path.relpath(path, root)] = digest
+        for rel, futures in range_futures.items():
+            try:
+                leaves = [leaf for future in futures for leaf in future.result()]
+                hashes[rel] = merkle_root(leaves).hex()
+            except (OSError, ValueError):
+                hashes[rel] = None
+    return hashes
+
+
+def tree_root(entries: Dict[str, List]) -> str:
+    """Folder root over (path, file hash) leaves in path order"""
+    leaves = [
+        hashlib.sha256(_LEAF + rel.encode('utf-8', 'surrogateescape') + b'\x00' + (entry[2] or '').encode()).digest()
+        for rel, entry in sorted(entries.items())
+    ]
+    return merkle_root(leaves).hex()
+
+
+def _under(rel: str, directories: List[str]) -> bool:
+    return any(rel == d or d == '.' or rel.startswith(d + os.sep) for d in directories)
+
+
+def compare(expected: Dict, actual: Dict) -> Dict:
+    """Report changed, added and removed paths between two manifests.
+
+    Paths either manifest couldn't read are reported as 'unreadable' and
+    fail verification: nothing can be vouched for behind them. Files under
+    an unreadable directory are not reported as removed.
+    """
+    unreadable_set = set(expected.get('unreadable', [])) | set(actual.get('unreadable', []))
+    unreadable = sorted(unreadable_set)
+    report = {'verified': expected['root'] == actual['root'] and not unreadable,
+              'unreadable_count': len(unreadable), 'unreadable': unreadable[:MAX_REPORTED_PATHS]}
+    if expected['root'] == actual['root']:
+        report.update(changed=[], added=[], removed=[], change_count=0)
+        return report
+
+    old, new = expected['files'], actual['files']
+    changed = sorted(rel for rel in old.keys() & new.keys()
+                     if (old[rel][2] != new[rel][2] or old[rel][2] is None) and rel not in unreadable_set)
+    added = sorted(new.keys() - old.keys())
+    removed = sorted(rel for rel in old.keys() - new.keys() if not _under(rel, unreadable))
+    report['change_count'] = len(changed) + len(added) + len(removed)
+    report['changed'] = changed[:MAX_REPORTED_PATHS]
+    report['added'] = added[:MAX_REPORTED_PATHS]
+    report['removed'] = removed[:MAX_REPORTED_PATHS]
+    return report
+
+
+def load_manifest(path: Path) -> Optional[Dict]:
+    try:
+        with open(path, 'r') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def save_manifest(path: Path, manifest: Dict):
+    """Write a manifest readable by its owner only"""
+    tmp = path.with_suffix('.tmp')
+    fd = os.open(tmp, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+    with os.fdopen(fd, 'w') as f:
+        json.dump(manifest, f)
+    os.replace(tmp, path)
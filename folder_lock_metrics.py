@@ -0,0 +1,280 @@
+"""
+Instrumentation for FolderLockCore
+
+Disabled by default: FolderLockCore.metrics is None and every hook is a
+single attribute check. Enable it with FOLDER_LOCK_METRICS=1 or
+FolderLockCore.enable_metrics(). Collected are:
+
+- phase timers (walk, save, hash, encrypt, pack, ...) as histograms,
+- counters: operations, entries visited, bytes, syscalls issued, errors,
+- a chmod latency histogram fed by the permission walks.
+
+Listeners registered with Metrics.add_listener are called with
+(name, value, labels) at the end of every phase and operation. Totals are
+kept in metrics.json so they accumulate across CLI runs, and rendered in
+the Prometheus text format to metrics.prom for node_exporter's textfile
+collector (point --collector.textfile.directory at the config directory).
+
+Several processes (CLI runs, the daemon, the GUI) may record at once.
+Each keeps what it counted since its last flush apart, and flush adds
+that to the totals read back from metrics.json under an exclusive lock on
+metrics.lock, so no process overwrites another's counts.
+"""
+
+import os
+import json
+import time
+import bisect
+import threading
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Tuple
+
+try:
+    import fcntl
+except ImportError:  # Windows: concurrent flushes may lose counts
+    fcntl = None
+
+PREFIX = 'folder_lock'
+# Upper bounds in seconds, from a fast local chmod to a long walk
+BUCKETS = (0.00001, 0.0001, 0.001, 0.01, 0.1, 1.0, 10.0, 60.0, 600.0)
+
+HELP = {
+    'operations_total': ('counter', "Finished operations by type and outcome"),
+    'entries_total': ('counter', "Filesystem entries processed"),
+    'bytes_total': ('counter', "Bytes in the processed entries"),
+    'errors_total': ('counter', "Entries that could not be processed"),
+    'syscalls_total': ('counter', "Metadata system calls issued"),
+    'phase_seconds': ('histogram', "Time spent per phase of an operation"),
+    'chmod_seconds': ('histogram', "Latency of single chmod calls"),
+}
+
+
+class Histogram:
+    """Cumulative-bucket histogram in the Prometheus sense"""
+
+    __slots__ = ('counts', 'sum', 'count')
+
+    def __init__(self):
+        self.counts = [0] * (len(BUCKETS) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float):
+        self.counts[bisect.bisect_left(BUCKETS, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def merge(self, other: 'Histogram'):
+        for index, count in enumerate(other.counts):
+            self.counts[index] += count
+        self.sum += other.sum
+        self.count += other.count
+
+    def to_list(self) -> List:
+        return [list(self.counts), self.sum, self.count]
+
+    @classmethod
+    def from_list(cls, data: List) -> 'Histogram':
+        histogram = cls()
+        if len(data[0]) == len(histogram.counts):
+            histogram.counts, histogram.sum, histogram.count = list(data[0]), data[1], data[2]
+        return histogram
+
+
+def _key(name: str, labels: Optional[Dict[str, str]]) -> Tuple:
+    return (name,) + tuple(sorted((labels or {}).items()))
+
+
+def _format_labels(pairs, extra: str = '') -> str:
+    parts = [f'{k}="{v}"' for k, v in pairs]
+    if extra:
+        parts.append(extra)
+    return '{' + ','.join(parts) + '}' if parts else ''
+
+
+class Metrics:
+    def __init__(self, state_file: Optional[Path] = None, textfile: Optional[Path] = None):
+        self.state_file = state_file
+        self.textfile = textfile
+        # Totals as last read from or written to state_file
+        self._base_counters: Dict[Tuple, float] = {}
+        self._base_histograms: Dict[Tuple, Histogram] = {}
+        # Recorded by this process since then
+        self._counters: Dict[Tuple, float] = {}
+        self._histograms: Dict[Tuple, Histogram] = {}
+        self._listeners: List[Callable[[str, float, Dict], None]] = []
+        self._mutex = threading.Lock()
+        self._flush_mutex = threading.Lock()
+        if state_file is not None:
+            self._base_counters, self._base_histograms = self._load()
+
+    def add_listener(self, listener: Callable[[str, float, Dict], None]):
+        """Call listener(name, value, labels) for every phase and operation"""
+        self._listeners.append(listener)
+
+    def _notify(self, name: str, value: float, labels: Dict):
+        for listener in self._listeners:
+            try:
+                listener(name, value, labels)
+            except Exception:
+                # A broken listener must not fail a lock
+                pass
+
+    def count(self, name: str, value: float = 1, labels: Optional[Dict[str, str]] = None):
+        key = _key(name, labels)
+        with self._mutex:
+            self._counters[key] = self._counters.get(key, 0) + value
+
+    def observe(self, name: str, value: float, labels: Optional[Dict[str, str]] = None):
+        key = _key(name, labels)
+        with self._mutex:
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = self._histograms[key] = Histogram()
+            histogram.observe(value)
+
+    def merge(self, name: str, histogram: Histogram, labels: Optional[Dict[str, str]] = None):
+        """Add a histogram collected locally, e.g. by one walk"""
+        if not histogram.count:
+            return
+        key = _key(name, labels)
+        with self._mutex:
+            self._histograms.setdefault(key, Histogram()).merge(histogram)
+
+    @contextmanager
+    def phase(self, name: str):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            seconds = time.perf_counter() - started
+            self.observe('phase_seconds', seconds, {'phase': name})
+            self._notify('phase_seconds', seconds, {'phase': name})
+
+    def record_operation(self, result):
+        """Count a finished OperationResult and publish the totals"""
+        labels = {'operation': result.operation}
+        self.count('operations_total', 1, dict(labels, result='success' if result.success else 'failure'))
+        self.count('entries_total', result.entries, labels)
+        self.count('bytes_total', result.bytes, labels)
+        self.count('errors_total', result.error_count, labels)
+        self._notify('operation_seconds', result.duration, dict(labels, success=str(result.success).lower()))
+        self.flush()
+
+    @staticmethod
+    def _combined(counters: Dict, histograms: Dict, more_counters: Dict,
+                  more_histograms: Dict) -> Tuple[Dict, Dict]:
+        counters = dict(counters)
+        for key, value in more_counters.items():
+            counters[key] = counters.get(key, 0) + value
+        combined = {}
+        for source in (histograms, more_histograms):
+            for key, histogram in source.items():
+                combined.setdefault(key, Histogram()).merge(histogram)
+        return counters, combined
+
+    def _totals(self) -> Tuple[Dict, Dict]:
+        with self._mutex:
+            return self._combined(self._base_counters, self._base_histograms, self._counters, self._histograms)
+
+    def snapshot(self) -> Dict:
+        return self._serialize(*self._totals())
+
+    @staticmethod
+    def _serialize(counters: Dict, histograms: Dict) -> Dict:
+        return {
+            'counters': [[list(key), value] for key, value in counters.items()],
+            'histograms': [[list(key), h.to_list()] for key, h in histograms.items()],
+        }
+
+    def _load(self) -> Tuple[Dict, Dict]:
+        counters, histograms = {}, {}
+        try:
+            with open(self.state_file, 'r') as f:
+                state = json.load(f)
+            for key, value in state.get('counters', []):
+                counters[tuple(key[:1]) + tuple(tuple(pair) for pair in key[1:])] = value
+            for key, data in state.get('histograms', []):
+                histograms[tuple(key[:1]) + tuple(tuple(pair) for pair in key[1:])] = Histogram.from_list(data)
+        except (OSError, ValueError, TypeError, IndexError):
+            pass
+        return counters, histograms
+
+    def render(self) -> str:
+        """Everything collected, in the Prometheus text exposition format"""
+        counters, histograms = self._totals()
+        counters = sorted(counters.items())
+        histograms = sorted((key, h.to_list()) for key, h in histograms.items())
+        lines = []
+        described = set()
+
+        def describe(name):
+            if name not in described:
+                described.add(name)
+                kind, text = HELP.get(name, ('untyped', name))
+                lines.append(f"# HELP {PREFIX}_{name} {text}")
+                lines.append(f"# TYPE {PREFIX}_{name} {kind}")
+
+        for key, value in counters:
+            describe(key[0])
+            lines.append(f"{PREFIX}_{key[0]}{_format_labels(key[1:])} {value:g}")
+        for key, (counts, total, count) in histograms:
+            describe(key[0])
+            cumulative = 0
+            for bound, bucket in zip(BUCKETS + (None,), counts):
+                cumulative += bucket
+                le = 'le="+Inf"' if bound is None else f'le="{bound:g}"'
+                lines.append(f"{PREFIX}_{key[0]}_bucket{_format_labels(key[1:], le)} {cumulative}")
+            lines.append(f"{PREFIX}_{key[0]}_sum{_format_labels(key[1:])} {total:g}")
+            lines.append(f"{PREFIX}_{key[0]}_count{_format_labels(key[1:])} {count}")
+        return '\n'.join(lines) + '\n'
+
+    @contextmanager
+    def _file_lock(self):
+        """Exclusive access to state_file across processes"""
+        if fcntl is None or self.state_file is None:
+            yield
+            return
+        try:
+            handle = open(self.state_file.with_name('metrics.lock'), 'a')
+        except OSError:
+            yield
+            return
+        with handle:
+            fcntl.flock(handle, fcntl.LOCK_EX)
+            yield
+
+    def flush(self):
+        """Add what was recorded since the last flush to metrics.json and rewrite the textfile.
+
+        Both are replaced atomically, metrics.json is read back first under
+        the file lock so counts flushed by other processes are kept.
+        """
+        with self._flush_mutex, self._file_lock():
+            with self._mutex:
+                counters, histograms = self._counters, self._histograms
+                self._counters, self._histograms = {}, {}
+            base = self._load() if self.state_file is not None else (self._base_counters, self._base_histograms)
+            totals = self._combined(*base, counters, histograms)
+            if self.state_file is None or self._write(self.state_file, json.dumps(self._serialize(*totals))):
+                with self._mutex:
+                    self._base_counters, self._base_histograms = totals
+            else:
+                # Not written, keep the counts for the next flush
+                with self._mutex:
+                    self._counters, self._histograms = self._combined(counters, histograms,
+                                                                      self._counters, self._histograms)
+            if self.textfile is not None:
+                self._write(self.textfile, self.render())
+
+    @staticmethod
+    def _write(path: Path, text: str) -> bool:
+        tmp = path.with_name(f".{path.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+        try:
+            with open(tmp, 'w') as f:
+                f.write(text)
+            os.replace(tmp, path)
+        except OSError:
+            return False
+        return True
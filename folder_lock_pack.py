@@ -0,0 +1,311 @@
+"""
+Packed-archive lock mode
+
+Trees with millions of tiny files are the worst case for a per-entry chmod
+walk. In pack mode the whole tree is streamed into one archive in the
+registry directory and the originals are removed, leaving an empty root
+directory behind; locking then only touches that one directory.
+
+Archive: each file is zlib-compressed on its own and appended, so any
+member can be read back by seeking to its offset without touching the
+rest. Index: a JSON list of entries (relative path, type, mode, mtime,
+owner, offset, compressed and original size, SHA-256), kept next to the
+archive with mode 0600 like the archive itself.
+
+The tree is only removed after every member has been read back and
+checked against its SHA-256 and the caller has recorded the archive.
+Only indexed entries are removed, and only while their lstat still
+matches the index: anything created or changed in the meantime makes
+clear_tree stop, and unpack_tree(missing_only=True) puts back what it
+had already removed. Mount points inside the folder are neither packed
+nor removed unless cross_devices is set, like in the permission walk.
+Extraction restores modes, owners and mtimes.
+"""
+
+import os
+import json
+import stat
+import zlib
+import hashlib
+from pathlib import Path
+from typing import Dict, List
+
+READ_SIZE = 1024 * 1024
+COMPRESS_LEVEL = 6
+
+
+class PackError(Exception):
+    """Raised when a tree can't be packed safely or an archive is damaged"""
+
+
+def _open_private(path: Path, flags: int):
+    return os.fdopen(os.open(path, flags | os.O_CREAT | os.O_TRUNC, 0o600), 'wb')
+
+
+def _entry(root: str, path: str, st, kind: str) -> Dict:
+    return {
+        'path': os.path.relpath(path, root),
+        'type': kind,
+        'mode': stat.S_IMODE(st.st_mode),
+        'mtime_ns': st.st_mtime_ns,
+        'uid': st.st_uid,
+        'gid': st.st_gid,
+        # Identity at packing time, checked again before removal
+        'ino': st.st_ino,
+    }
+
+
+def _unchanged(entry: Dict, st) -> bool:
+    """True if st (an lstat) still describes the entry as it was packed"""
+    if st.st_ino != entry['ino'] or st.st_mtime_ns != entry['mtime_ns']:
+        return False
+    if entry['type'] == 'file':
+        return stat.S_ISREG(st.st_mode) and st.st_size == entry['size']
+    if entry['type'] == 'symlink':
+        return stat.S_ISLNK(st.st_mode) and st.st_size == len(os.fsencode(entry['target']))
+    return stat.S_ISDIR(st.st_mode)
+
+
+def _fail(path, error):
+    raise PackError(f"Cannot read {path}: {error}")
+
+
+def _append_file(out, path: str, entry: Dict):
+    """Stream one file into the archive, compressing and hashing as it goes"""
+    compressor = zlib.compressobj(COMPRESS_LEVEL)
+    digest = hashlib.sha256()
+    entry['offset'] = out.tell()
+    size = 0
+    with open(path, 'rb') as src:
+        while True:
+            block = src.read(READ_SIZE)
+            if not block:
+                break
+            size += len(block)
+            digest.update(block)
+            out.write(compressor.compress(block))
+    out.write(compressor.flush())
+    entry['size'] = size
+    entry['csize'] = out.tell() - entry['offset']
+    entry['sha256'] = digest.hexdigest()
+
+
+def _read_member(archive, entry: Dict, sink=None) -> str:
+    """Decompress one member, passing data to sink, returns its SHA-256"""
+    archive.seek(entry['offset'])
+    decompressor = zlib.decompressobj()
+    digest = hashlib.sha256()
+    remaining = entry['csize']
+    size = 0
+    while remaining:
+        block = archive.read(min(READ_SIZE, remaining))
+        if not block:
+            raise PackError(f"Archive is truncated at {entry['path']}")
+        remaining -= len(block)
+        data = decompressor.decompress(block)
+        size += len(data)
+        digest.update(data)
+        if sink is not None:
+            sink(data)
+    data = decompressor.flush()
+    size += len(data)
+    digest.update(data)
+    if sink is not None:
+        sink(data)
+    if size != entry['size']:
+        raise PackError(f"Size mismatch for {entry['path']}")
+    return digest.hexdigest()
+
+
+def build_archive(root: str, archive_path: Path, index_path: Path, result,
+                  cross_devices: bool = False) -> List[Dict]:
+    """Archive everything under root and read it back to verify it.
+
+    Symlinks are stored as links, each name of a hard-linked file as a
+    file of its own. Mount points are left out unless cross_devices is
+    set. Raises PackError for special files, unreadable directories or if
+    verification fails, leaving no archive behind. The tree itself is not
+    touched, see clear_tree. Counts go to result.entries/bytes.
+    """
+    from folder_lock_walk import iter_tree
+
+    entries = [_entry(root, root, os.lstat(root), 'dir')]
+    part = archive_path.with_suffix('.part')
+    try:
+        with _open_private(part, os.O_WRONLY) as out:
+            # Top-down, so a directory is indexed (and extracted) before its contents
+            for path, st in iter_tree(root, topdown=True, cross_devices=cross_devices,
+                                      on_error=_fail, links=True):
+                if path == root:
+                    continue
+                if stat.S_ISLNK(st.st_mode):
+                    entry = _entry(root, path, st, 'symlink')
+                    entry['target'] = os.readlink(path)
+                elif stat.S_ISDIR(st.st_mode):
+                    entry = _entry(root, path, st, 'dir')
+                elif stat.S_ISREG(st.st_mode):
+                    entry = _entry(root, path, st, 'file')
+                    _append_file(out, path, entry)
+                    result.bytes += entry['size']
+                else:
+                    raise PackError(f"Cannot pack special file {path}")
+                entries.append(entry)
+                result.entries += 1
+            out.flush()
+            os.fsync(out.fileno())
+
+        with open(part, 'rb') as archive:
+            for entry in entries:
+                if entry['type'] == 'file' and _read_member(archive, entry) != entry['sha256']:
+                    raise PackError(f"Verification failed for {entry['path']}")
+
+        with _open_private(index_path, os.O_WRONLY) as f:
+            f.write(json.dumps(entries).encode())
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(part, archive_path)
+    except BaseException:
+        for leftover in (part, index_path):
+            try:
+                os.unlink(leftover)
+            except OSError:
+                pass
+        raise
+    return entries
+
+
+def clear_tree(root: str, index_path: Path, cross_devices: bool = False):
+    """Remove what build_archive indexed under root, once the archive is recorded.
+
+    The whole tree is compared with the index first: an entry added,
+    removed or changed (inode, size, mtime) since it was packed raises
+    PackError before anything is deleted. Each file is checked again right
+    before its unlink and directories are only removed when empty, so a
+    change racing with the removal also stops it - then some entries are
+    gone already and unpack_tree(..., missing_only=True) restores them.
+    Mount points are skipped by the same rules as build_archive.
+    """
+    from folder_lock_walk import iter_tree
+
+    entries = load_index(index_path)
+    indexed = {entry['path']: entry for entry in entries}
+    seen = set()
+    for path, st in iter_tree(root, topdown=True, cross_devices=cross_devices, on_error=_fail, links=True):
+        rel = os.path.relpath(path, root)
+        entry = indexed.get(rel)
+        if entry is None:
+            raise PackError(f"{rel} appeared while the folder was packed")
+        if not _unchanged(entry, st):
+            raise PackError(f"{rel} changed while the folder was packed")
+        seen.add(rel)
+    missing = indexed.keys() - seen
+    if missing:
+        raise PackError(f"{min(missing)} disappeared while the folder was packed")
+
+    # Deepest first, so every directory is empty by the time it is removed
+    for entry in sorted(entries, key=lambda e: e['path'].count(os.sep), reverse=True):
+        if entry['path'] == os.curdir:
+            continue
+        path = os.path.join(root, entry['path'])
+        try:
+            if entry['type'] == 'dir':
+                os.rmdir(path)
+            elif _unchanged(entry, os.lstat(path)):
+                os.unlink(path)
+            else:
+                raise PackError(f"{entry['path']} changed while the folder was packed")
+        except OSError as e:
+            raise PackError(f"Stopped removing {entry['path']}: {e}")
+
+
+def load_index(index_path: Path) -> List[Dict]:
+    with open(index_path, 'r') as f:
+        return json.load(f)
+
+
+def _restore_metadata(path: str, entry: Dict):
+    if entry['type'] == 'symlink':
+        if os.chown in os.supports_follow_symlinks:
+            try:
+                os.chown(path, entry['uid'], entry['gid'], follow_symlinks=False)
+            except OSError:
+                pass
+        if os.utime in os.supports_follow_symlinks:
+            os.utime(path, ns=(entry['mtime_ns'], entry['mtime_ns']), follow_symlinks=False)
+        return
+    if hasattr(os, 'chown'):
+        try:
+            os.chown(path, entry['uid'], entry['gid'])
+        except OSError:
+            pass
+    os.chmod(path, entry['mode'])
+    os.utime(path, ns=(entry['mtime_ns'], entry['mtime_ns']))
+
+
+def _extract_file(archive, entry: Dict, target: str):
+    # Private until the caller applies the member's own mode
+    with _open_private(Path(target), os.O_WRONLY) as out:
+        digest = _read_member(archive, entry, out.write)
+    if digest != entry['sha256']:
+        raise PackError(f"Checksum mismatch for {entry['path']}")
+
+
+def unpack_tree(root: str, archive_path: Path, index_path: Path, result, missing_only: bool = False):
+    """Stream-extract an archive back into root with original modes and mtimes.
+
+    missing_only restores just the entries that no longer exist, undoing a
+    clear_tree that stopped part way; existing entries are left alone.
+    """
+    entries = load_index(index_path)
+    os.makedirs(root, exist_ok=True)
+    restored = []
+    with open(archive_path, 'rb') as archive:
+        for entry in entries:
+            target = os.path.normpath(os.path.join(root, entry['path']))
+            if missing_only and os.path.lexists(target):
+                continue
+            restored.append(entry)
+            if entry['type'] == 'dir':
+                # Writable until its own metadata is restored below
+                os.makedirs(target, mode=0o700, exist_ok=True)
+                os.chmod(target, 0o700)
+            elif entry['type'] == 'symlink':
+                if os.path.lexists(target):
+                    os.unlink(target)
+                os.symlink(entry['target'], target)
+                _restore_metadata(target, entry)
+            else:
+                _extract_file(archive, entry, target)
+                _restore_metadata(target, entry)
+                result.bytes += entry['size']
+            result.entries += 1
+
+    # Directories last and deepest first, so their mtimes and modes stick
+    for entry in sorted((e for e in restored if e['type'] == 'dir'),
+                        key=lambda e: e['path'].count(os.sep), reverse=True):
+        _restore_metadata(os.path.normpath(os.path.join(root, entry['path'])), entry)
+
+
+def extract_member(archive_path: Path, index_path: Path, member: str, destination: str) -> Dict:
+    """Extract a single file by its relative path without unpacking anything else"""
+    member = os.path.normpath(member)
+    for entry in load_index(index_path):
+        if entry['path'] == member:
+            if entry['type'] != 'file':
+                raise PackError(f"{member} is not a regular file")
+            if os.path.isdir(destination):
+                destination = os.path.join(destination, os.path.basename(member))
+            with open(archive_path, 'rb') as archive:
+                _extract_file(archive, entry, destination)
+            os.chmod(destination, entry['mode'])
+            os.utime(destination, ns=(entry['mtime_ns'], entry['mtime_ns']))
+            return entry
+    raise PackError(f"{member} is not in the archive")
+
+
+def remove_archive(archive_path: Path, index_path: Path):
+    for path in (archive_path, index_path):
+        try:
+            os.unlink(path)
+        except FileNotFoundError:
+            pass
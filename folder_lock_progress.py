@@ -0,0 +1,160 @@
+"""
+Progress events for streamed lock/unlock operations
+
+FolderLockCore.lock_folder_stream and unlock_folder_stream yield these
+while the operation runs, instead of returning only (success, message)
+at the end:
+
+- PhaseChanged: a phase started (walk, hash, encrypt, pack, save, ...,
+  rollback after a cancel),
+- DirectoryEntered: the permission walk lists a directory; at most one
+  per DIRECTORY_INTERVAL, the directories in between are not reported,
+- BatchDone: another batch_size entries were handled, with the totals so
+  far and the rate of this batch,
+- EntryError: an entry could not be processed,
+- Finished: always last, with the (success, message) and OperationResult.
+
+Batches are counted by the permission walks; encryption, packing and
+hashing report their phase and errors only. Every event has to_dict()
+for JSON output.
+"""
+
+import time
+import threading
+from typing import Callable, Dict, Optional
+
+# Entries per BatchDone event
+BATCH_SIZE = 1000
+# Seconds between DirectoryEntered events, a wide tree would otherwise flood the consumer
+DIRECTORY_INTERVAL = 0.1
+# Events a stream holds before the operation waits for its consumer
+QUEUE_SIZE = 1000
+
+
+class ProgressEvent:
+    kind = 'event'
+
+    def to_dict(self) -> Dict:
+        data = {'event': self.kind}
+        data.update(self.__dict__)
+        return data
+
+    def __repr__(self):
+        fields = ', '.join(f"{key}={value!r}" for key, value in self.__dict__.items())
+        return f"{type(self).__name__}({fields})"
+
+
+class PhaseChanged(ProgressEvent):
+    kind = 'phase'
+
+    def __init__(self, phase: str):
+        self.phase = phase
+
+
+class DirectoryEntered(ProgressEvent):
+    kind = 'directory'
+
+    def __init__(self, path: str):
+        self.path = path
+
+
+class BatchDone(ProgressEvent):
+    kind = 'batch'
+
+    def __init__(self, entries: int, total_entries: int, total_bytes: int, elapsed: float, rate: float):
+        self.entries = entries
+        self.total_entries = total_entries
+        self.total_bytes = total_bytes
+        self.elapsed = elapsed
+        # Entries per second over this batch
+        self.rate = rate
+
+
+class EntryError(ProgressEvent):
+    kind = 'error'
+
+    def __init__(self, path: str, error: str):
+        self.path = path
+        self.error = error
+
+
+class Finished(ProgressEvent):
+    kind = 'finished'
+
+    def __init__(self, success: bool, message: str, result=None):
+        self.success = success
+        self.message = message
+        # OperationResult, None if the operation failed before it started
+        self.result = result
+
+    def to_dict(self) -> Dict:
+        return {'event': self.kind, 'success': self.success, 'message': self.message,
+                'result': self.result.to_dict() if self.result is not None else None}
+
+
+class ProgressReporter:
+    """Turns walk callbacks into events for emit, safe to call from walker threads"""
+
+    def __init__(self, emit: Callable[[ProgressEvent], None], batch_size: int = BATCH_SIZE):
+        self.emit = emit
+        self.batch_size = max(1, batch_size)
+        self._mutex = threading.Lock()
+        self.started = time.monotonic()
+        self._batch_started = self.started
+        self._directory_reported = self.started - DIRECTORY_INTERVAL
+        self._pending = 0
+        self.entries = 0
+        self.bytes = 0
+
+    def phase(self, name: str):
+        self.emit(PhaseChanged(name))
+
+    def directory(self, path: str, st=None):
+        """Report the directory being listed, unless one was reported within DIRECTORY_INTERVAL"""
+        now = time.monotonic()
+        with self._mutex:
+            if now - self._directory_reported < DIRECTORY_INTERVAL:
+                return
+            self._directory_reported = now
+        self.emit(DirectoryEntered(str(path)))
+
+    def error(self, path, error):
+        self.emit(EntryError(str(path), str(error)))
+
+    def advance(self, entries: int = 1, nbytes: int = 0):
+        """Count handled entries, emitting a BatchDone every batch_size of them"""
+        with self._mutex:
+            self.entries += entries
+            self.bytes += nbytes
+            self._pending += entries
+            if self._pending < self.batch_size:
+                return
+            event = self._batch()
+        self.emit(event)
+
+    def flush(self):
+        """Report the last, partial batch"""
+        with self._mutex:
+            event = self._batch() if self._pending else None
+        if event is not None:
+            self.emit(event)
+
+    def _batch(self) -> BatchDone:
+        now = time.monotonic()
+        seconds = now - self._batch_started
+        event = BatchDone(self._pending, self.entries, self.bytes, now - self.started,
+                          self._pending / seconds if seconds > 0 else 0.0)
+        self._batch_started = now
+        self._pending = 0
+        return event
+
+
+def describe(event: ProgressEvent) -> Optional[str]:
+    """Short status line for an event, None for those not worth showing"""
+    if isinstance(event, PhaseChanged):
+        return f"{event.phase}..."
+    if isinstance(event, BatchDone):
+        return f"{event.total_entries:,} entries, {event.rate:,.0f}/s"
+    if isinstance(event, EntryError):
+        return f"failed: {event.path}"
+    return None
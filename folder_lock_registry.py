@@ -0,0 +1,259 @@
+"""
+Compact in-memory form of the lock registry
+
+A registry entry used to be a plain dict repeating its string keys, the
+path it is stored under (original_path) and the platform name. With a
+million locks that is most of the process's memory. LockRecord keeps the
+common fields in __slots__:
+
+- the path is the registry key itself, not a copy,
+- system and mode are interned, so every record shares one string,
+- the SHA-256 password hash is held as 32 raw bytes instead of 64 hex chars,
+- rarely used fields (encryption, pack, integrity, relock_after, ...) live
+  in an optional dict that most records never allocate.
+
+LockRecord is a MutableMapping, so record['password_hash'],
+record.get('mode') and record['integrity'] = ... behave exactly like the
+old dicts, and locks.json keeps its format.
+
+LockTable numbers every change: each stored record carries the table
+revision it was stored at, and removed paths leave a tombstone with the
+revision of their removal, so an incremental export only has to look at
+what changed since a given revision. A record is never modified once
+another critical section could see it - changes store a new record - so a
+shallow copy of the table taken under the registry lock is a consistent
+snapshot.
+"""
+
+import os
+import sys
+from collections.abc import MutableMapping
+from typing import Dict, Iterator, Optional
+
+# Tombstones kept for incremental exports, the oldest are dropped beyond this
+MAX_TOMBSTONES = 100000
+
+
+def _pack_hash(value):
+    """Hex digests are stored as bytes, anything else unchanged"""
+    if isinstance(value, str) and len(value) == 64:
+        try:
+            return bytes.fromhex(value)
+        except ValueError:
+            pass
+    return value
+
+
+class LockRecord(MutableMapping):
+    __slots__ = ('path', '_hash', 'system', 'mode', 'revision', 'extra')
+
+    def __init__(self, path: str, fields: Optional[Dict] = None):
+        self.path = path
+        self._hash = None
+        self.system = None
+        self.mode = None
+        self.revision = None
+        self.extra = None
+        if fields:
+            for key, value in fields.items():
+                self[key] = value
+
+    @classmethod
+    def from_fields(cls, path: str, fields: Dict) -> 'LockRecord':
+        """Build a record from a freshly parsed dict, which it takes over"""
+        record = cls.__new__(cls)
+        record.path = path
+        password_hash = fields.pop('password_hash', None)
+        record._hash = _pack_hash(password_hash) if password_hash is not None else None
+        system = fields.pop('system', None)
+        record.system = sys.intern(system) if isinstance(system, str) else system
+        mode = fields.pop('mode', None)
+        record.mode = sys.intern(mode) if isinstance(mode, str) else mode
+        record.revision = fields.pop('revision', None)
+        fields.pop('original_path', None)
+        fields.pop('name', None)
+        record.extra = fields or None
+        return record
+
+    def __getitem__(self, key):
+        if key == 'password_hash':
+            if self._hash is None:
+                raise KeyError(key)
+            return self._hash.hex() if isinstance(self._hash, bytes) else self._hash
+        if key == 'original_path':
+            return self.path
+        if key == 'name':
+            return os.path.basename(self.path)
+        if key == 'system':
+            if self.system is None:
+                raise KeyError(key)
+            return self.system
+        if key == 'mode':
+            if self.mode is None:
+                raise KeyError(key)
+            return self.mode
+        if key == 'revision':
+            if self.revision is None:
+                raise KeyError(key)
+            return self.revision
+        if self.extra is None:
+            raise KeyError(key)
+        return self.extra[key]
+
+    def __setitem__(self, key, value):
+        if key == 'password_hash':
+            self._hash = _pack_hash(value)
+        elif key in ('original_path', 'name'):
+            # Both follow from the registry key
+            pass
+        elif key == 'system':
+            self.system = sys.intern(value) if isinstance(value, str) else value
+        elif key == 'mode':
+            self.mode = sys.intern(value) if isinstance(value, str) else value
+        elif key == 'revision':
+            self.revision = value
+        else:
+            if self.extra is None:
+                self.extra = {}
+            self.extra[key] = value
+
+    def __delitem__(self, key):
+        if key == 'password_hash' and self._hash is not None:
+            self._hash = None
+        elif key == 'system' and self.system is not None:
+            self.system = None
+        elif key == 'mode' and self.mode is not None:
+            self.mode = None
+        elif key == 'revision' and self.revision is not None:
+            self.revision = None
+        elif self.extra is not None and key in self.extra:
+            del self.extra[key]
+            if not self.extra:
+                self.extra = None
+        else:
+            raise KeyError(key)
+
+    def __iter__(self) -> Iterator[str]:
+        if self._hash is not None:
+            yield 'password_hash'
+        yield 'original_path'
+        if self.system is not None:
+            yield 'system'
+        yield 'name'
+        if self.mode is not None:
+            yield 'mode'
+        if self.revision is not None:
+            yield 'revision'
+        if self.extra is not None:
+            yield from self.extra
+
+    def __len__(self) -> int:
+        return (2 + (self._hash is not None) + (self.system is not None) + (self.mode is not None)
+                + (self.revision is not None) + (len(self.extra) if self.extra is not None else 0))
+
+    def __repr__(self) -> str:
+        return f"LockRecord({self.path!r}, {dict(self)!r})"
+
+    def to_dict(self) -> Dict:
+        record = {}
+        if self._hash is not None:
+            record['password_hash'] = self._hash.hex() if isinstance(self._hash, bytes) else self._hash
+        record['original_path'] = self.path
+        if self.system is not None:
+            record['system'] = self.system
+        record['name'] = os.path.basename(self.path)
+        if self.mode is not None:
+            record['mode'] = self.mode
+        if self.revision is not None:
+            record['revision'] = self.revision
+        if self.extra is not None:
+            record.update(self.extra)
+        return record
+
+    copy = to_dict
+
+
+class LockTable(dict):
+    """Registry locks by path, storing every value as a LockRecord
+
+    Records passed to the constructor are taken as loaded, keeping their
+    revisions; every later store or pop advances self.revision.
+    """
+
+    def __init__(self, records: Optional[Dict] = None, revision: int = 0,
+                 tombstones: Optional[Dict[str, int]] = None, tombstone_floor: int = 0):
+        super().__init__()
+        self.revision = revision
+        # Removed path -> revision of its removal, oldest first
+        self.tombstones = tombstones if tombstones is not None else {}
+        # Removals up to this revision are no longer tracked
+        self.tombstone_floor = tombstone_floor
+        if records:
+            store = super().__setitem__
+            for path, record in records.items():
+                if type(record) is not LockRecord:
+                    record = LockRecord(path, record)
+                # Inlined, this runs once per lock on every load
+                record.path = path
+                store(path, record)
+
+    def __setitem__(self, path: str, record):
+        if not isinstance(record, LockRecord) or record.revision is not None:
+            # A record stored before may still be read from a snapshot
+            record = LockRecord(path, record)
+        # Share the key string instead of keeping an equal copy
+        record.path = path
+        self.revision += 1
+        record.revision = self.revision
+        if self.tombstones:
+            self.tombstones.pop(path, None)
+        super().__setitem__(path, record)
+
+    def __delitem__(self, path: str):
+        super().__delitem__(path)
+        self._bury(path)
+
+    def pop(self, path: str, *default):
+        if path not in self:
+            return super().pop(path, *default)
+        record = super().pop(path)
+        self._bury(path)
+        return record
+
+    def _bury(self, path: str):
+        self.revision += 1
+        self.tombstones[path] = self.revision
+        if len(self.tombstones) > MAX_TOMBSTONES:
+            oldest = next(iter(self.tombstones))
+            self.tombstone_floor = self.tombstones.pop(oldest)
+
+    def setdefault(self, path: str, default=None):
+        if path not in self:
+            self[path] = default if default is not None else {}
+        return self[path]
+
+    def update(self, records=(), **kwargs):
+        items = records.items() if hasattr(records, 'items') else records
+        for path, record in items:
+            self[path] = record
+        for path, record in kwargs.items():
+            self[path] = record
+
+    def tracks_since(self, revision: int) -> bool:
+        """True if every removal after revision still has its tombstone"""
+        return revision >= self.tombstone_floor
+
+
+def decode(fields: Dict):
+    """json.load object_hook= turning lock entries into LockRecords while parsing,
+    so the full dicts never exist all at once"""
+    if 'password_hash' in fields and 'original_path' in fields:
+        return LockRecord.from_fields(fields['original_path'], fields)
+    return fields
+
+
+def encode(value):
+    """json.dump default= hook for LockRecord values"""
+    if isinstance(value, LockRecord):
+        return value.to_dict()
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
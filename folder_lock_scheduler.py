@@ -0,0 +1,110 @@
+"""
+Auto-relock scheduler
+
+One thread sleeps until the earliest pending deadline in a heap, however
+many folders are waiting, and relocks everything that is due in a single
+registry write. Deadlines live in the registry (see
+FolderLockCore.unlock_folder), so a scheduler started later - in the GUI
+or the daemon - first applies everything that expired while nothing was
+running. After every batch the heap is rebuilt from the registry, so a
+relock that failed or found its folder busy stays pending and is tried
+again RETRY_DELAY seconds later.
+"""
+
+import time
+import heapq
+import threading
+from typing import Callable, Dict, Optional
+
+# Seconds before a relock that failed or found its folder busy is tried again
+RETRY_DELAY = 30.0
+
+
+class RelockScheduler:
+    def __init__(self, core, on_relock: Optional[Callable] = None):
+        self.core = core
+        # Called with the list of (path, success, message) after each batch
+        self.on_relock = on_relock
+        self._heap = []
+        # Current deadline per path, heap entries that don't match are stale
+        self._deadlines: Dict[str, float] = {}
+        self._cond = threading.Condition()
+        self._stopped = False
+        self._thread = None
+        core.add_relock_listener(self.schedule)
+
+    def schedule(self, path_str: str, deadline: Optional[float]):
+        """Add, move or (deadline None) cancel the relock of a folder"""
+        with self._cond:
+            if deadline is None:
+                self._deadlines.pop(path_str, None)
+            else:
+                self._deadlines[path_str] = deadline
+                heapq.heappush(self._heap, (deadline, path_str))
+            self._cond.notify()
+
+    def sync(self, retry_after: float = 0.0):
+        """Reload pending deadlines from the registry.
+
+        Deadlines that already passed are moved to retry_after seconds from
+        now, for folders the last batch could not relock.
+        """
+        pending = self.core.get_pending_relocks()
+        if retry_after:
+            retry_at = time.time() + retry_after
+            pending = {path_str: max(deadline, retry_at) for path_str, deadline in pending.items()}
+        with self._cond:
+            self._deadlines = dict(pending)
+            self._heap = [(deadline, path_str) for path_str, deadline in pending.items()]
+            heapq.heapify(self._heap)
+            self._cond.notify()
+
+    def start(self):
+        """Apply deadlines that expired while nothing was running, then run in the background"""
+        self._run_batch(self.core.apply_expired_relocks())
+        self.sync(RETRY_DELAY)
+        self._thread = threading.Thread(target=self._run, name='relock-scheduler', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        with self._cond:
+            self._stopped = True
+            self._cond.notify()
+
+    def _next_due(self) -> bool:
+        """Wait until the earliest live deadline passes, False once stopped"""
+        with self._cond:
+            while not self._stopped:
+                # Drop cancelled and rescheduled entries
+                while self._heap and self._deadlines.get(self._heap[0][1]) != self._heap[0][0]:
+                    heapq.heappop(self._heap)
+                if not self._heap:
+                    self._cond.wait()
+                    continue
+                delay = self._heap[0][0] - time.time()
+                if delay <= 0:
+                    # Everything due now is handled by one apply_expired_relocks call,
+                    # sync() afterwards brings back what it couldn't relock
+                    while self._heap and self._heap[0][0] <= time.time():
+                        due, path_str = heapq.heappop(self._heap)
+                        if self._deadlines.get(path_str) == due:
+                            del self._deadlines[path_str]
+                    return True
+                self._cond.wait(delay)
+            return False
+
+    def _run(self):
+        while self._next_due():
+            try:
+                self._run_batch(self.core.apply_expired_relocks())
+            except Exception:
+                # Keep the scheduler alive, the deadlines stay in the registry
+                pass
+            try:
+                self.sync(RETRY_DELAY)
+            except Exception:
+                pass
+
+    def _run_batch(self, outcomes):
+        if outcomes and self.on_relock is not None:
+            self.on_relock(outcomes)
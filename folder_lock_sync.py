@@ -0,0 +1,411 @@
+"""
+Registry synchronization between hosts through a shared directory
+
+Hosts that share storage keep their own registry (locks.json) and
+exchange lock and unlock events through a directory they all mount:
+
+    log/<host>/<first seq>.jsonl       events of one host, append-only
+    checkpoints/<clock>-<host>.json    merged state of every path
+
+Only the host itself appends to log/<host>/, so no two hosts ever write
+the same file. Everything is created readable by the owner only (0600,
+directories 0700), as the events carry password hashes. Each event is one JSON line:
+
+    {"seq": 42, "host": "a", "clock": 97, "time": ..., "op": "lock", "path": "/data/x", "record": {...}}
+
+seq numbers a host's events without gaps. clock is a Lamport clock: it
+is one more than the highest clock the host has written or read, so an
+event always orders after every event its host knew about. For each path
+the event with the highest (clock, host) wins. The winner doesn't depend
+on the order events are read in, so hosts converge whatever they read
+first.
+
+Other hosts tail each log from a cursor (segment, byte offset and last
+seq) kept in sync.json in their config directory; a half-written last
+line is left for the next pass. Logs are split into segments of
+SEGMENT_EVENTS events. Every CHECKPOINT_EVERY events a host writes a
+checkpoint holding the winning event of every path and the seq it covers
+for each host, then deletes its own segments the checkpoint covers. A
+host that finds the next event it needs gone (or joins late) loads the
+newest checkpoint and continues from there.
+"""
+
+import os
+import json
+import time
+import socket
+import threading
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+try:
+    import fcntl
+except ImportError:  # Windows: one process per config directory is assumed
+    fcntl = None
+
+FORMAT = 1
+STATE_NAME = 'sync.json'
+# Events per log segment
+SEGMENT_EVENTS = 10000
+# Own events between checkpoints
+CHECKPOINT_EVERY = 1000
+# Checkpoints each host keeps of its own
+KEEP_CHECKPOINTS = 3
+OPERATIONS = ('lock', 'unlock')
+
+
+class SyncError(Exception):
+    """Raised for an unusable shared directory or a log that can't be caught up with"""
+
+
+def default_host() -> str:
+    return socket.gethostname().split('.')[0] or 'host'
+
+
+def _write_json(path: Path, data: Dict):
+    tmp = path.with_name(f".{path.name}.{os.getpid()}.tmp")
+    with os.fdopen(os.open(tmp, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600), 'w') as f:
+        json.dump(data, f, separators=(',', ':'))
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, path)
+
+
+class ChangeLog:
+    """One host's view of the shared changelog.
+
+    The state in sync.json (own seq and clock, read cursors, the winning
+    version of every path) is shared with the other processes on this
+    host and only changed under an exclusive lock on sync.lock.
+    """
+
+    def __init__(self, config_dir: Path):
+        self.state_file = Path(config_dir) / STATE_NAME
+        self.lock_file = Path(config_dir) / 'sync.lock'
+        self._mutex = threading.RLock()
+        self._state = None
+        self._state_signature = None
+        state = self._load()
+        self.host = state['host']
+        self.shared_dir = Path(state['shared_dir'])
+
+    @classmethod
+    def create(cls, config_dir: Path, shared_dir: str, host: Optional[str] = None) -> 'ChangeLog':
+        """Start syncing config_dir through shared_dir as host"""
+        host = host or default_host()
+        if not host.replace('-', '').replace('_', '').isalnum():
+            raise SyncError(f"Host name may only contain letters, digits, '-' and '_': {host}")
+        shared = Path(shared_dir).resolve()
+        try:
+            shared.mkdir(mode=0o700, parents=True, exist_ok=True)
+            for directory in (shared / 'log', shared / 'log' / host, shared / 'checkpoints'):
+                directory.mkdir(mode=0o700, exist_ok=True)
+        except OSError as e:
+            raise SyncError(f"Shared directory is not usable: {e}")
+        # A host that synced before (and lost its config) continues its own numbering
+        seq, clock = cls._log_end(shared / 'log' / host)
+        state = {'format': FORMAT, 'shared_dir': str(shared), 'host': host, 'seq': seq, 'clock': clock,
+                 'segment': None, 'cursors': {}, 'versions': {}, 'since_checkpoint': 0}
+        _write_json(Path(config_dir) / STATE_NAME, state)
+        return cls(config_dir)
+
+    @staticmethod
+    def _log_end(log_dir: Path) -> Tuple[int, int]:
+        """(seq, clock) of the last complete event in a host's log"""
+        segments = sorted(log_dir.glob('*.jsonl'), key=lambda p: int(p.stem))
+        for segment in reversed(segments):
+            with open(segment, 'rb') as f:
+                lines = f.read().split(b'\n')[:-1]
+            if lines:
+                event = json.loads(lines[-1])
+                return event['seq'], event['clock']
+        return 0, 0
+
+    @staticmethod
+    def _signature(st: os.stat_result) -> Tuple[int, int, int]:
+        # Every save replaces the file, the inode tells saves within one mtime tick apart
+        return st.st_ino, st.st_mtime_ns, st.st_size
+
+    def _load(self) -> Dict:
+        try:
+            signature = self._signature(self.state_file.stat())
+        except OSError:
+            raise SyncError("Sync is not enabled")
+        if self._state is None or signature != self._state_signature:
+            with open(self.state_file, 'r') as f:
+                self._state = json.load(f)
+            self._state_signature = signature
+        return self._state
+
+    def _save(self, state: Dict):
+        _write_json(self.state_file, state)
+        self._state = state
+        self._state_signature = self._signature(self.state_file.stat())
+
+    @contextmanager
+    def _locked(self):
+        """Exclusive access to the state across threads and processes.
+
+        The state is changed in place and saved by the caller; if the
+        caller fails before that, the cached copy is dropped.
+        """
+        with self._mutex, open(self.lock_file, 'a') as handle:
+            if fcntl is not None:
+                fcntl.flock(handle, fcntl.LOCK_EX)
+            try:
+                yield self._load()
+            except BaseException:
+                self._state = None
+                raise
+            finally:
+                if fcntl is not None:
+                    fcntl.flock(handle, fcntl.LOCK_UN)
+
+    def _log_dir(self, host: str) -> Path:
+        return self.shared_dir / 'log' / host
+
+    def version(self, path_str: str) -> Optional[Tuple[int, str, str]]:
+        """(clock, host, op) of the event that last decided path_str, None if none did"""
+        entry = self._load()['versions'].get(path_str)
+        return tuple(entry) if entry else None
+
+    def publish(self, changes: Iterable[Tuple[str, str, Optional[Dict]]]) -> int:
+        """Append (op, path, record) events to this host's log, returns the number written.
+
+        Callers pass record (without revision) for 'lock' and None for 'unlock'.
+        """
+        with self._locked() as state:
+            self._recover_own_log(state)
+            versions = state['versions']
+            # Segment -> lines, a batch may straddle two segments
+            batches: Dict[int, List[str]] = {}
+            written = 0
+            now = time.time()
+            for op, path_str, record in changes:
+                if op not in OPERATIONS:
+                    raise ValueError(f"Unknown sync operation: {op}")
+                state['seq'] += 1
+                state['clock'] += 1
+                if state['segment'] is None or state['seq'] - state['segment'] >= SEGMENT_EVENTS:
+                    state['segment'] = state['seq']
+                batches.setdefault(state['segment'], []).append(json.dumps(
+                    {'seq': state['seq'], 'host': self.host, 'clock': state['clock'], 'time': now,
+                     'op': op, 'path': path_str, 'record': record}, separators=(',', ':')))
+                versions[path_str] = [state['clock'], self.host, op]
+                written += 1
+            if not written:
+                return 0
+            log_dir = self._log_dir(self.host)
+            for segment, lines in batches.items():
+                state['log_size'] = self._append(log_dir, segment, lines)
+            state['since_checkpoint'] += written
+            self._save(state)
+            return written
+
+    @staticmethod
+    def _append(log_dir: Path, segment: int, lines: List[str]) -> int:
+        """Append whole lines to a segment, returns its new size"""
+        fd = os.open(log_dir / f"{segment:012d}.jsonl", os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o600)
+        with os.fdopen(fd, 'a') as f:
+            f.write('\n'.join(lines) + '\n')
+            f.flush()
+            os.fsync(f.fileno())
+            return f.tell()
+
+    def _recover_own_log(self, state: Dict):
+        """Make seq match the log if a publish died between appending and saving the state"""
+        if state['segment'] is None:
+            return
+        segment_file = self._log_dir(self.host) / f"{state['segment']:012d}.jsonl"
+        try:
+            size = segment_file.stat().st_size
+        except OSError:
+            size = 0
+        if size == state.get('log_size', size):
+            return
+        with open(segment_file, 'rb+') as f:
+            data = f.read()
+            # Drop a line cut off half way, readers would take it for a gap
+            f.truncate(data.rfind(b'\n') + 1)
+        seq, clock = self._log_end(self._log_dir(self.host))
+        state['seq'] = max(state['seq'], seq)
+        state['clock'] = max(state['clock'], clock)
+        state['log_size'] = segment_file.stat().st_size
+
+    def checkpoint_due(self) -> bool:
+        return self._load()['since_checkpoint'] >= CHECKPOINT_EVERY
+
+    def pull(self, apply: Callable[[Dict[str, Dict]], None]) -> Dict:
+        """Read what other hosts appended since the last pull.
+
+        apply(events) gets the winning new event per path ({path: event})
+        and must have stored them before it returns; the cursors only move
+        on afterwards, so a crash in between means reading them again.
+        Returns a summary: events read, changes applied, hosts read and
+        whether a checkpoint had to be loaded.
+        """
+        with self._locked() as state:
+            hosts = self._hosts()
+            before = json.dumps(state['cursors'], sort_keys=True)
+            events, gaps = self._read_logs(state, hosts)
+            from_checkpoint = None
+            if gaps:
+                from_checkpoint = self._newest_checkpoint()
+                if from_checkpoint is None or any(from_checkpoint['cursors'].get(host, 0) <= state['cursors'][host]['seq']
+                                                  for host in gaps):
+                    raise SyncError(f"Events of {', '.join(sorted(gaps))} are gone and no checkpoint covers them")
+                # Winners don't depend on order, what was read before the gap stays valid
+                events.extend(self._checkpoint_events(from_checkpoint))
+                for host, seq in from_checkpoint['cursors'].items():
+                    if host != self.host and seq > state['cursors'].get(host, {}).get('seq', 0):
+                        state['cursors'][host] = {'seq': seq, 'segment': None, 'offset': 0}
+                more, gaps = self._read_logs(state, hosts)
+                if gaps:
+                    raise SyncError(f"Events of {', '.join(sorted(gaps))} are missing after the newest checkpoint")
+                events.extend(more)
+
+            versions = state['versions']
+            winners = {}
+            for event in events:
+                state['clock'] = max(state['clock'], event['clock'])
+                version = (event['clock'], event['host'])
+                current = versions.get(event['path'])
+                if current is None or version > (current[0], current[1]):
+                    versions[event['path']] = [event['clock'], event['host'], event['op']]
+                    winners[event['path']] = event
+            if winners:
+                apply(winners)
+            if events or json.dumps(state['cursors'], sort_keys=True) != before:
+                self._save(state)
+            return {'read': len(events), 'applied': len(winners), 'hosts': sorted(hosts),
+                    'checkpoint': from_checkpoint['name'] if from_checkpoint else None}
+
+    def _hosts(self) -> List[str]:
+        try:
+            return [entry.name for entry in os.scandir(self.shared_dir / 'log')
+                    if entry.is_dir() and entry.name != self.host]
+        except OSError as e:
+            raise SyncError(f"Shared directory is not readable: {e}")
+
+    def _read_logs(self, state: Dict, hosts: List[str]) -> Tuple[List[Dict], set]:
+        """New events of every host after its cursor, and the hosts whose next event is gone"""
+        events = []
+        gaps = set()
+        for host in hosts:
+            cursor = state['cursors'].setdefault(host, {'seq': 0, 'segment': None, 'offset': 0})
+            if not self._read_host(host, cursor, events):
+                gaps.add(host)
+        return events, gaps
+
+    def _read_host(self, host: str, cursor: Dict, events: List[Dict]) -> bool:
+        """Append host's events after cursor to events, advancing it; False on a gap"""
+        log_dir = self._log_dir(host)
+        try:
+            segments = sorted(int(name[:-6]) for name in os.listdir(log_dir)
+                              if name.endswith('.jsonl') and name[:-6].isdigit())
+        except OSError:
+            return True
+        if not segments:
+            return True
+        wanted = cursor['seq'] + 1
+        if cursor['segment'] not in segments:
+            # First read, or the segment was compacted away: find the one holding the next event
+            candidates = [first for first in segments if first <= wanted]
+            if not candidates:
+                return False
+            cursor['segment'], cursor['offset'] = candidates[-1], 0
+        while True:
+            with open(log_dir / f"{cursor['segment']:012d}.jsonl", 'rb') as f:
+                f.seek(cursor['offset'])
+                data = f.read()
+            end = data.rfind(b'\n') + 1
+            for line in data[:end].splitlines():
+                try:
+                    event = json.loads(line)
+                except ValueError:
+                    return False
+                if event['seq'] < wanted:
+                    continue
+                if event['seq'] != wanted or event.get('op') not in OPERATIONS:
+                    return False
+                events.append(event)
+                cursor['seq'] = wanted
+                wanted += 1
+            cursor['offset'] += end
+            later = [first for first in segments if first > cursor['segment']]
+            if end < len(data) or not later:
+                return True
+            if later[0] > wanted:
+                return False
+            cursor['segment'], cursor['offset'] = later[0], 0
+
+    def _newest_checkpoint(self) -> Optional[Dict]:
+        directory = self.shared_dir / 'checkpoints'
+        names = sorted((name for name in os.listdir(directory) if name.endswith('.json')), reverse=True)
+        for name in names:
+            try:
+                with open(directory / name, 'r') as f:
+                    checkpoint = json.load(f)
+            except (OSError, ValueError):
+                continue
+            checkpoint['name'] = name
+            return checkpoint
+        return None
+
+    @staticmethod
+    def _checkpoint_events(checkpoint: Dict) -> List[Dict]:
+        return [dict(entry, path=path_str) for path_str, entry in checkpoint['paths'].items()]
+
+    def checkpoint(self, records: Callable[[str], Optional[Dict]]) -> Dict:
+        """Write the merged state as a checkpoint and drop the own segments it covers.
+
+        records(path) returns the registry record of a locked path. Pull
+        first, so the checkpoint includes what the other hosts wrote.
+        """
+        with self._locked() as state:
+            paths = {}
+            for path_str, (clock, host, op) in state['versions'].items():
+                record = records(path_str) if op == 'lock' else None
+                if op == 'lock' and record is None:
+                    # Changed locally since, the event that did so is in a log
+                    continue
+                paths[path_str] = {'host': host, 'clock': clock, 'op': op, 'record': record}
+            cursors = {host: cursor['seq'] for host, cursor in state['cursors'].items()}
+            cursors[self.host] = state['seq']
+            name = f"{state['clock']:012d}-{self.host}.json"
+            directory = self.shared_dir / 'checkpoints'
+            _write_json(directory / name, {'format': FORMAT, 'host': self.host, 'clock': state['clock'],
+                                           'created': time.time(), 'cursors': cursors, 'paths': paths})
+            state['since_checkpoint'] = 0
+            self._save(state)
+
+            own = sorted(n for n in os.listdir(directory) if n.endswith(f"-{self.host}.json"))
+            for old in own[:-KEEP_CHECKPOINTS]:
+                try:
+                    os.unlink(directory / old)
+                except OSError:
+                    pass
+            # Segments whose events all precede the current one are covered
+            log_dir = self._log_dir(self.host)
+            removed = 0
+            for segment in sorted(int(p.stem) for p in log_dir.glob('*.jsonl')):
+                if segment < state['segment']:
+                    try:
+                        os.unlink(log_dir / f"{segment:012d}.jsonl")
+                        removed += 1
+                    except OSError:
+                        pass
+            return {'checkpoint': name, 'paths': len(paths), 'segments_removed': removed}
+
+    def status(self) -> Dict:
+        state = self._load()
+        return {
+            'host': self.host,
+            'shared_dir': str(self.shared_dir),
+            'seq': state['seq'],
+            'clock': state['clock'],
+            'since_checkpoint': state['since_checkpoint'],
+            'hosts': {host: cursor['seq'] for host, cursor in state['cursors'].items()},
+            'paths': len(state['versions']),
+        }
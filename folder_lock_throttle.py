@@ -0,0 +1,201 @@
+"""
+I/O throttling for permission walks
+
+Large locks issue one metadata write per inode. On shared storage that
+burst hurts every other tenant, so a walk can be slowed down with:
+
+- a token bucket capping chmod calls per second (max_ops),
+- adaptive backoff that sleeps when syscall latency climbs above the
+  baseline seen at the start of the walk (adaptive),
+- lowered CPU and I/O priority for the walking thread (low_priority).
+
+Settings travel as plain dicts ({'max_ops': 500, 'adaptive': True,
+'low_priority': True}) so they can be stored per lock in the registry and
+passed through the daemon.
+"""
+
+import os
+import sys
+import time
+import threading
+from contextlib import contextmanager
+from typing import Dict, Optional
+
+THROTTLE_KEYS = ('max_ops', 'adaptive', 'low_priority')
+
+# Linux ioprio_set syscall numbers and constants
+_IOPRIO_SYSCALL = {'x86_64': 251, 'aarch64': 30, 'i686': 289, 'armv7l': 314}
+_IOPRIO_WHO_PROCESS = 1
+_IOPRIO_CLASS_SHIFT = 13
+_IOPRIO_CLASS_IDLE = 3
+_IOPRIO_CLASS_BE = 2
+
+
+class TokenBucket:
+    """Allows rate operations per second on average, bursting up to burst"""
+
+    def __init__(self, rate: float, burst: Optional[float] = None):
+        self.rate = float(rate)
+        self.capacity = burst if burst is not None else max(1.0, self.rate / 10)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self._mutex = threading.Lock()
+
+    def acquire(self, count: float = 1):
+        """Take count tokens, sleeping until they are available"""
+        with self._mutex:
+            now = time.monotonic()
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            self.tokens -= count
+            # Debt is paid by sleeping outside the lock
+            wait = -self.tokens / self.rate if self.tokens < 0 else 0
+        if wait > 0:
+            time.sleep(wait)
+
+
+class AdaptiveBackoff:
+    """Sleeps in proportion to how far syscall latency rose above its baseline.
+
+    The baseline is the lowest smoothed latency seen so far, so it settles
+    on what an idle filesystem delivers. Once the smoothed latency exceeds
+    threshold times the baseline, each operation is followed by a pause of
+    the excess latency (capped at max_sleep), giving other clients of the
+    storage room to catch up.
+    """
+
+    def __init__(self, threshold: float = 2.0, smoothing: float = 0.05, max_sleep: float = 0.05):
+        self.threshold = threshold
+        self.smoothing = smoothing
+        self.max_sleep = max_sleep
+        self.average = None
+        self.baseline = None
+        self.slept = 0.0
+
+    def observe(self, latency: float):
+        if self.average is None:
+            self.average = self.baseline = latency
+            return
+        self.average += self.smoothing * (latency - self.average)
+        self.baseline = min(self.baseline, self.average)
+        if self.average > self.threshold * self.baseline:
+            pause = min(self.max_sleep, self.average - self.baseline)
+            self.slept += pause
+            time.sleep(pause)
+
+
+class Throttle:
+    """Per-walk combination of the enabled throttling mechanisms"""
+
+    def __init__(self, max_ops: Optional[float] = None, adaptive: bool = False,
+                 low_priority: bool = False):
+        self.bucket = TokenBucket(max_ops) if max_ops else None
+        self.backoff = AdaptiveBackoff() if adaptive else None
+        self.low_priority = low_priority
+
+    @classmethod
+    def from_settings(cls, settings: Optional[Dict]) -> Optional['Throttle']:
+        """Build a Throttle from a settings dict, None if nothing is enabled"""
+        if not settings or not any(settings.get(key) for key in THROTTLE_KEYS):
+            return None
+        return cls(settings.get('max_ops'), bool(settings.get('adaptive')),
+                   bool(settings.get('low_priority')))
+
+    def clone(self) -> 'Throttle':
+        """Same settings with separate state, e.g. one per device"""
+        return Throttle(self.bucket.rate if self.bucket is not None else None,
+                        self.backoff is not None, self.low_priority)
+
+    def before(self):
+        if self.bucket is not None:
+            self.bucket.acquire()
+
+    def after(self, latency: float):
+        if self.backoff is not None:
+            self.backoff.observe(latency)
+
+    @property
+    def timed(self) -> bool:
+        """Whether after() needs syscall latencies"""
+        return self.backoff is not None
+
+    @contextmanager
+    def priority(self):
+        """Run the body with lowered priority if low_priority is set"""
+        if self.low_priority:
+            with lowered_priority():
+                yield
+        else:
+            yield
+
+
+def _set_ioprio(tid: int, value: int) -> Optional[int]:
+    """Set a Linux thread's I/O priority, returning the previous value"""
+    import ctypes
+    import platform
+
+    number = _IOPRIO_SYSCALL.get(platform.machine())
+    if number is None:
+        return None
+    libc = ctypes.CDLL(None, use_errno=True)
+    previous = libc.syscall(number + 1, _IOPRIO_WHO_PROCESS, tid)  # ioprio_get
+    if libc.syscall(number, _IOPRIO_WHO_PROCESS, tid, value) != 0:
+        return None
+    return previous if previous >= 0 else None
+
+
+def _lower(tid: int, nice: int):
+    """Lower a thread's CPU and I/O priority, returning the previous values"""
+    previous_nice = None
+    previous_ioprio = None
+    try:
+        previous_nice = os.getpriority(os.PRIO_PROCESS, tid)
+        os.setpriority(os.PRIO_PROCESS, tid, min(19, previous_nice + nice))
+    except OSError:
+        previous_nice = None
+    if sys.platform.startswith('linux'):
+        try:
+            previous_ioprio = _set_ioprio(tid, _IOPRIO_CLASS_IDLE << _IOPRIO_CLASS_SHIFT)
+        except (OSError, AttributeError):
+            previous_ioprio = None
+    return previous_nice, previous_ioprio
+
+
+def _current_tid() -> int:
+    return threading.get_native_id() if sys.platform.startswith('linux') else 0
+
+
+@contextmanager
+def lowered_priority(nice: int = 10):
+    """Lower CPU and (on Linux) I/O priority of the calling thread only.
+
+    Linux schedules threads individually, so setpriority/ioprio_set on the
+    native thread id leave the rest of a daemon or GUI process alone. The
+    previous values are restored afterwards where the OS allows it.
+    """
+    if not hasattr(os, 'setpriority'):
+        yield
+        return
+
+    tid = _current_tid()
+    previous_nice, previous_ioprio = _lower(tid, nice)
+    try:
+        yield
+    finally:
+        # Raising priority back needs CAP_SYS_NICE for unprivileged users
+        if previous_nice is not None:
+            try:
+                os.setpriority(os.PRIO_PROCESS, tid, previous_nice)
+            except OSError:
+                pass
+        if previous_ioprio is not None:
+            try:
+                _set_ioprio(tid, previous_ioprio or (_IOPRIO_CLASS_BE << _IOPRIO_CLASS_SHIFT | 4))
+            except (OSError, AttributeError):
+                pass
+
+
+def lower_thread_priority(nice: int = 10):
+    """Lower the calling thread's priority for good, for pool thread initializers"""
+    if hasattr(os, 'setpriority'):
+        _lower(_current_tid(), nice)
@@ -0,0 +1,114 @@
+"""
+Line-delimited export format of the lock registry
+
+One JSON object per line, written and read one record at a time so neither
+side ever holds a serialized copy of the whole registry:
+
+    {"type": "header", "format": 1, "revision": 812, "since": null, ...}
+    {"type": "lock", "path": "/data/a", "revision": 17, "record": {...}}
+    {"type": "delete", "path": "/data/b", "revision": 640}
+    {"type": "end", "locks": 1, "deleted": 1}
+
+The header carries the registry revision the snapshot was taken at and,
+for incremental exports, the revision it starts after ("since"). Full
+exports also carry the master key. Delete lines only appear in
+incremental exports. The trailer lets a reader tell a complete file from
+a truncated one before it changes anything.
+"""
+
+import os
+import json
+import time
+from typing import Dict, Iterable, Iterator, Optional, Tuple
+
+FORMAT = 1
+# Policies for an imported lock whose path is already locked differently
+CONFLICT_POLICIES = ('skip', 'overwrite', 'error')
+
+
+class TransferError(Exception):
+    """Raised for files that are not complete registry exports"""
+
+
+def header(revision: int, since: Optional[int], system: str, master: Optional[Dict] = None) -> Dict:
+    entry = {'type': 'header', 'format': FORMAT, 'revision': revision, 'since': since,
+             'created': time.time(), 'system': system}
+    if master:
+        entry['master'] = master
+    return entry
+
+
+def open_output(destination: str):
+    """Open an export file readable by its owner only"""
+    fd = os.open(destination, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+    return os.fdopen(fd, 'w', buffering=1024 * 1024)
+
+
+def write_export(out, head: Dict, records: Iterable, deleted: Iterable[Tuple[str, int]]) -> Tuple[int, int]:
+    """Write a header, lock and delete lines and the trailer, returns (locks, deleted)"""
+    dumps = json.JSONEncoder(separators=(',', ':')).encode
+    out.write(dumps(head) + '\n')
+    locks = 0
+    for record in records:
+        fields = record.to_dict()
+        fields.pop('original_path', None)
+        fields.pop('name', None)
+        revision = fields.pop('revision', None)
+        out.write(dumps({'type': 'lock', 'path': record.path, 'revision': revision, 'record': fields}) + '\n')
+        locks += 1
+    removed = 0
+    for path, revision in deleted:
+        out.write(dumps({'type': 'delete', 'path': path, 'revision': revision}) + '\n')
+        removed += 1
+    out.write(dumps({'type': 'end', 'locks': locks, 'deleted': removed}) + '\n')
+    out.flush()
+    return locks, removed
+
+
+def read_export(stream) -> Iterator[Dict]:
+    """Yield the header, then every lock and delete entry of an export.
+
+    Raises TransferError on a malformed line, an unknown format or a
+    missing trailer; entries read before that have already been yielded.
+    """
+    head = None
+    counts = {'lock': 0, 'delete': 0}
+    for number, line in enumerate(stream, 1):
+        if not line.strip():
+            continue
+        if not line.endswith('\n'):
+            raise TransferError("Export is truncated, its last line is incomplete")
+        try:
+            entry = json.loads(line)
+            kind = entry['type']
+        except (ValueError, TypeError, KeyError):
+            raise TransferError(f"Line {number} is not a registry export entry")
+        if head is None:
+            if kind != 'header' or entry.get('format') != FORMAT:
+                raise TransferError("Not a registry export, or written by an incompatible version")
+            head = entry
+            yield entry
+        elif kind == 'end':
+            if entry.get('locks') != counts['lock'] or entry.get('deleted') != counts['delete']:
+                raise TransferError("Export is incomplete, entry counts don't match its trailer")
+            return
+        elif kind == 'delete' and isinstance(entry.get('path'), str):
+            counts[kind] += 1
+            yield entry
+        elif (kind == 'lock' and isinstance(entry.get('path'), str) and isinstance(entry.get('record'), dict)
+              and isinstance(entry['record'].get('password_hash'), str)):
+            counts[kind] += 1
+            yield entry
+        else:
+            raise TransferError(f"Line {number} is not a registry export entry")
+    raise TransferError("Export is truncated, its trailer is missing")
+
+
+def same_record(record, fields: Dict) -> bool:
+    """True if a stored LockRecord holds exactly the fields of an imported lock"""
+    current = record.to_dict()
+    imported = dict(fields)
+    for key in ('original_path', 'name', 'revision'):
+        current.pop(key, None)
+        imported.pop(key, None)
+    return current == imported
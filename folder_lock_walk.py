@@ -0,0 +1,635 @@
+"""
+Parallel directory walking for FolderLockCore
+
+Directory listings are spread over a thread pool (os.scandir releases the
+GIL), so walks over network or spinning storage overlap their metadata
+round trips instead of paying for them one at a time. iter_tree is the
+sequential walk used for permission changes, it never follows symlinks,
+not even one swapped in for a directory or file while the walk runs (see
+list_directory and chmod_nofollow).
+"""
+
+import os
+import json
+import stat
+import errno
+import time
+import random
+import hashlib
+import threading
+from pathlib import Path
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+
+
+def default_workers() -> int:
+    """Thread count for metadata-bound walks"""
+    return min(32, (os.cpu_count() or 1) * 4)
+
+
+def parallel_walk(root: str, visit: Callable[[str], Iterable[str]],
+                  workers: Optional[int] = None, stop: Optional[threading.Event] = None):
+    """Call visit(directory) for root and every directory it returns, in parallel.
+
+    visit lists one directory and returns the subdirectories to descend
+    into. Children are scheduled as soon as their parent has been listed,
+    so wide trees keep every worker busy. Setting stop ends the walk after
+    the directories already in flight.
+    """
+    from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+    with ThreadPoolExecutor(max_workers=workers or default_workers()) as pool:
+        pending = {pool.submit(visit, root)}
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                children = future.result()
+                if stop is not None and stop.is_set():
+                    continue
+                for child in children:
+                    pending.add(pool.submit(visit, child))
+
+
+def inode_key(st: os.stat_result) -> int:
+    """(st_dev, st_ino) packed into one int, far smaller in a set than a tuple"""
+    return st.st_dev << 64 | st.st_ino
+
+
+# Directories can be opened without following symlinks and listed by fd
+_LIST_BY_FD = os.scandir in os.supports_fd and hasattr(os, 'O_DIRECTORY') and hasattr(os, 'O_NOFOLLOW')
+# Linux can't chmod with follow_symlinks=False, but can chmod an O_PATH fd through /proc
+_O_PATH = getattr(os, 'O_PATH', None) if os.path.isdir('/proc/self/fd') else None
+_LCHMOD = os.chmod in os.supports_follow_symlinks
+
+
+def _check_same(fd: int, path: str, st: os.stat_result):
+    current = os.fstat(fd)
+    if (current.st_dev, current.st_ino) != (st.st_dev, st.st_ino):
+        raise OSError(errno.ESTALE, "Replaced while the folder was walked", path)
+
+
+def list_directory(path: str, st: os.stat_result,
+                   on_error: Optional[Callable[[str, OSError], None]] = None) -> List[Tuple[str, os.stat_result]]:
+    """(path, lstat) of each entry of the directory st was taken from.
+
+    The directory is opened with O_NOFOLLOW and compared with st first, so
+    one replaced by a symlink (or anything else) after st was taken raises
+    OSError instead of listing somewhere outside the tree. Entries whose
+    lstat fails go to on_error.
+    """
+    children = []
+
+    def collect(entries, prefix):
+        for entry in entries:
+            child = entry.path if prefix is None else os.path.join(prefix, entry.name)
+            try:
+                children.append((child, entry.stat(follow_symlinks=False)))
+            except OSError as e:
+                if on_error is not None:
+                    on_error(child, e)
+
+    if not _LIST_BY_FD:
+        with os.scandir(path) as entries:
+            collect(entries, None)
+        return children
+    fd = os.open(path, os.O_RDONLY | os.O_DIRECTORY | os.O_NOFOLLOW | getattr(os, 'O_CLOEXEC', 0))
+    try:
+        _check_same(fd, path, st)
+        # Entries stat relative to the fd, so it stays open until they are done
+        with os.scandir(fd) as entries:
+            collect(entries, path)
+    finally:
+        os.close(fd)
+    return children
+
+
+def chmod_nofollow(path: str, mode: int, st: os.stat_result):
+    """chmod the entry st was taken from, never what a symlink swapped in for it points to.
+
+    On Linux path is opened with O_PATH | O_NOFOLLOW, compared with st and
+    changed through /proc/self/fd; a symlink or other file put in its place
+    (or in place of a directory above it) raises OSError. Elsewhere
+    lchmod keeps symlinks unchanged, but a directory above path swapped
+    for a symlink between the walk's lstat and the chmod is followed.
+    """
+    if _O_PATH is None:
+        if _LCHMOD:
+            os.chmod(path, mode, follow_symlinks=False)
+        else:
+            os.chmod(path, mode)
+        return
+    fd = os.open(path, _O_PATH | os.O_NOFOLLOW | os.O_CLOEXEC)
+    try:
+        _check_same(fd, path, st)
+        os.chmod(f"/proc/self/fd/{fd}", mode)
+    finally:
+        os.close(fd)
+
+
+def iter_tree(root: str, topdown: bool = True, cross_devices: bool = False,
+              skipped: Optional[Dict[str, int]] = None,
+              on_error: Optional[Callable[[str, OSError], None]] = None,
+              seen: Optional[set] = None,
+              on_mount: Optional[Callable[[str, os.stat_result], None]] = None,
+              on_enter: Optional[Callable[[str, os.stat_result], None]] = None,
+              links: bool = False) -> Iterator[Tuple[str, os.stat_result]]:
+    """Yield (path, lstat) for root and everything below it, root included.
+
+    Symlinks are never followed or yielded, every inode is yielded once
+    however many hard links point at it, and directories on another
+    filesystem (mount points) are left out unless cross_devices is set.
+    skipped counts the 'symlinks', 'hardlinks' and 'mounts' left out.
+
+    topdown yields a directory before listing it, so the caller can make
+    it readable first (unlock); otherwise after its contents (lock), so it
+    stays listable until everything inside has been handled.
+
+    seen (inode_key values) can be shared between walks of one tree.
+    on_mount is called for mount points instead of counting them.
+    on_enter(path, lstat) is called before each directory is listed.
+    links=True also yields symlinks (still not followed) and every name of
+    a hard-linked file, for callers that copy the tree rather than chmod it.
+    """
+    if skipped is None:
+        skipped = {}
+    for key in ('symlinks', 'hardlinks', 'mounts'):
+        skipped.setdefault(key, 0)
+    root_st = os.lstat(root)
+    if stat.S_ISLNK(root_st.st_mode):
+        skipped['symlinks'] += 1
+        return
+    if seen is None:
+        seen = set()
+    seen.add(inode_key(root_st))
+    stack = [(root, root_st, False)]
+    while stack:
+        path, st, listed = stack.pop()
+        if listed or not stat.S_ISDIR(st.st_mode):
+            yield path, st
+            continue
+        if topdown:
+            yield path, st
+        else:
+            stack.append((path, st, True))
+        if on_enter is not None:
+            on_enter(path, st)
+        try:
+            children = list_directory(path, st, on_error)
+        except OSError as e:
+            if on_error is not None:
+                on_error(path, e)
+            continue
+        for child, child_st in children:
+            if stat.S_ISLNK(child_st.st_mode):
+                if links:
+                    stack.append((child, child_st, False))
+                else:
+                    skipped['symlinks'] += 1
+                continue
+            is_dir = stat.S_ISDIR(child_st.st_mode)
+            if is_dir and child_st.st_dev != root_st.st_dev and not cross_devices:
+                if on_mount is not None:
+                    on_mount(child, child_st)
+                else:
+                    skipped['mounts'] += 1
+                continue
+            # Only directories and multiply linked files can be met twice
+            if is_dir or child_st.st_nlink > 1:
+                key = inode_key(child_st)
+                if key in seen and (is_dir or not links):
+                    skipped['hardlinks'] += 1
+                    continue
+                seen.add(key)
+            stack.append((child, child_st, False))
+
+
+# Filesystems where each metadata call is a network round trip
+NETWORK_FILESYSTEMS = {'nfs', 'nfs4', 'cifs', 'smb3', 'smbfs', 'ceph', 'glusterfs', 'lustre',
+                       'fuse.sshfs', 'fuse.glusterfs', '9p'}
+# Pool size per device: latency-bound network mounts need more calls in flight
+LOCAL_DEVICE_WORKERS = 4
+NETWORK_DEVICE_WORKERS = 16
+
+
+def filesystem_types() -> Dict[str, str]:
+    """Mount point -> filesystem type, empty where /proc/self/mounts is missing"""
+    types = {}
+    try:
+        with open('/proc/self/mounts', 'r') as f:
+            for line in f:
+                fields = line.split()
+                if len(fields) >= 3:
+                    # Spaces and tabs in mount points are octal escaped
+                    mount = fields[1].replace('\\040', ' ').replace('\\011', '\t')
+                    types[mount] = fields[2]
+    except OSError:
+        pass
+    return types
+
+
+def mount_point(path: str, fstypes: Dict[str, str]) -> str:
+    """The mount point in fstypes that path lies under, the top directory if none"""
+    while path not in fstypes and os.path.dirname(path) != path:
+        path = os.path.dirname(path)
+    return path
+
+
+def walk_devices(root: str, topdown: bool, apply: Callable[[str, os.stat_result], None],
+                 on_error: Optional[Callable[[str, BaseException], None]] = None,
+                 skipped: Optional[Dict[str, int]] = None,
+                 initializer: Optional[Callable[[], None]] = None,
+                 stop: Optional[threading.Event] = None,
+                 on_enter: Optional[Callable[[str, os.stat_result], None]] = None) -> Dict[str, Dict]:
+    """Call apply(path, lstat) for root and everything below it, crossing mount points.
+
+    Each filesystem met in the tree gets its own thread pool, sized by
+    filesystem type, so a slow network mount can't hold up local disks.
+    Subdirectories are spread over their device's pool; the order rules
+    and skipping of iter_tree apply. When locking (topdown False) the
+    directories that still have another device's work below them are
+    applied last, deepest first, so no pool ever waits on another.
+
+    apply raises OSError on failure, which goes to on_error. Returns per
+    device statistics keyed by st_dev: mount path, filesystem type,
+    workers, entries, bytes, seconds and entries_per_second. Setting stop
+    drops the queued work and ends running subtrees at their next entry.
+    on_enter(path, lstat) is called from the pools before each directory
+    is listed.
+    """
+    from concurrent.futures import ThreadPoolExecutor
+
+    if skipped is None:
+        skipped = {}
+    for key in ('symlinks', 'hardlinks', 'mounts'):
+        skipped.setdefault(key, 0)
+    root_st = os.lstat(root)
+    if stat.S_ISLNK(root_st.st_mode):
+        skipped['symlinks'] += 1
+        return {}
+
+    fstypes = filesystem_types()
+    # Shared between threads: a race can only apply a hard-linked file twice
+    seen = {inode_key(root_st)}
+    mutex = threading.Lock()
+    idle = threading.Condition(mutex)
+    pending = [0]
+    devices: Dict[int, Dict] = {}
+    pools: Dict[int, ThreadPoolExecutor] = {}
+    deferred: List[Tuple[str, os.stat_result]] = []
+
+    def stopped() -> bool:
+        return stop is not None and stop.is_set()
+
+    def report(path, error):
+        if on_error is not None:
+            with mutex:
+                on_error(path, error)
+
+    def run(path: str, st: os.stat_result, deferred_run: bool = False):
+        device = devices[st.st_dev]
+        try:
+            apply(path, st)
+        except OSError as e:
+            report(path, e)
+            return
+        with mutex:
+            device['entries'] += 1
+            if not stat.S_ISDIR(st.st_mode):
+                device['bytes'] += st.st_size
+            # Deferred directories wait for other devices, keep that out of the rate
+            if not deferred_run:
+                device['finished'] = time.monotonic()
+
+    def submit(st_dev: int, task, *args):
+        def wrapped():
+            try:
+                if not stopped():
+                    task(*args)
+            except Exception as e:
+                report(args[0], e)
+            finally:
+                with idle:
+                    pending[0] -= 1
+                    idle.notify_all()
+        with idle:
+            pending[0] += 1
+            pool = pools[st_dev]
+        pool.submit(wrapped)
+
+    def add_device(path: str, st: os.stat_result):
+        with mutex:
+            if st.st_dev in devices:
+                return
+            # The folder itself usually sits somewhere below its mount point
+            fstype = fstypes.get(mount_point(path, fstypes), '')
+            workers = NETWORK_DEVICE_WORKERS if fstype in NETWORK_FILESYSTEMS else LOCAL_DEVICE_WORKERS
+            devices[st.st_dev] = {'path': path, 'fstype': fstype, 'workers': workers, 'entries': 0,
+                                  'bytes': 0, 'started': time.monotonic(), 'finished': None}
+            pools[st.st_dev] = ThreadPoolExecutor(max_workers=workers, thread_name_prefix=f'walk-{st.st_dev}',
+                                                  initializer=initializer)
+
+    def claim(st: os.stat_result) -> bool:
+        key = inode_key(st)
+        with mutex:
+            if key in seen:
+                skipped['hardlinks'] += 1
+                return False
+            seen.add(key)
+            return True
+
+    def mount(path: str, st: os.stat_result):
+        if claim(st):
+            add_device(path, st)
+            submit(st.st_dev, device_root, path, st)
+
+    def device_root(path: str, st: os.stat_result):
+        if topdown:
+            run(path, st)
+        else:
+            with mutex:
+                deferred.append((path, st))
+        if on_enter is not None:
+            on_enter(path, st)
+        try:
+            children = list_directory(path, st, report)
+        except OSError as e:
+            report(path, e)
+            return
+        counts = {'symlinks': 0, 'hardlinks': 0}
+        for child, child_st in children:
+            if stopped():
+                break
+            if stat.S_ISLNK(child_st.st_mode):
+                counts['symlinks'] += 1
+            elif stat.S_ISDIR(child_st.st_mode):
+                if child_st.st_dev != st.st_dev:
+                    mount(child, child_st)
+                elif claim(child_st):
+                    submit(st.st_dev, subtree, child, child_st)
+            elif child_st.st_nlink == 1 or claim(child_st):
+                run(child, child_st)
+        with mutex:
+            skipped['symlinks'] += counts['symlinks']
+
+    def subtree(path: str, st: os.stat_result):
+        # Directories between this subtree's root and a mount found below it
+        blocked = set()
+
+        def found_mount(mount_path: str, mount_st: os.stat_result):
+            if not topdown:
+                parent = os.path.dirname(mount_path)
+                while parent not in blocked and len(parent) >= len(path):
+                    blocked.add(parent)
+                    parent = os.path.dirname(parent)
+            mount(mount_path, mount_st)
+
+        counts = {}
+        for item, item_st in iter_tree(path, topdown, skipped=counts, on_error=report,
+                                       seen=seen, on_mount=found_mount, on_enter=on_enter):
+            if stopped():
+                break
+            if item in blocked:
+                with mutex:
+                    deferred.append((item, item_st))
+            else:
+                run(item, item_st)
+        with mutex:
+            for key, count in counts.items():
+                skipped[key] += count
+
+    add_device(root, root_st)
+    try:
+        submit(root_st.st_dev, device_root, root, root_st)
+        with idle:
+            while pending[0]:
+                idle.wait()
+    finally:
+        for pool in pools.values():
+            pool.shutdown(wait=True)
+
+    for path, st in sorted(deferred, key=lambda item: item[0].count(os.sep), reverse=True):
+        if stopped():
+            break
+        run(path, st, deferred_run=True)
+
+    stats = {}
+    for st_dev, device in devices.items():
+        seconds = (device.pop('finished') or device['started']) - device.pop('started')
+        device['seconds'] = seconds
+        device['entries_per_second'] = device['entries'] / seconds if seconds > 0 else None
+        stats[str(st_dev)] = device
+    return stats
+
+
+class TreeStats:
+    """File count and size of a tree, cached per directory.
+
+    Each directory's own totals (files directly inside it, their bytes and
+    its subdirectory names) are cached together with the directory's
+    mtime. A directory whose mtime hasn't changed is not listed again, so a
+    repeated report costs one stat() per directory instead of one per file.
+    Files rewritten in place without changing their directory are not
+    noticed until the next refresh.
+    """
+
+    def __init__(self, cache_file: Optional[Path] = None):
+        self.cache_file = cache_file
+        self._cache: Dict[str, List] = {}
+        if cache_file is not None and cache_file.exists():
+            try:
+                with open(cache_file, 'r') as f:
+                    self._cache = json.load(f)
+            except (OSError, ValueError):
+                self._cache = {}
+        self._fresh: Dict[str, List] = {}
+        self._mutex = threading.Lock()
+        self.scanned = 0
+        self.cached = 0
+        self.errors = 0
+
+    def _visit(self, directory: str) -> List[str]:
+        try:
+            mtime = os.stat(directory).st_mtime_ns
+        except OSError:
+            with self._mutex:
+                self.errors += 1
+            return []
+
+        entry = self._cache.get(directory)
+        if entry is not None and entry[0] == mtime:
+            with self._mutex:
+                self._fresh[directory] = entry
+                self.cached += 1
+            return [os.path.join(directory, name) for name in entry[3]]
+
+        files = 0
+        size = 0
+        subdirs = []
+        try:
+            with os.scandir(directory) as it:
+                for item in it:
+                    try:
+                        if item.is_dir(follow_symlinks=False):
+                            subdirs.append(item.name)
+                        else:
+                            files += 1
+                            size += item.stat(follow_symlinks=False).st_size
+                    except OSError:
+                        with self._mutex:
+                            self.errors += 1
+        except OSError:
+            with self._mutex:
+                self.errors += 1
+            return []
+
+        with self._mutex:
+            self._fresh[directory] = [mtime, files, size, subdirs]
+            self.scanned += 1
+        return [os.path.join(directory, name) for name in subdirs]
+
+    def compute(self, root: str, top: int = 5, workers: Optional[int] = None) -> Dict:
+        """Walk root and return its totals plus the largest top-level subtrees"""
+        started = time.time()
+        parallel_walk(root, self._visit, workers)
+
+        # Roll per-directory totals up into their parents, deepest first
+        totals = {d: [entry[1], entry[2], 0] for d, entry in self._fresh.items()}
+        for directory in sorted(totals, key=lambda d: d.count(os.sep), reverse=True):
+            if directory == root:
+                continue
+            parent = os.path.dirname(directory)
+            if parent in totals:
+                files, size, dirs = totals[directory]
+                totals[parent][0] += files
+                totals[parent][1] += size
+                totals[parent][2] += dirs + 1
+
+        files, size, dirs = totals.get(root, [0, 0, 0])
+        children = [os.path.join(root, name) for name in self._fresh.get(root, [0, 0, 0, []])[3]]
+        largest = sorted(
+            ([child, totals[child][1]] for child in children if child in totals),
+            key=lambda item: item[1], reverse=True
+        )[:top]
+
+        self._save()
+        return {
+            'files': files,
+            'dirs': dirs,
+            'bytes': size,
+            'largest': largest,
+            'scanned_dirs': self.scanned,
+            'cached_dirs': self.cached,
+            'errors': self.errors,
+            'duration': time.time() - started,
+        }
+
+    def _save(self):
+        """Replace the cache with the directories seen in this walk"""
+        if self.cache_file is None:
+            return
+        tmp = self.cache_file.with_suffix('.tmp')
+        with open(tmp, 'w') as f:
+            json.dump(self._fresh, f)
+        os.replace(tmp, self.cache_file)
+
+
+# Mismatching entries listed per verified tree, the rest are only counted
+MAX_REPORTED_MISMATCHES = 100
+
+
+def confidence_interval(hits: int, total: int, confidence: float):
+    """Wilson score interval for a proportion hits/total"""
+    from statistics import NormalDist
+
+    if total == 0:
+        return [0.0, 1.0]
+    z = NormalDist().inv_cdf((1 + confidence) / 2)
+    p = hits / total
+    denominator = 1 + z * z / total
+    centre = (p + z * z / (2 * total)) / denominator
+    spread = z * ((p * (1 - p) / total + z * z / (4 * total * total)) ** 0.5) / denominator
+    return [max(0.0, centre - spread), min(1.0, centre + spread)]
+
+
+def verify_tree(root: str, expected_mode: int = 0, sample_rate: float = 1.0,
+                confidence: float = 0.95, fail_fast: bool = False,
+                workers: Optional[int] = None, cross_devices: bool = False,
+                cancel: Optional[threading.Event] = None) -> Dict:
+    """Check that every entry under root has permission bits expected_mode.
+
+    Only lstat() is used, nothing is opened or changed. With sample_rate
+    below 1 every directory is still listed but only that fraction of
+    entries is stat'ed, and the report carries a confidence interval for
+    the fraction of mismatching entries in the whole tree. fail_fast stops
+    at the first mismatch. Symlinks are skipped, their mode is meaningless,
+    and so are mount points unless cross_devices is set, like iter_tree.
+    Setting cancel abandons the walk, report['cancelled'] is then True.
+    """
+    started = time.time()
+    stop = threading.Event() if fail_fast else None
+    mutex = threading.Lock()
+    report = {'checked': 0, 'mismatch_count': 0, 'mismatches': [], 'errors': 0}
+
+    def check(path: str, st) -> None:
+        mode = stat.S_IMODE(st.st_mode)
+        with mutex:
+            report['checked'] += 1
+            if mode != expected_mode:
+                report['mismatch_count'] += 1
+                if len(report['mismatches']) < MAX_REPORTED_MISMATCHES:
+                    report['mismatches'].append([path, oct(mode)])
+                if stop is not None:
+                    stop.set()
+
+    def sampled() -> bool:
+        return sample_rate >= 1.0 or random.random() < sample_rate
+
+    def visit(directory: str) -> List[str]:
+        if stop is not None and stop.is_set() or cancel is not None and cancel.is_set():
+            return []
+        subdirs = []
+        try:
+            with os.scandir(directory) as it:
+                for item in it:
+                    try:
+                        if item.is_symlink():
+                            continue
+                        if item.is_dir(follow_symlinks=False):
+                            if not cross_devices and item.stat(follow_symlinks=False).st_dev != root_dev:
+                                continue
+                            subdirs.append(item.path)
+                        if sampled():
+                            check(item.path, item.stat(follow_symlinks=False))
+                    except OSError:
+                        with mutex:
+                            report['errors'] += 1
+        except OSError:
+            with mutex:
+                report['errors'] += 1
+        return subdirs
+
+    root_dev = None
+    try:
+        root_st = os.lstat(root)
+        root_dev = root_st.st_dev
+        check(root, root_st)
+    except OSError:
+        report['errors'] += 1
+    if stop is None or not stop.is_set():
+        parallel_walk(root, visit, workers, stop)
+
+    report['locked'] = report['mismatch_count'] == 0 and report['errors'] == 0
+    if cancel is not None and cancel.is_set():
+        report['cancelled'] = True
+    report['sampled'] = sample_rate < 1.0
+    if report['sampled']:
+        report['confidence'] = confidence
+        report['mismatch_interval'] = confidence_interval(
+            report['mismatch_count'], report['checked'], confidence
+        )
+    report['duration'] = time.time() - started
+    return report
+
+
+def cache_name(path_str: str) -> str:
+    """Stable file name for per-lock cache files"""
+    return hashlib.sha1(path_str.encode()).hexdigest()
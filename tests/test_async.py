@@ -0,0 +1,21 @@
+import asyncio
+
+from folder_lock_async import AsyncFolderLockCore
+
+
+def test_last_result_is_kept_across_other_calls(tmp_path):
+    path = tmp_path / 'folder'
+    path.mkdir()
+
+    async def main():
+        async with AsyncFolderLockCore(config_dir=tmp_path / 'config') as core:
+            assert (await core.lock_folder(str(path), 'secret'))[0]
+            result = core.last_result
+            assert result is not None and result.operation == 'lock'
+            await core.get_all_locks()
+            await core.verify_locks()
+            assert core.last_result is result
+            assert (await core.unlock_folder(str(path), 'secret'))[0]
+            assert core.last_result.operation == 'unlock'
+
+    asyncio.run(main())
@@ -0,0 +1,23 @@
+import gc
+import json
+import weakref
+
+import folder_lock_audit
+from folder_lock_audit import AuditLog
+
+
+def test_exit_flushes_open_logs(tmp_path):
+    log = AuditLog(tmp_path, flush_interval=60)
+    log.record({'action': 'lock', 'path': '/a'})
+    folder_lock_audit._close_all()
+    lines = (tmp_path / folder_lock_audit.LOG_NAME).read_text().splitlines()
+    assert [json.loads(line)['path'] for line in lines] == ['/a']
+
+
+def test_closed_or_dropped_logs_are_not_kept(tmp_path):
+    closed = AuditLog(tmp_path / 'closed')
+    closed.close()
+    assert closed not in folder_lock_audit._open_logs
+    dropped = weakref.ref(AuditLog(tmp_path / 'dropped'))
+    gc.collect()
+    assert dropped() is None
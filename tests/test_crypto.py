@@ -0,0 +1,182 @@
+import io
+import os
+import stat
+
+import pytest
+
+pytest.importorskip('cryptography')
+
+import folder_lock_crypto as crypto
+import folder_lock_walk
+from folder_lock_core import FolderLockCore, OperationResult
+
+CHUNK = 4096
+
+
+def make_tree(root):
+    (root / 'sub').mkdir(parents=True)
+    (root / 'small.txt').write_text('small')
+    (root / 'empty').write_bytes(b'')
+    (root / 'sub' / 'big.bin').write_bytes(os.urandom(CHUNK * 3 + 123))
+    os.chmod(root / 'small.txt', 0o640)
+
+
+def contents(root):
+    result = {}
+    for directory, _, files in os.walk(root):
+        for name in files:
+            path = os.path.join(directory, name)
+            with open(path, 'rb') as f:
+                result[os.path.relpath(path, root)] = (f.read(), stat.S_IMODE(os.stat(path).st_mode))
+    return result
+
+
+@pytest.fixture
+def key():
+    return os.urandom(32)
+
+
+def encrypted_file(tmp_path, key, data):
+    path = tmp_path / 'file.bin'
+    path.write_bytes(data)
+    crypto.encrypt_file(str(path), key, CHUNK)
+    return str(path) + crypto.ENCRYPTED_SUFFIX
+
+
+def test_file_round_trip(tmp_path, key):
+    data = os.urandom(CHUNK * 2 + 17)
+    path = tmp_path / 'file.bin'
+    path.write_bytes(data)
+    os.utime(path, ns=(1_000_000_000, 1_000_000_000))
+    encrypted = encrypted_file(tmp_path, key, data)
+    assert not path.exists()
+    assert crypto.decrypt_file(encrypted, key) == len(data)
+    assert path.read_bytes() == data
+    assert not os.path.exists(encrypted)
+
+
+def test_decrypt_survives_short_reads(tmp_path, key, monkeypatch):
+    data = os.urandom(CHUNK * 3)
+    encrypted = encrypted_file(tmp_path, key, data)
+
+    class Trickle(io.RawIOBase):
+        # A pipe or network filesystem may return less than asked for
+        def __init__(self, raw):
+            self.raw = raw
+
+        def readable(self):
+            return True
+
+        def readinto(self, buffer):
+            return self.raw.readinto(memoryview(buffer)[:1000])
+
+        def close(self):
+            self.raw.close()
+            super().close()
+
+    real_open = open
+
+    def trickling_open(path, mode='r', *args, **kwargs):
+        f = real_open(path, mode, *args, **kwargs)
+        return Trickle(f) if path == encrypted else f
+
+    monkeypatch.setattr(crypto, 'open', trickling_open, raising=False)
+    crypto.decrypt_file(encrypted, key)
+    assert (tmp_path / 'file.bin').read_bytes() == data
+
+
+@pytest.mark.parametrize('tamper', ['flip', 'truncate', 'swap', 'header'])
+def test_tampering_is_detected(tmp_path, key, tamper):
+    data = os.urandom(CHUNK * 2)
+    encrypted = encrypted_file(tmp_path, key, data)
+    with open(encrypted, 'rb') as f:
+        blob = bytearray(f.read())
+    header, block = crypto.HEADER.size, CHUNK + crypto.TAG_SIZE
+    if tamper == 'flip':
+        blob[header + 10] ^= 1
+    elif tamper == 'truncate':
+        del blob[header + block:]
+    elif tamper == 'swap':
+        first, second = blob[header:header + block], blob[header + block:header + 2 * block]
+        blob[header:header + 2 * block] = second + first
+    else:
+        # The stored size is authenticated with every chunk
+        blob[24] ^= 1
+    with open(encrypted, 'wb') as f:
+        f.write(blob)
+    with pytest.raises(crypto.EncryptionError):
+        crypto.decrypt_file(encrypted, key)
+    assert not (tmp_path / 'file.bin').exists()
+    assert os.path.exists(encrypted)
+
+
+def test_plan_cleans_up_after_crash(tmp_path, key):
+    root = tmp_path / 'folder'
+    make_tree(root)
+    before = contents(root)
+    # Died between the rename and the unlink of the source
+    small = str(root / 'small.txt')
+    crypto.encrypt_file(small, key, CHUNK)
+    (root / 'small.txt').write_text('small')
+    # and in the middle of another file
+    (root / 'sub' / ('big.bin' + crypto.ENCRYPT_PART_SUFFIX)).write_bytes(b'partial')
+    todo = {os.path.relpath(path, root) for path, _ in crypto.plan(str(root), True)}
+    assert todo == {'empty', os.path.join('sub', 'big.bin')}
+    assert not (root / 'small.txt').exists()
+    assert not (root / 'sub' / ('big.bin' + crypto.ENCRYPT_PART_SUFFIX)).exists()
+    assert crypto.process_tree(str(root), key, True, OperationResult('lock', str(root)), CHUNK, workers=1)
+    assert crypto.process_tree(str(root), key, False, OperationResult('unlock', str(root)), CHUNK, workers=1)
+    assert contents(root) == before
+
+
+def test_plan_skips_mount_points(tmp_path, monkeypatch):
+    root = tmp_path / 'folder'
+    (root / 'mnt').mkdir(parents=True)
+    (root / 'mnt' / 'remote.txt').write_text('remote')
+    (root / 'local.txt').write_text('local')
+    assert len(crypto.plan(str(root), True, cross_devices=True)) == 2
+    list_directory = folder_lock_walk.list_directory
+
+    class Mounted:
+        def __init__(self, st):
+            self._st = st
+
+        def __getattr__(self, name):
+            value = getattr(self._st, name)
+            return value + 1 if name == 'st_dev' else value
+
+    def with_mount(path, st, on_error=None):
+        return [(child, Mounted(child_st) if child == str(root / 'mnt') else child_st)
+                for child, child_st in list_directory(path, st, on_error)]
+
+    monkeypatch.setattr(folder_lock_walk, 'list_directory', with_mount)
+    assert [os.path.relpath(p, root) for p, _ in crypto.plan(str(root), True)] == ['local.txt']
+
+
+def test_lock_resumes_after_interrupted_encryption(tmp_path, monkeypatch):
+    root = tmp_path / 'folder'
+    make_tree(root)
+    before = contents(root)
+    core = FolderLockCore(tmp_path / 'config')
+    encrypt_file = crypto.encrypt_file
+    calls = []
+
+    def crash_on_second(path, *args, **kwargs):
+        calls.append(path)
+        if len(calls) == 2:
+            raise OSError("disk went away")
+        return encrypt_file(path, *args, **kwargs)
+
+    monkeypatch.setattr(crypto, 'encrypt_file', crash_on_second)
+    success, message = core.lock_folder(str(root), 'secret', mode='encrypt')
+    assert not success and 'resume' in message
+    assert core.locks[str(root)]['encryption']['state'] == 'encrypting'
+    monkeypatch.setattr(crypto, 'encrypt_file', encrypt_file)
+    assert core.lock_folder(str(root), 'secret', mode='encrypt')[0]
+    os.chmod(root, 0o700)
+    os.chmod(root / 'sub', 0o700)
+    assert all(name.endswith(crypto.ENCRYPTED_SUFFIX) for _, _, files in os.walk(root) for name in files)
+    assert core.unlock_folder(str(root), 'secret')[0]
+    # Unlocking opens files up as 0644 whatever their mode was
+    assert {path: data for path, (data, _) in contents(root).items()} == \
+        {path: data for path, (data, _) in before.items()}
@@ -0,0 +1,50 @@
+import threading
+import time
+
+from folder_lock_core import FolderLockCore
+from folder_lock_daemon import FolderLockDaemon
+
+
+def folder(tmp_path, name):
+    path = tmp_path / name
+    path.mkdir()
+    return str(path)
+
+
+def test_dispatch_keeps_changes_made_without_the_daemon(tmp_path):
+    config = tmp_path / 'config'
+    daemon = FolderLockDaemon(config)
+    a, b = folder(tmp_path, 'a'), folder(tmp_path, 'b')
+    # A CLI run with FOLDER_LOCK_NO_DAEMON, right before the daemon writes
+    assert FolderLockCore(config).lock_folder(a, 'secret')[0]
+    response = daemon.dispatch({'method': 'lock_folder', 'args': [b, 'secret']})
+    assert response['ok'] and response['result'][0]
+    assert set(FolderLockCore(config).get_locked_paths()) == {a, b}
+
+
+def test_watcher_survives_a_failing_pass(tmp_path, capsys):
+    daemon = FolderLockDaemon(tmp_path / 'config', watch_interval=0.05)
+    failures = []
+    recover = daemon.core.recover_temporary_access
+
+    def fail_once():
+        if not failures:
+            failures.append(True)
+            raise OSError("disk went away")
+        return recover()
+
+    daemon.core.recover_temporary_access = fail_once
+    watcher = threading.Thread(target=daemon._watch, daemon=True)
+    watcher.start()
+    try:
+        path = folder(tmp_path, 'a')
+        assert FolderLockCore(tmp_path / 'config').lock_folder(path, 'secret')[0]
+        deadline = time.time() + 5
+        while path not in daemon._status and time.time() < deadline:
+            time.sleep(0.02)
+        assert daemon._status.get(path) == 'ACTIVE'
+        assert watcher.is_alive()
+    finally:
+        daemon._stop.set()
+        watcher.join(5)
+    assert 'disk went away' in capsys.readouterr().err
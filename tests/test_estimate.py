@@ -0,0 +1,25 @@
+import os
+
+import folder_lock_estimate
+from folder_lock_core import FolderLockCore
+
+
+def test_history_leaves_out_entries_already_in_place(tmp_path, monkeypatch):
+    root = tmp_path / 'folder'
+    root.mkdir()
+    for index in range(40):
+        (root / f'{index}.txt').write_text('data')
+        if index >= 10:
+            # Left locked by an earlier, interrupted lock
+            os.chmod(root / f'{index}.txt', 0o000)
+    recorded = []
+
+    def record(self, mount, fstype, kind, entries, nbytes, seconds):
+        recorded.append((kind, entries))
+
+    monkeypatch.setattr(folder_lock_estimate.ThroughputHistory, 'record', record)
+    core = FolderLockCore(tmp_path / 'config')
+    ok, message = core.lock_folder(str(root), 'secret')
+    assert ok, message
+    # The folder itself and the 10 files still open, not the 30 already locked
+    assert recorded == [('lock', 11)]
@@ -0,0 +1,90 @@
+import errno
+import os
+
+import folder_lock_integrity as integrity
+import folder_lock_walk
+
+
+class Mounted:
+    def __init__(self, st):
+        self._st = st
+
+    def __getattr__(self, name):
+        value = getattr(self._st, name)
+        return value + 1 if name == 'st_dev' else value
+
+
+def make_tree(root):
+    (root / 'docs').mkdir(parents=True)
+    (root / 'a.txt').write_text('alpha')
+    (root / 'docs' / 'b.txt').write_text('bravo')
+    (root / 'docs' / 'c.txt').write_text('charlie')
+
+
+def test_unchanged_tree_verifies(tmp_path):
+    root = tmp_path / 'folder'
+    make_tree(root)
+    expected = integrity.build_manifest(str(root), workers=1)
+    report = integrity.compare(expected, integrity.build_manifest(str(root), workers=1))
+    assert report['verified'] and report['unreadable'] == []
+
+
+def test_hard_linked_file_is_hashed_once(tmp_path):
+    root = tmp_path / 'folder'
+    make_tree(root)
+    os.link(root / 'a.txt', root / 'docs' / 'a-link.txt')
+    files = integrity.scan(str(root))
+    assert len([rel for rel in files if rel.endswith('a.txt') or rel.endswith('a-link.txt')]) == 1
+
+
+def test_mount_points_follow_cross_devices(tmp_path, monkeypatch):
+    root = tmp_path / 'folder'
+    make_tree(root)
+    assert len(integrity.scan(str(root), cross_devices=True)) == 3
+    list_directory = folder_lock_walk.list_directory
+
+    def with_mount(path, st, on_error=None):
+        return [(child, Mounted(child_st) if child == str(root / 'docs') else child_st)
+                for child, child_st in list_directory(path, st, on_error)]
+
+    monkeypatch.setattr(folder_lock_walk, 'list_directory', with_mount)
+    assert sorted(integrity.scan(str(root))) == ['a.txt']
+
+
+def test_unreadable_directory_fails_verification(tmp_path, monkeypatch):
+    root = tmp_path / 'folder'
+    make_tree(root)
+    expected = integrity.build_manifest(str(root), workers=1)
+    list_directory = folder_lock_walk.list_directory
+
+    def denied(path, st, on_error=None):
+        if path == str(root / 'docs'):
+            raise PermissionError(errno.EACCES, 'Permission denied', path)
+        return list_directory(path, st, on_error)
+
+    monkeypatch.setattr(folder_lock_walk, 'list_directory', denied)
+    actual = integrity.build_manifest(str(root), workers=1)
+    assert actual['unreadable'] == ['docs']
+    report = integrity.compare(expected, actual)
+    assert not report['verified']
+    assert report['unreadable'] == ['docs'] and report['unreadable_count'] == 1
+    # Files behind the unreadable directory weren't removed, just not seen
+    assert report['removed'] == [] and report['change_count'] == 0
+
+
+def test_unreadable_file_fails_verification(tmp_path, monkeypatch):
+    root = tmp_path / 'folder'
+    make_tree(root)
+    expected = integrity.build_manifest(str(root), workers=1)
+    chunk_leaves = integrity._chunk_leaves
+
+    def denied(path, first, last):
+        if path.endswith('b.txt'):
+            raise PermissionError(errno.EACCES, 'Permission denied', path)
+        return chunk_leaves(path, first, last)
+
+    monkeypatch.setattr(integrity, '_chunk_leaves', denied)
+    report = integrity.compare(expected, integrity.build_manifest(str(root), workers=1))
+    assert not report['verified']
+    assert report['unreadable'] == [os.path.join('docs', 'b.txt')]
+    assert report['changed'] == []
@@ -0,0 +1,42 @@
+import json
+import multiprocessing
+
+from folder_lock_metrics import Metrics
+
+
+def record(config_dir, times):
+    metrics = Metrics(config_dir / 'metrics.json', config_dir / 'metrics.prom')
+    for _ in range(times):
+        metrics.count('operations_total', 1, {'operation': 'lock'})
+        metrics.observe('phase_seconds', 0.01, {'phase': 'walk'})
+        metrics.flush()
+
+
+def counter(config_dir, name):
+    with open(config_dir / 'metrics.json') as f:
+        state = json.load(f)
+    return sum(value for key, value in state['counters'] if key[0] == name)
+
+
+def test_processes_do_not_overwrite_each_other(tmp_path):
+    # Both start from the same (empty) totals, as concurrent CLI runs do
+    context = multiprocessing.get_context('spawn')
+    workers = [context.Process(target=record, args=(tmp_path, 50)) for _ in range(4)]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    assert counter(tmp_path, 'operations_total') == 200
+    prom = (tmp_path / 'metrics.prom').read_text()
+    assert 'folder_lock_phase_seconds_count{phase="walk"} 200' in prom
+
+
+def test_totals_accumulate_across_instances(tmp_path):
+    first = Metrics(tmp_path / 'metrics.json')
+    second = Metrics(tmp_path / 'metrics.json')
+    first.count('entries_total', 5)
+    first.flush()
+    second.count('entries_total', 7)
+    second.flush()
+    assert counter(tmp_path, 'entries_total') == 12
+    assert 'folder_lock_entries_total 12' in Metrics(tmp_path / 'metrics.json').render()
@@ -0,0 +1,171 @@
+import os
+import stat
+
+import pytest
+
+import folder_lock_pack as pack
+import folder_lock_walk
+from folder_lock_core import FolderLockCore, OperationResult
+
+
+def make_tree(root):
+    (root / 'docs' / 'deep').mkdir(parents=True)
+    (root / 'a.txt').write_text('alpha')
+    (root / 'docs' / 'b.txt').write_text('bravo' * 100)
+    (root / 'docs' / 'deep' / 'c.bin').write_bytes(os.urandom(4096))
+    os.chmod(root / 'docs' / 'b.txt', 0o640)
+    os.symlink('a.txt', root / 'link')
+    os.link(root / 'a.txt', root / 'docs' / 'hard.txt')
+
+
+def snapshot(root):
+    result = {}
+    for directory, dirnames, filenames in os.walk(root):
+        for name in dirnames + filenames:
+            path = os.path.join(directory, name)
+            st = os.lstat(path)
+            content = None
+            if stat.S_ISREG(st.st_mode):
+                with open(path, 'rb') as f:
+                    content = f.read()
+            elif stat.S_ISLNK(st.st_mode):
+                content = os.readlink(path)
+            result[os.path.relpath(path, root)] = (stat.S_IMODE(st.st_mode), content)
+    return result
+
+
+@pytest.fixture
+def packed(tmp_path):
+    root = tmp_path / 'folder'
+    root.mkdir()
+    make_tree(root)
+    archive, index = tmp_path / 'f.pack', tmp_path / 'f.idx'
+    pack.build_archive(str(root), archive, index, OperationResult('lock', str(root)))
+    return root, archive, index
+
+
+def test_clear_and_unpack_round_trip(packed):
+    root, archive, index = packed
+    before = snapshot(root)
+    pack.clear_tree(str(root), index)
+    assert os.listdir(root) == []
+    pack.unpack_tree(str(root), archive, index, OperationResult('unlock', str(root)))
+    assert snapshot(root) == before
+
+
+def test_clear_tree_refuses_new_file(packed):
+    root, archive, index = packed
+    (root / 'docs' / 'new.txt').write_text('written after packing')
+    before = snapshot(root)
+    with pytest.raises(pack.PackError, match='docs'):
+        pack.clear_tree(str(root), index)
+    assert snapshot(root) == before
+
+
+def test_clear_tree_refuses_modified_file(packed):
+    root, archive, index = packed
+    with open(root / 'docs' / 'b.txt', 'a') as f:
+        f.write('more')
+    before = snapshot(root)
+    with pytest.raises(pack.PackError, match='changed'):
+        pack.clear_tree(str(root), index)
+    assert snapshot(root) == before
+
+
+def test_clear_tree_stops_when_file_changes_during_removal(packed, monkeypatch):
+    root, archive, index = packed
+    before = snapshot(root)
+    unlink = os.unlink
+
+    def racing_unlink(path, *args, **kwargs):
+        # Another process rewrites a file the removal has not reached yet
+        if path.endswith('c.bin'):
+            (root / 'a.txt').write_text('rewritten by someone else')
+        return unlink(path, *args, **kwargs)
+
+    monkeypatch.setattr(pack.os, 'unlink', racing_unlink)
+    with pytest.raises(pack.PackError):
+        pack.clear_tree(str(root), index)
+    monkeypatch.undo()
+    assert (root / 'a.txt').read_text() == 'rewritten by someone else'
+    pack.unpack_tree(str(root), archive, index, OperationResult('rollback', str(root)), missing_only=True)
+    after = snapshot(root)
+    assert after.keys() == before.keys()
+    assert after['docs/deep/c.bin'] == before['docs/deep/c.bin']
+
+
+class ShiftedStat:
+    def __init__(self, st):
+        self._st = st
+
+    def __getattr__(self, name):
+        value = getattr(self._st, name)
+        return value + 1 if name == 'st_dev' else value
+
+
+def test_mount_points_are_neither_packed_nor_removed(tmp_path, monkeypatch):
+    root = tmp_path / 'folder'
+    (root / 'mnt').mkdir(parents=True)
+    (root / 'mnt' / 'remote.txt').write_text('on another filesystem')
+    (root / 'local.txt').write_text('local')
+    list_directory = folder_lock_walk.list_directory
+
+    def with_mount(path, st, on_error=None):
+        # mnt reports another device, as a mount point does
+        return [(child, ShiftedStat(child_st) if child == str(root / 'mnt') else child_st)
+                for child, child_st in list_directory(path, st, on_error)]
+
+    monkeypatch.setattr(folder_lock_walk, 'list_directory', with_mount)
+    archive, index = tmp_path / 'f.pack', tmp_path / 'f.idx'
+    pack.build_archive(str(root), archive, index, OperationResult('lock', str(root)))
+    assert {entry['path'] for entry in pack.load_index(index)} == {'.', 'local.txt'}
+    pack.clear_tree(str(root), index)
+    assert sorted(os.listdir(root)) == ['mnt']
+    assert (root / 'mnt' / 'remote.txt').read_text() == 'on another filesystem'
+
+
+def test_extract_member_keeps_mode(packed, tmp_path):
+    root, archive, index = packed
+    out = tmp_path / 'out'
+    out.mkdir()
+    pack.extract_member(archive, index, 'docs/b.txt', str(out))
+    assert stat.S_IMODE(os.stat(out / 'b.txt').st_mode) == 0o640
+    assert (out / 'b.txt').read_text() == 'bravo' * 100
+
+
+def test_lock_rolls_back_when_folder_changes(tmp_path, monkeypatch):
+    root = tmp_path / 'folder'
+    root.mkdir()
+    make_tree(root)
+    before = snapshot(root)
+    build_archive = pack.build_archive
+
+    def build_then_write(*args, **kwargs):
+        entries = build_archive(*args, **kwargs)
+        (root / 'late.txt').write_text('created while packing')
+        return entries
+
+    monkeypatch.setattr(pack, 'build_archive', build_then_write)
+    core = FolderLockCore(tmp_path / 'config')
+    success, message = core.lock_folder(str(root), 'secret', mode='pack')
+    assert not success
+    assert 'nothing was locked' in message
+    assert str(root) not in core.locks
+    assert not list((tmp_path / 'config' / 'archives').iterdir())
+    after = snapshot(root)
+    assert after.pop('late.txt')[1] == b'created while packing'
+    assert after == before
+
+
+def test_lock_and_unlock_packed_folder(tmp_path):
+    root = tmp_path / 'folder'
+    root.mkdir()
+    make_tree(root)
+    before = snapshot(root)
+    core = FolderLockCore(tmp_path / 'config')
+    assert core.lock_folder(str(root), 'secret', mode='pack')[0]
+    os.chmod(root, 0o700)
+    assert os.listdir(root) == []
+    os.chmod(root, 0o000)
+    assert core.unlock_folder(str(root), 'secret')[0]
+    assert snapshot(root) == before
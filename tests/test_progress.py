@@ -0,0 +1,40 @@
+import os
+import stat
+import threading
+
+import folder_lock_progress
+from folder_lock_core import FolderLockCore
+from folder_lock_progress import BatchDone, DirectoryEntered, Finished
+
+
+def wide_tree(root, directories=300):
+    for i in range(directories):
+        (root / f"d{i}").mkdir(parents=True)
+        (root / f"d{i}" / 'f').write_text('x')
+
+
+def test_directory_events_are_coalesced(tmp_path):
+    root = tmp_path / 'folder'
+    wide_tree(root)
+    core = FolderLockCore(tmp_path / 'config')
+    events = list(core.lock_folder_stream(str(root), 'secret', batch_size=100))
+    assert isinstance(events[-1], Finished) and events[-1].success
+    directories = [e for e in events if isinstance(e, DirectoryEntered)]
+    assert 1 <= len(directories) < 300
+    assert sum(e.entries for e in events if isinstance(e, BatchDone)) == 601
+
+
+def test_closing_with_a_full_queue_rolls_back(tmp_path, monkeypatch):
+    monkeypatch.setattr(folder_lock_progress, 'QUEUE_SIZE', 2)
+    root = tmp_path / 'folder'
+    wide_tree(root)
+    core = FolderLockCore(tmp_path / 'config')
+    stream = core.lock_folder_stream(str(root), 'secret', batch_size=1)
+    next(stream)
+    # The worker is blocked on the full queue now; close must not wait for it forever
+    closer = threading.Thread(target=stream.close)
+    closer.start()
+    closer.join(30)
+    assert not closer.is_alive()
+    assert str(root) not in core.locks
+    assert all(stat.S_IMODE(os.stat(root / f"d{i}").st_mode) != 0 for i in range(300))
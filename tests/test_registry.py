@@ -0,0 +1,29 @@
+from folder_lock_core import FolderLockCore
+
+
+def test_get_all_locks_returns_copies(tmp_path):
+    path = tmp_path / 'folder'
+    path.mkdir()
+    core = FolderLockCore(tmp_path / 'config')
+    assert core.lock_folder(str(path), 'secret', throttle={'max_ops': 1000})[0]
+    locks = core.get_all_locks()
+    record = locks[str(path)]
+    assert type(record) is dict
+    record['password_hash'] = 'changed'
+    record['throttle']['max_ops'] = 1
+    locks.clear()
+    assert core.locks[str(path)]['password_hash'] != 'changed'
+    assert core.locks[str(path)]['throttle'] == {'max_ops': 1000}
+    assert core.get_locked_paths() == [str(path)]
+    assert core.unlock_folder(str(path), 'secret')[0]
+
+
+def test_get_all_locks_copies_nested_encryption_info(tmp_path):
+    path = tmp_path / 'folder'
+    path.mkdir()
+    (path / 'a.txt').write_text('alpha')
+    core = FolderLockCore(tmp_path / 'config')
+    assert core.lock_folder(str(path), 'secret', mode='encrypt')[0]
+    core.get_all_locks()[str(path)]['encryption']['wrapped']['password']['key'] = 'changed'
+    assert core.unlock_folder(str(path), 'secret')[0]
+    assert (path / 'a.txt').read_text() == 'alpha'
@@ -0,0 +1,54 @@
+import os
+import stat
+import time
+
+import folder_lock_scheduler
+from folder_lock_core import FolderLockCore
+from folder_lock_scheduler import RelockScheduler
+
+
+def wait_for(condition, timeout=10.0):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        if condition():
+            return True
+        time.sleep(0.02)
+    return False
+
+
+def test_busy_folder_is_relocked_later(tmp_path, monkeypatch):
+    monkeypatch.setattr(folder_lock_scheduler, 'RETRY_DELAY', 0.2)
+    path = tmp_path / 'folder'
+    path.mkdir()
+    path_str = str(path)
+    core = FolderLockCore(tmp_path / 'config')
+    scheduler = RelockScheduler(core)
+    scheduler.start()
+    try:
+        assert core.lock_folder(path_str, 'secret')[0]
+        assert core.unlock_folder(path_str, 'secret', relock_after=0.005)[0]
+        # Busy with another operation through its deadline
+        assert core._claim(path_str)
+        try:
+            time.sleep(0.6)
+            assert path_str in core.get_pending_relocks()
+            assert path_str not in core.locks
+        finally:
+            core._release(path_str)
+        assert wait_for(lambda: path_str in core.locks)
+        assert core.get_pending_relocks() == {}
+        assert stat.S_IMODE(os.stat(path).st_mode) == 0
+    finally:
+        scheduler.stop()
+
+
+def test_stale_heap_entry_keeps_rescheduled_deadline(tmp_path):
+    core = FolderLockCore(tmp_path / 'config')
+    scheduler = RelockScheduler(core)
+    scheduler.schedule('/b', time.time() - 2)
+    # Rescheduled: the old entry stays in the heap behind /b
+    scheduler.schedule('/a', time.time() - 1)
+    later = time.time() + 3600
+    scheduler.schedule('/a', later)
+    assert scheduler._next_due()
+    assert scheduler._deadlines == {'/a': later}
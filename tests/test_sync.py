@@ -0,0 +1,80 @@
+import os
+import stat
+
+import pytest
+
+from folder_lock_core import FolderLockCore
+
+
+@pytest.fixture
+def hosts(tmp_path):
+    shared = tmp_path / 'shared'
+    a, b = FolderLockCore(tmp_path / 'a'), FolderLockCore(tmp_path / 'b')
+    a.enable_sync(str(shared), 'a')
+    b.enable_sync(str(shared), 'b')
+    return a, b, shared
+
+
+def folder(tmp_path, name):
+    path = tmp_path / name
+    path.mkdir()
+    (path / 'file.txt').write_text(name)
+    return path
+
+
+def test_lock_reaches_other_host(tmp_path, hosts):
+    a, b, shared = hosts
+    path = folder(tmp_path, 'plain')
+    assert a.lock_folder(str(path), 'secret')[0]
+    b.sync_now()
+    assert str(path) in b.locks
+    assert b.unlock_folder(str(path), 'secret')[0]
+    a.sync_now()
+    assert str(path) not in a.locks
+
+
+def test_shared_files_are_private(tmp_path, hosts):
+    a, b, shared = hosts
+    assert a.lock_folder(str(folder(tmp_path, 'plain')), 'secret')[0]
+    a.sync_now(checkpoint=True)
+    for directory, dirnames, filenames in os.walk(shared):
+        for name in dirnames:
+            assert stat.S_IMODE(os.stat(os.path.join(directory, name)).st_mode) == 0o700
+        for name in filenames:
+            assert stat.S_IMODE(os.stat(os.path.join(directory, name)).st_mode) == 0o600
+
+
+@pytest.mark.parametrize('options', [{'mode': 'pack'}, {'integrity': True}])
+def test_host_only_locks_are_not_synced(tmp_path, hosts, options):
+    a, b, shared = hosts
+    path = folder(tmp_path, 'local')
+    assert a.lock_folder(str(path), 'secret', **options)[0]
+    b.sync_now()
+    assert str(path) not in b.locks
+    assert a.unlock_folder(str(path), 'secret')[0]
+    assert (path / 'file.txt').read_text() == 'local'
+
+
+def test_remote_event_leaves_host_only_lock_alone(tmp_path, hosts):
+    a, b, shared = hosts
+    path = folder(tmp_path, 'packed')
+    assert a.lock_folder(str(path), 'secret', mode='pack')[0]
+    # b locks and unlocks the same path with plain permissions
+    assert b.lock_folder(str(path), 'other')[0]
+    assert b.unlock_folder(str(path), 'other')[0]
+    a.sync_now()
+    assert a.locks[str(path)]['mode'] == 'pack'
+
+
+def test_unlock_without_archive_keeps_folder_locked(tmp_path):
+    core = FolderLockCore(tmp_path / 'config')
+    path = folder(tmp_path, 'packed')
+    assert core.lock_folder(str(path), 'secret', mode='pack')[0]
+    locked_mode = stat.S_IMODE(os.stat(path).st_mode)
+    archive, index = core._archive_files(str(path))
+    archive.unlink()
+    success, message = core.unlock_folder(str(path), 'secret')
+    assert not success
+    assert 'missing' in message
+    assert stat.S_IMODE(os.stat(path).st_mode) == locked_mode
+    assert str(path) in core.locks
@@ -0,0 +1,57 @@
+import os
+import stat
+import subprocess
+import sys
+
+import pytest
+
+import folder_lock_core
+from folder_lock_core import FolderLockCore
+
+
+@pytest.fixture
+def opened(tmp_path):
+    """A locked folder opened as a crashed temporarily_unlocked would leave it"""
+    core = FolderLockCore(tmp_path / 'config')
+    path = tmp_path / 'vault'
+    path.mkdir()
+    (path / 'file.txt').write_text('data')
+    assert core.lock_folder(str(path), 'secret')[0]
+    os.chmod(path, 0o755)
+    os.chmod(path / 'file.txt', 0o644)
+    child = subprocess.Popen([sys.executable, '-c', 'import time; time.sleep(60)'])
+    yield core, path, child
+    child.kill()
+    child.wait()
+
+
+def journal(core, path, pid, started):
+    core._write_journal({'path': str(path), 'pid': pid, 'pid_started': started, 'started': 0,
+                         'targets': [str(path)], 'ancestors': []})
+
+
+def test_live_owner_keeps_folder_open(opened):
+    core, path, child = opened
+    journal(core, path, child.pid, folder_lock_core._process_start_time(child.pid))
+    assert core.recover_temporary_access() == []
+    assert stat.S_IMODE(os.stat(path).st_mode) == 0o755
+
+
+def test_reused_pid_does_not_keep_folder_open(opened):
+    core, path, child = opened
+    # The journal's process is gone, child now has its pid
+    journal(core, path, child.pid, 'started earlier')
+    outcomes = core.recover_temporary_access()
+    assert [(p, success) for p, success, _ in outcomes] == [(str(path), True)]
+    assert stat.S_IMODE(os.stat(path).st_mode) == 0o000
+    assert not core._journal_file(str(path)).exists()
+
+
+def test_dead_owner_is_recovered(opened):
+    core, path, child = opened
+    started = folder_lock_core._process_start_time(child.pid)
+    child.kill()
+    child.wait()
+    journal(core, path, child.pid, started)
+    assert len(core.recover_temporary_access()) == 1
+    assert stat.S_IMODE(os.stat(path).st_mode) == 0o000
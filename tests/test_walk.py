@@ -0,0 +1,71 @@
+import os
+import stat
+
+import pytest
+
+from folder_lock_walk import chmod_nofollow, iter_tree, list_directory
+
+
+@pytest.fixture
+def outside(tmp_path):
+    target = tmp_path / 'outside'
+    target.mkdir()
+    (target / 'secret.txt').write_text('not part of the folder')
+    os.chmod(target / 'secret.txt', 0o644)
+    return target
+
+
+def test_chmod_refuses_symlink_swapped_in(tmp_path, outside):
+    item = tmp_path / 'file.txt'
+    item.write_text('data')
+    st = os.lstat(item)
+    item.unlink()
+    os.symlink(outside / 'secret.txt', item)
+    with pytest.raises(OSError):
+        chmod_nofollow(str(item), 0o000, st)
+    assert stat.S_IMODE(os.stat(outside / 'secret.txt').st_mode) == 0o644
+
+
+def test_chmod_refuses_directory_above_swapped_for_symlink(tmp_path, outside):
+    sub = tmp_path / 'sub'
+    sub.mkdir()
+    (sub / 'secret.txt').write_text('inside')
+    st = os.lstat(sub / 'secret.txt')
+    sub.rename(tmp_path / 'moved')
+    os.symlink(outside, sub)
+    with pytest.raises(OSError):
+        chmod_nofollow(str(sub / 'secret.txt'), 0o000, st)
+    assert stat.S_IMODE(os.stat(outside / 'secret.txt').st_mode) == 0o644
+
+
+def test_chmod_changes_unswapped_entry(tmp_path):
+    item = tmp_path / 'file.txt'
+    item.write_text('data')
+    chmod_nofollow(str(item), 0o600, os.lstat(item))
+    assert stat.S_IMODE(os.lstat(item).st_mode) == 0o600
+
+
+def test_list_directory_refuses_symlink_swapped_in(tmp_path, outside):
+    sub = tmp_path / 'sub'
+    sub.mkdir()
+    st = os.lstat(sub)
+    sub.rmdir()
+    os.symlink(outside, sub)
+    with pytest.raises(OSError):
+        list_directory(str(sub), st)
+
+
+def test_walk_never_enters_swapped_directory(tmp_path, outside):
+    root = tmp_path / 'folder'
+    (root / 'sub').mkdir(parents=True)
+    (root / 'sub' / 'inside.txt').write_text('inside')
+    errors = []
+
+    def swap(path, st):
+        if path == str(root / 'sub'):
+            os.rename(path, tmp_path / 'moved')
+            os.symlink(outside, path)
+
+    seen = [path for path, st in iter_tree(str(root), on_enter=swap, on_error=lambda p, e: errors.append(p))]
+    assert str(root / 'sub' / 'secret.txt') not in seen
+    assert errors == [str(root / 'sub')]